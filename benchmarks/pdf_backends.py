@@ -0,0 +1,78 @@
+"""
+benchmarks/pdf_backends.py
+--------------------------
+Pages/sec of each PDF extraction backend on a folder of PDFs, cold (parsing every page)
+and warm (served from the parsed-page cache).
+
+Usage:
+    python benchmarks/pdf_backends.py --folder data/sample_policies
+    python benchmarks/pdf_backends.py --folder data/corpora/hr --backends pdfplumber pdfium --output pdf.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from pdf_extraction import PDF_BACKENDS, extract_pages, extract_pages_cached  # pylint: disable=wrong-import-position
+
+
+def time_pass(files, extract):
+    """Run extract over every file; return (pages, characters, seconds)."""
+    pages = chars = 0
+    start = time.perf_counter()
+    for file_path in files:
+        for _, text in extract(file_path):
+            pages += 1
+            chars += len(text)
+    return pages, chars, time.perf_counter() - start
+
+
+def benchmark_backend(files, backend, cache_path):
+    pages, chars, cold_s = time_pass(files, lambda path: extract_pages(path, backend=backend)[0])
+    # Fill the cache, then time reads that never touch the PDF parser
+    time_pass(files, lambda path: extract_pages_cached(path, backend=backend, cache_path=cache_path))
+    _, _, warm_s = time_pass(files, lambda path: extract_pages_cached(path, backend=backend, cache_path=cache_path))
+    return {"backend": backend, "pages": pages, "characters": chars,
+            "cold_s": cold_s, "cold_pages_per_s": pages / cold_s if cold_s else 0.0,
+            "cached_s": warm_s, "cached_pages_per_s": pages / warm_s if warm_s else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", default=str(BASE_DIR / "data" / "sample_policies"))
+    parser.add_argument("--backends", nargs="+", default=list(PDF_BACKENDS), choices=PDF_BACKENDS)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    files = sorted(
+        os.path.join(args.folder, name) for name in os.listdir(args.folder) if name.lower().endswith(".pdf")
+    )
+    if not files:
+        sys.exit(f"No PDFs found in {args.folder}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = [
+            benchmark_backend(files, backend, os.path.join(tmp_dir, f"{backend}.sqlite"))
+            for backend in args.backends
+        ]
+
+    print(f"{len(files)} PDFs from {args.folder}")
+    print(f"{'backend':<19}{'pages':>7}{'chars':>10}{'cold p/s':>11}{'cached p/s':>12}")
+    for row in results:
+        print(f"{row['backend']:<19}{row['pages']:>7}{row['characters']:>10}"
+              f"{row['cold_pages_per_s']:>11.1f}{row['cached_pages_per_s']:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"folder": args.folder, "files": len(files), "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
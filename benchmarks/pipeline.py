@@ -0,0 +1,382 @@
+"""
+benchmarks/pipeline.py
+----------------------
+Offline benchmark of the RAG pipeline stages on a synthetic corpus.
+
+The HuggingFace embedder, Ollama and the CrossEncoder are replaced by deterministic local
+stand-ins (hashed bag-of-words embeddings, an LLM that echoes context words with a configurable
+latency model, and a word-overlap reranker), so the numbers measure the pipeline itself and the
+run needs no network or models. Reports throughput and latency percentiles for loading,
+splitting, indexing, retrieval, reranking, RAGPipeline.ask and RAGPipeline.ask_batch, and can compare against a
+previous run's JSON to catch regressions. If a stage returns no result or an error answer, the run exits
+with status 1 instead of reporting timings.
+
+Usage:
+    python benchmarks/pipeline.py --num-docs 200 --num-queries 100 --output results.json
+    python benchmarks/pipeline.py --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from llama_index.core import QueryBundle, Settings
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.embeddings.langchain import LangchainEmbedding
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from data_loader import load_documents, split_documents  # pylint: disable=wrong-import-position
+from query_engine import (  # pylint: disable=wrong-import-position
+    ERROR_ANSWERS,
+    build_vector_index,
+    create_query_engine,
+    initialize_reranker,
+    rerank_nodes,
+    retrieve_nodes,
+)
+from rag_pipeline import RAGPipeline  # pylint: disable=wrong-import-position
+
+WORD_PATTERN = re.compile(r"\w+")
+
+TOPICS = ["leave", "travel", "expenses", "security", "remote work", "equipment", "overtime", "benefits",
+          "conduct", "privacy", "training", "onboarding", "procurement", "retention", "incident response"]
+VERBS = ["must", "may", "should", "shall not", "is required to", "is encouraged to"]
+ACTIONS = ["submit a request", "notify their manager", "obtain written approval", "keep receipts",
+           "complete the form", "report the incident", "encrypt the device", "record the hours",
+           "attach supporting documents", "follow the escalation path"]
+LIMITS = ["within {n} days", "before {n} business days", "up to {n} hours", "no more than ${n}",
+          "at least {n} weeks in advance", "for a maximum of {n} days"]
+ROLES = ["Employees", "Contractors", "Managers", "Interns", "Team leads", "Department heads"]
+
+
+# ---------------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------------
+def _sentence(rng, topic):
+    limit = LIMITS[rng.integers(len(LIMITS))].format(n=int(rng.integers(1, 90)))
+    return (f"{ROLES[rng.integers(len(ROLES))]} {VERBS[rng.integers(len(VERBS))]} "
+            f"{ACTIONS[rng.integers(len(ACTIONS))]} for {topic} matters {limit}.")
+
+
+def generate_corpus(folder, num_docs=100, sections_per_doc=12, sentences_per_section=8, seed=0):
+    """
+    Write num_docs policy-like text files with numbered sections to folder.
+    Returns a list of sentences sampled from the corpus, used as benchmark queries.
+    """
+    rng = np.random.default_rng(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    sentences = []
+    for doc in range(num_docs):
+        topic = TOPICS[doc % len(TOPICS)]
+        lines = [f"{topic.title()} Policy {doc:04d}", ""]
+        for section in range(1, sections_per_doc + 1):
+            lines.append(f"{section}. {topic.title()} rule {section}")
+            body = [_sentence(rng, topic) for _ in range(sentences_per_section)]
+            sentences.extend(body)
+            lines.extend([" ".join(body), ""])
+        (folder / f"policy_{doc:04d}.txt").write_text("\n".join(lines), encoding="utf-8")
+    return sentences
+
+
+def make_queries(sentences, num_queries, seed=1):
+    """Questions built from corpus sentences, so each has relevant chunks."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(sentences), size=min(num_queries, len(sentences)), replace=False)
+    return [f"What is the rule: {sentences[i].rstrip('.').lower()}?" for i in picks]
+
+
+# ---------------------------------------------------------------------------------
+# Offline stand-ins for the embedder, the LLM and the reranker
+# ---------------------------------------------------------------------------------
+class HashingEmbeddings(Embeddings):
+    """Deterministic signed feature-hashing of words into dim buckets, L2-normalized."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            bucket = zlib.crc32(word.encode("utf-8"))
+            vector[bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class EchoLLM(CustomLLM):
+    """
+    Answers with the first num_output words of the prompt.
+    Latency is modelled as prompt_ms per 1000 prompt words plus token_ms per generated word.
+    """
+
+    context_window: int = 2048
+    num_output: int = 64
+    prompt_ms: float = 0.0
+    token_ms: float = 0.0
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=self.context_window, num_output=self.num_output, model_name="echo")
+
+    def _tokens(self, prompt):
+        words = prompt.split()
+        time.sleep(self.prompt_ms * len(words) / 1000.0 / 1000.0)
+        for word in words[:self.num_output]:
+            if self.token_ms:
+                time.sleep(self.token_ms / 1000.0)
+            yield word + " "
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+        text = ""
+        for token in self._tokens(prompt):
+            text += token
+            yield CompletionResponse(text=text, delta=token)
+
+
+class OverlapReranker:
+    """Scores (query, passage) pairs by word-set Jaccard overlap, with CrossEncoder's predict() signature."""
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        scores = []
+        for query, passage in pairs:
+            query_words = set(WORD_PATTERN.findall(query.lower()))
+            passage_words = set(WORD_PATTERN.findall(passage.lower()))
+            union = query_words | passage_words
+            scores.append(len(query_words & passage_words) / len(union) if union else 0.0)
+        return np.asarray(scores, dtype=np.float32)
+
+
+# ---------------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------------
+def latency_summary(latencies):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    return {
+        "count": int(len(latencies)),
+        "qps": float(len(latencies) / latencies.sum()) if latencies.sum() else 0.0,
+        "mean_ms": float(latencies.mean() * 1000.0),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000.0),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000.0),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000.0),
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class BenchmarkFailure(Exception):
+    """Raised when a stage returns no result or an error answer, so its timings would be meaningless."""
+
+
+def check_answers(stage, results):
+    """Raise BenchmarkFailure unless every result of stage is a real answer."""
+    failed = [
+        result for result in results
+        if result is None or result.get("error") or result.get("answer") in ERROR_ANSWERS
+    ]
+    if failed:
+        raise BenchmarkFailure(f"{stage}: {len(failed)} of {len(results)} questions failed, e.g. {failed[0]}")
+
+
+def run(args, workdir):
+    corpus_dir = Path(workdir) / "corpus"
+    sentences = generate_corpus(corpus_dir, args.num_docs, args.sections, args.sentences, seed=args.seed)
+    queries = make_queries(sentences, args.num_queries, seed=args.seed + 1)
+    corpus_bytes = sum(path.stat().st_size for path in corpus_dir.iterdir())
+    stages = {}
+
+    docs, seconds = timed(load_documents, str(corpus_dir), workers=args.workers)
+    stages["load_documents"] = {"seconds": seconds, "docs_per_s": len(docs) / seconds,
+                                "mb_per_s": corpus_bytes / 2 ** 20 / seconds}
+
+    chunking = {
+        "chunker": args.chunker,
+        "chunk_tokens": args.chunk_tokens,
+        "chunk_overlap_tokens": args.chunk_overlap_tokens,
+    }
+    chunks, seconds = timed(
+        split_documents, docs, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, **chunking
+    )
+    stages["split_documents"] = {"seconds": seconds, "chunks": len(chunks), "chunks_per_s": len(chunks) / seconds}
+
+    embeddings = HashingEmbeddings(args.dim)
+    llm = EchoLLM(prompt_ms=args.llm_prompt_ms, token_ms=args.llm_token_ms)
+    reranker = OverlapReranker()
+    embed_model = LangchainEmbedding(embeddings, embed_batch_size=32)
+    Settings.embed_model = embed_model
+    Settings.llm = llm
+
+    index, seconds = timed(build_vector_index, chunks, index_type=args.vector_index, lexical=args.hybrid)
+    if index is None:
+        raise BenchmarkFailure("build_vector_index: no index was built")
+    stages["build_vector_index"] = {"seconds": seconds, "chunks_per_s": len(chunks) / seconds}
+
+    query_engine = create_query_engine(index, llm, candidate_k=args.candidates, hybrid=args.hybrid)
+    initialize_reranker(model=reranker)
+    retrieve_latencies, rerank_latencies = [], []
+    for query in queries:
+        bundle = QueryBundle(query)
+        candidates, seconds = timed(
+            retrieve_nodes, query_engine, bundle, top_k=args.candidates, embed_model=embed_model
+        )
+        if not candidates:
+            raise BenchmarkFailure(f"retrieval: no candidates for {query!r}")
+        retrieve_latencies.append(seconds)
+        _, seconds = timed(rerank_nodes, candidates, query, top_k=args.top_k)
+        rerank_latencies.append(seconds)
+    stages["retrieval"] = latency_summary(retrieve_latencies)
+    stages["reranking"] = latency_summary(rerank_latencies)
+
+    pipeline, seconds = timed(
+        RAGPipeline,
+        docs_folder=str(corpus_dir),
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        **chunking,
+        persist_dir=str(Path(workdir) / "vector_store"),
+        answer_cache_size=0,
+        vector_index=args.vector_index,
+        hybrid_search=args.hybrid,
+        rerank_candidates=args.candidates,
+        embeddings=embeddings,
+        llm=llm,
+        reranker=reranker,
+        extractive_threshold=args.extractive_threshold,
+    )
+    if getattr(pipeline, "query_engine", None) is None:
+        raise BenchmarkFailure("pipeline_init: the pipeline has no query engine")
+    stages["pipeline_init"] = {"seconds": seconds}
+    answers, ask_latencies = zip(*(timed(pipeline.ask, query, top_k=args.top_k) for query in queries))
+    check_answers("ask", answers)
+    stages["ask"] = latency_summary(ask_latencies)
+    results, seconds = timed(
+        lambda: list(pipeline.ask_batch(queries, top_k=args.top_k, concurrency=args.batch_concurrency))
+    )
+    check_answers("ask_batch", results)
+    if len(results) != len(queries):
+        raise BenchmarkFailure(f"ask_batch: {len(results)} results for {len(queries)} questions")
+    stages["ask_batch"] = {"seconds": seconds, "questions_per_s": len(results) / seconds,
+                           "sequential_questions_per_s": len(queries) / sum(ask_latencies)}
+    if args.extractive_threshold is not None:
+        extractive = pipeline.stats()["extractive"]
+        stages["extractive"] = {key: value for key, value in extractive.items() if value is not None}
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "corpus": {"docs": len(docs), "bytes": corpus_bytes, "chunks": len(chunks), "queries": len(queries)},
+        "stages": stages,
+    }
+
+
+# Per-stage metric checked against a baseline, and whether higher is better
+REGRESSION_METRICS = {
+    "load_documents": ("docs_per_s", True),
+    "split_documents": ("chunks_per_s", True),
+    "build_vector_index": ("chunks_per_s", True),
+    "retrieval": ("p50_ms", False),
+    "reranking": ("p50_ms", False),
+    "ask": ("p50_ms", False),
+    "ask_batch": ("questions_per_s", True),
+}
+
+
+def find_regressions(results, baseline, tolerance):
+    """Return one message per stage whose key metric is worse than baseline by more than tolerance."""
+    regressions = []
+    for stage, (metric, higher_is_better) in REGRESSION_METRICS.items():
+        old = baseline.get("stages", {}).get(stage, {}).get(metric)
+        new = results["stages"].get(stage, {}).get(metric)
+        if not old or new is None:
+            continue
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            regressions.append(f"{stage}.{metric}: {old:.2f} -> {new:.2f} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-docs", type=int, default=100)
+    parser.add_argument("--sections", type=int, default=12, help="sections per document")
+    parser.add_argument("--sentences", type=int, default=8, help="sentences per section")
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--chunker", default="section", choices=["section", "recursive"])
+    parser.add_argument("--chunk-tokens", type=int, default=256, help="section chunker: max tokens per chunk")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1024, help="recursive chunker: characters per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=128)
+    parser.add_argument("--dim", type=int, default=384, help="stand-in embedding dimension")
+    parser.add_argument("--workers", type=int, default=1, help="document loading processes")
+    parser.add_argument("--vector-index", default="exact")
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false")
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--extractive-threshold", type=float, help="answer confident lookups without the LLM")
+    parser.add_argument("--batch-concurrency", type=int, default=2, help="ask_batch: answers generated at once")
+    parser.add_argument("--llm-prompt-ms", type=float, default=0.0, help="stand-in LLM ms per 1000 prompt words")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0, help="stand-in LLM ms per generated token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown vs the baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    try:
+        results = run(args, workdir)
+    except BenchmarkFailure as e:
+        print(f"FAILED {e}")
+        sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    corpus = results["corpus"]
+    print(f"{corpus['docs']} docs, {corpus['chunks']} chunks, {corpus['queries']} queries")
+    for stage, values in results["stages"].items():
+        print(f"{stage:<20}" + "  ".join(f"{key}={value:.2f}" for key, value in values.items()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            regressions = find_regressions(results, json.load(handle), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+benchmarks/quantized_search.py
+------------------------------
+Memory, latency and recall of quantized exact search (float16, int8, binary) against float32,
+with and without full-precision rescoring of the shortlist.
+
+Usage:
+    python benchmarks/quantized_search.py --num-vectors 200000 --dim 1024
+    python benchmarks/quantized_search.py --store data/vector_store/<key> --rescore-factor 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from quantization import QuantizedVectors  # pylint: disable=wrong-import-position
+from vector_search import benchmark_exact, exact_top_k, percentile_ms, synthetic_embeddings  # pylint: disable=wrong-import-position
+from vector_store import EMBEDDINGS_FILE, _normalize  # pylint: disable=wrong-import-position
+
+
+def benchmark_quantized(kind, embeddings, queries, truth, top_k, rescore_factor):
+    quantized = QuantizedVectors(kind, embeddings.shape[1])
+    start = time.perf_counter()
+    quantized.append(embeddings)
+    build_s = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        if rescore_factor:
+            _, candidates = quantized.search(query, top_k * rescore_factor)
+            candidates = np.sort(candidates)
+            scores = embeddings[candidates] @ query
+            positions = candidates[np.argsort(-scores)[:top_k]]
+        else:
+            _, positions = quantized.search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & set(positions.tolist()))
+    return {"quantization": kind, "rescore_factor": rescore_factor, "memory_mb": quantized.nbytes / 2 ** 20,
+            "recall": hits / (top_k * len(queries)), "build_s": build_s,
+            "p50_ms": percentile_ms(latencies, 50), "p95_ms": percentile_ms(latencies, 95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="persisted vector store directory to benchmark instead of synthetic data")
+    parser.add_argument("--num-vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--quantization", nargs="+", default=["float16", "int8", "binary"])
+    parser.add_argument("--rescore-factor", type=int, default=4, help="shortlist size as a multiple of top-k")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.store:
+        embeddings = np.load(os.path.join(args.store, EMBEDDINGS_FILE))
+    else:
+        embeddings = synthetic_embeddings(args.num_vectors, args.dim)
+    rng = np.random.default_rng(1)
+    sample = embeddings[rng.integers(0, len(embeddings), args.num_queries)]
+    queries = _normalize(sample + 0.1 * rng.standard_normal(sample.shape).astype(np.float32))
+    top_k = min(args.top_k, len(embeddings))
+    truth = exact_top_k(embeddings, queries, top_k)
+
+    exact = benchmark_exact(embeddings, queries, top_k)
+    results = [{"quantization": "none", "rescore_factor": 0, "memory_mb": embeddings.nbytes / 2 ** 20, **exact}]
+    for kind in args.quantization:
+        for rescore_factor in (0, args.rescore_factor):
+            results.append(benchmark_quantized(kind, embeddings, queries, truth, top_k, rescore_factor))
+
+    print(f"{len(embeddings)} vectors x {embeddings.shape[1]} dims, {len(queries)} queries, recall@{top_k}")
+    print(f"{'codes':<9}{'rescore':>8}{'MB':>10}{'recall':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for row in results:
+        print(f"{row['quantization']:<9}{row['rescore_factor']:>8}{row['memory_mb']:>10.1f}{row['recall']:>8.3f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"num_vectors": len(embeddings), "dim": int(embeddings.shape[1]), "top_k": top_k,
+                       "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+benchmarks/vector_search.py
+---------------------------
+Recall-vs-latency benchmark of the FAISS index types against exact matrix search.
+
+Usage:
+    python benchmarks/vector_search.py --num-vectors 200000 --dim 1024
+    python benchmarks/vector_search.py --store data/vector_store/<key> --index-types flat hnsw ivfpq
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "src"))
+
+from ann_index import FaissSearch  # pylint: disable=wrong-import-position
+from vector_store import EMBEDDINGS_FILE, _normalize  # pylint: disable=wrong-import-position
+
+
+def synthetic_embeddings(num_vectors, dim, num_clusters=256, seed=0):
+    """Clustered unit vectors, closer to real embedding geometry than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, num_clusters, num_vectors)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((num_vectors, dim)).astype(np.float32)
+    return _normalize(vectors)
+
+
+def exact_top_k(embeddings, queries, top_k):
+    scores = queries @ embeddings.T
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    return [set(row.tolist()) for row in top]
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000.0)
+
+
+def benchmark_exact(embeddings, queries, top_k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        scores = embeddings @ query
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top[np.argsort(-scores[top])]
+        latencies.append(time.perf_counter() - start)
+    return {"index_type": "exact", "recall": 1.0, "build_s": 0.0,
+            "p50_ms": percentile_ms(latencies, 50), "p95_ms": percentile_ms(latencies, 95)}
+
+
+def benchmark_faiss(index_type, params, embeddings, queries, truth, top_k):
+    search = FaissSearch(index_type, embeddings.shape[1], params)
+    start = time.perf_counter()
+    search.build(embeddings)
+    build_s = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, positions = search.search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & set(positions.tolist()))
+    return {"index_type": index_type, "params": search.params, "recall": hits / (top_k * len(queries)),
+            "build_s": build_s, "p50_ms": percentile_ms(latencies, 50), "p95_ms": percentile_ms(latencies, 95)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="persisted vector store directory to benchmark instead of synthetic data")
+    parser.add_argument("--num-vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--index-types", nargs="+", default=["flat", "hnsw", "ivfpq"])
+    parser.add_argument("--params", default="{}", help='JSON per index type, e.g. \'{"hnsw": {"ef_search": 128}}\'')
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.store:
+        embeddings = np.load(os.path.join(args.store, EMBEDDINGS_FILE))
+    else:
+        embeddings = synthetic_embeddings(args.num_vectors, args.dim)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, so each has genuine near neighbours
+    sample = embeddings[rng.integers(0, len(embeddings), args.num_queries)]
+    queries = _normalize(sample + 0.1 * rng.standard_normal(sample.shape).astype(np.float32))
+    top_k = min(args.top_k, len(embeddings))
+    truth = exact_top_k(embeddings, queries, top_k)
+    params = json.loads(args.params)
+
+    results = [benchmark_exact(embeddings, queries, top_k)]
+    for index_type in args.index_types:
+        results.append(benchmark_faiss(index_type, params.get(index_type), embeddings, queries, truth, top_k))
+
+    print(f"{len(embeddings)} vectors x {embeddings.shape[1]} dims, {len(queries)} queries, recall@{top_k}")
+    print(f"{'index':<8}{'recall':>8}{'build s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for row in results:
+        print(f"{row['index_type']:<8}{row['recall']:>8.3f}{row['build_s']:>10.2f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"num_vectors": len(embeddings), "dim": int(embeddings.shape[1]), "top_k": top_k,
+                       "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+run_api.py
+-----------
+Serves the RAG pipeline over HTTP with FastAPI.
+
+Requests name a corpus (a document folder); an IndexManager loads each corpus's RAGPipeline on
+demand, shares one embedding model, LLM client and reranker between them, and evicts the least
+recently used indexes beyond RAG_MEMORY_BUDGET_MB. Blocking retrieval and LLM work runs in a
+thread pool so the event loop stays responsive, at most RAG_MAX_CONCURRENCY requests talk to
+Ollama at once, and the rest wait in a bounded queue with a timeout.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+# ---------------------------------------------------------------------------------
+# Setup Paths
+# ---------------------------------------------------------------------------------
+BASE_DIR = Path(__file__).resolve().parent
+SRC_DIR = BASE_DIR / "src"
+
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from src.index_manager import IndexManager, discover_corpora  # type: ignore  # pylint: disable=wrong-import-position
+from src.utils import setup_logger  # type: ignore  # pylint: disable=wrong-import-position
+# Imported by its flat name, like the pipeline modules do, so both share one metrics registry
+from metrics import render_prometheus  # type: ignore  # pylint: disable=wrong-import-position
+
+LOG_PATH = BASE_DIR / "logs" / "api.log"
+logger = setup_logger(str(LOG_PATH))
+
+# ---------------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------------
+DOCS_FOLDER = os.getenv("RAG_DOCS_FOLDER", str(BASE_DIR / "data" / "sample_policies"))
+CORPORA_DIR = os.getenv("RAG_CORPORA_DIR")  # one corpus per sub-folder; otherwise DOCS_FOLDER is the only corpus
+DEFAULT_CORPUS = os.getenv("RAG_DEFAULT_CORPUS")  # used when a request names no corpus
+MEMORY_BUDGET_MB = float(os.getenv("RAG_MEMORY_BUDGET_MB", "2048"))  # loaded indexes kept within this budget
+PERSIST_DIR = os.getenv("RAG_PERSIST_DIR", str(BASE_DIR / "data" / "vector_store"))
+MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "4"))  # simultaneous Ollama generations
+MAX_QUEUE = int(os.getenv("RAG_MAX_QUEUE", "64"))  # requests allowed to wait for a slot
+MAX_CORPUS_LOADS = int(os.getenv("RAG_MAX_CORPUS_LOADS", "1"))  # corpora loaded or refreshed at once
+QUEUE_TIMEOUT = float(os.getenv("RAG_QUEUE_TIMEOUT", "30"))  # seconds a request may wait for a slot
+REQUEST_TIMEOUT = float(os.getenv("RAG_REQUEST_TIMEOUT", "120"))  # seconds a request may run once started
+MICRO_BATCH_MS = float(os.getenv("RAG_MICRO_BATCH_MS", "5"))  # window for coalescing query embeddings/reranks
+LAZY_MODELS = os.getenv("RAG_LAZY_MODELS", "1") == "1"  # load models in parallel, serve before the reranker is ready
+SESSION_DB = os.getenv("RAG_SESSION_DB")  # SQLite file persisting conversation histories; unset keeps them in memory
+SESSION_TTL = float(os.getenv("RAG_SESSION_TTL", "86400"))  # seconds an idle session is kept
+# CrossEncoder confidence above which a retrieved sentence is returned without generation; unset disables it
+EXTRACTIVE_THRESHOLD = float(os.getenv("RAG_EXTRACTIVE_THRESHOLD")) if os.getenv("RAG_EXTRACTIVE_THRESHOLD") else None
+
+
+class AskRequest(BaseModel):
+    query: str
+    corpus: str | None = None
+    session_id: str | None = None
+    top_k: int = 5
+    trace: bool = False
+
+
+class AskResponse(BaseModel):
+    answer: str
+    citations: list[str]
+    spans: list[dict] = []
+    mode: str | None = None
+    standalone_query: str | None = None
+    session_id: str
+    corpus: str
+    trace: dict | None = None
+
+
+# Returned by next() on an exhausted token stream
+END_OF_STREAM = object()
+
+
+class ServiceBusy(Exception):
+    """Raised when the request queue is full or a request waited too long for a slot."""
+
+
+class GenerationSlots:
+    """Bounded concurrency for LLM calls, with a bounded, time-limited wait queue in front."""
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self.waiting = 0
+
+    async def acquire(self):
+        if self.waiting >= self._max_queue:
+            raise ServiceBusy("Request queue is full.")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self._queue_timeout)
+        except asyncio.TimeoutError as exc:
+            raise ServiceBusy("Timed out waiting for a free generation slot.") from exc
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY + 4, thread_name_prefix="rag")
+    loop = asyncio.get_running_loop()
+    state["executor"] = executor
+    # Corpus loads and refreshes parse and embed documents for minutes; they get their own threads so they
+    # never take the workers that answer questions
+    state["loader"] = ThreadPoolExecutor(max_workers=MAX_CORPUS_LOADS, thread_name_prefix="corpus-load")
+    state["slots"] = GenerationSlots(MAX_CONCURRENCY, MAX_QUEUE, QUEUE_TIMEOUT)
+    corpora = discover_corpora(CORPORA_DIR) if CORPORA_DIR else {"default": DOCS_FOLDER}
+    if not corpora:
+        raise RuntimeError(f"No corpus folders found in {CORPORA_DIR}.")
+    state["default_corpus"] = DEFAULT_CORPUS or next(iter(corpora))
+    state["manager"] = await loop.run_in_executor(
+        executor,
+        lambda: IndexManager(
+            corpora,
+            persist_dir=PERSIST_DIR,
+            memory_budget_mb=MEMORY_BUDGET_MB,
+            micro_batch_wait_ms=MICRO_BATCH_MS,
+            lazy_models=LAZY_MODELS,
+            extractive_threshold=EXTRACTIVE_THRESHOLD,
+            session_store_path=SESSION_DB,
+            session_ttl=SESSION_TTL,
+            query_condensation="llm",  # every request has a session
+        ),
+    )
+    if getattr(state["manager"], "llm", None) is None:
+        raise RuntimeError("Pipeline initialization failed. Check logs for details.")
+    # Load the default corpus before serving, so the first request does not pay for it
+    await get_pipeline(state["default_corpus"])
+    logger.info(
+        "RAG API ready | corpora=%s | max_concurrency=%s | max_queue=%s", list(corpora), MAX_CONCURRENCY, MAX_QUEUE
+    )
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+    state["loader"].shutdown(wait=False, cancel_futures=True)
+    embedding_cache = getattr(state["manager"], "embedding_cache", None)
+    if embedding_cache is not None:
+        embedding_cache.flush()
+
+
+app = FastAPI(title="RAG Chatbot with Citation", lifespan=lifespan)
+
+
+async def run_loading(func, *args):
+    """Run a corpus load or refresh on the bounded loader pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(state["loader"], lambda: func(*args))
+
+
+async def get_pipeline(corpus):
+    """Return the pipeline of corpus (the default corpus if None), loading it on the loader pool if needed."""
+    corpus = corpus or state["default_corpus"]
+    try:
+        pipeline = state["manager"].loaded(corpus)
+        if pipeline is None:
+            pipeline = await run_loading(state["manager"].get, corpus)
+        return corpus, pipeline
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"Unknown corpus: {corpus}") from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+async def acquire_slot():
+    try:
+        await state["slots"].acquire()
+    except ServiceBusy as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+
+
+def release_slot_when_done(future):
+    """
+    Release the request's generation slot once future (a worker pool call) finishes. A request that stops
+    waiting on a timeout keeps its slot until the work it started is really done, so abandoned generations
+    still count against MAX_CONCURRENCY.
+    """
+    loop = asyncio.get_running_loop()
+
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(state["slots"].release)
+        except RuntimeError:
+            pass  # event loop already closed at shutdown
+
+    future.add_done_callback(release)
+
+
+@app.get("/health")
+async def health():
+    manager = state["manager"]
+    manager_stats = manager.stats()
+    # A failed reranker leaves the API answering without reranking, and a failed refresh serves an index that
+    # may not be persisted or up to date; health checks should see both
+    degraded = manager_stats["model_load_errors"] or manager_stats["refresh_errors"]
+    return {
+        "status": "degraded" if degraded else "ok",
+        "waiting": state["slots"].waiting,
+        "reranker_ready": manager.reranker_ready.is_set(),
+        "reranker": manager.reranker_status,
+        "model_load_errors": manager_stats["model_load_errors"],
+        "refresh_errors": manager_stats["refresh_errors"],
+        "loaded_corpora": list(manager_stats["loaded"]),
+    }
+
+
+@app.get("/stats")
+async def stats(corpus: str | None = None):
+    """Index manager stats, or the pipeline stats of one corpus."""
+    if corpus is None:
+        return state["manager"].stats()
+    _, pipeline = await get_pipeline(corpus)
+    return pipeline.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Pipeline counters and histograms in the Prometheus text format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/ask", response_model=AskResponse)
+async def ask(request: AskRequest):
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Please enter a valid question.")
+    session_id = request.session_id or uuid.uuid4().hex
+    corpus, pipeline = await get_pipeline(request.corpus)
+
+    await acquire_slot()
+    future = state["executor"].submit(
+        pipeline.ask, request.query, top_k=request.top_k, session_id=session_id, trace=request.trace
+    )
+    release_slot_when_done(future)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError as exc:
+        logger.error("Query timed out after %ss: %s", REQUEST_TIMEOUT, request.query)
+        raise HTTPException(status_code=504, detail="The answer took too long to generate.") from exc
+
+    if result is None:
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while processing your question.")
+    return AskResponse(
+        answer=result["answer"],
+        citations=result["citations"],
+        spans=result.get("spans", []),
+        mode=result.get("mode"),
+        standalone_query=result.get("standalone_query"),
+        session_id=session_id,
+        corpus=corpus,
+        trace=result.get("trace"),
+    )
+
+
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    """
+    Stream an answer as newline-delimited JSON: one {"citations", "spans", "mode", "session_id", "corpus"} line
+    (plus "trace" when requested), then one {"token"} line per generated token. Retrieval and generation together
+    get REQUEST_TIMEOUT seconds; an answer still streaming then ends with an {"error"} line.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Please enter a valid question.")
+    session_id = request.session_id or uuid.uuid4().hex
+    corpus, pipeline = await get_pipeline(request.corpus)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + REQUEST_TIMEOUT
+    await acquire_slot()
+    retrieval = state["executor"].submit(
+        pipeline.ask_stream, request.query, top_k=request.top_k, session_id=session_id, trace=request.trace
+    )
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(retrieval), timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError as exc:
+        release_slot_when_done(retrieval)
+        raise HTTPException(status_code=504, detail="Retrieval took too long.") from exc
+    except BaseException:
+        release_slot_when_done(retrieval)
+        raise
+    if result is None:
+        release_slot_when_done(retrieval)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while processing your question.")
+    tokens = result["tokens"]
+
+    async def body():
+        # The slot is held until generation finishes, times out or the client disconnects; each token is
+        # pulled on the worker pool, and the token stream is closed once no pull is in flight
+        pending = None
+        try:
+            header = {
+                "citations": result["citations"],
+                "spans": result.get("spans", []),
+                "mode": result.get("mode"),
+                "standalone_query": result.get("standalone_query"),
+                "session_id": session_id,
+                "corpus": corpus,
+            }
+            if "trace" in result:
+                header["trace"] = result["trace"]
+            yield json.dumps(header) + "\n"
+            while True:
+                pending = state["executor"].submit(next, tokens, END_OF_STREAM)
+                try:
+                    token = await asyncio.wait_for(asyncio.wrap_future(pending), timeout=max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    logger.error("Streamed answer timed out after %ss: %s", REQUEST_TIMEOUT, request.query)
+                    yield json.dumps({"error": "The answer took too long to generate."}) + "\n"
+                    break
+                if token is END_OF_STREAM:
+                    break
+                yield json.dumps({"token": token}) + "\n"
+        finally:
+            if pending is None:
+                pending = retrieval  # already done
+            pending.add_done_callback(lambda _: tokens.close())
+            release_slot_when_done(pending)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.get("/sessions/{session_id}/history")
+async def get_history(session_id: str, corpus: str | None = None):
+    corpus, pipeline = await get_pipeline(corpus)
+    return {"session_id": session_id, "corpus": corpus, "history": pipeline.get_history(session_id) or []}
+
+
+@app.delete("/sessions/{session_id}")
+async def clear_history(session_id: str, corpus: str | None = None):
+    corpus, pipeline = await get_pipeline(corpus)
+    pipeline.clear_history(session_id)
+    return {"session_id": session_id, "corpus": corpus, "cleared": True}
+
+
+@app.post("/refresh")
+async def refresh(corpus: str | None = None):
+    _, pipeline = await get_pipeline(corpus)
+    try:
+        return await run_loading(pipeline.refresh)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Index refresh failed: {exc}") from exc
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=os.getenv("RAG_HOST", "127.0.0.1"), port=int(os.getenv("RAG_PORT", "8000")))
@@ -5,7 +5,9 @@ Runs the RAG Chatbot with a clean Streamlit web interface.
 """
 
 import logging
+import os
 import sys
+import uuid
 from pathlib import Path
 
 import streamlit as st
@@ -20,7 +22,7 @@ if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
 # Import RAG pipeline
-from src.rag_pipeline import RAGPipeline  # type: ignore  # pylint: disable=wrong-import-position
+from src.index_manager import IndexManager, discover_corpora  # type: ignore  # pylint: disable=wrong-import-position
 from src.utils import setup_logger  # type: ignore  # pylint: disable=wrong-import-position
 
 
@@ -51,26 +53,67 @@ st.markdown("Ask any question from your knowledge base and get responses with do
 # ---------------------------------------------------------------------------------
 # Initialize RAG Pipeline
 # ---------------------------------------------------------------------------------
+# Set RAG_CORPORA_DIR to a folder with one sub-folder per document set to choose between corpora
+CORPORA_DIR = os.getenv("RAG_CORPORA_DIR")
+
+
 @st.cache_resource(show_spinner=True)
-def load_pipeline() -> RAGPipeline:
+def load_manager() -> IndexManager:
     try:
-        rag = RAGPipeline(docs_folder=str(BASE_DIR / "data" / "sample_policies"))
-        logger.info("RAG pipeline initialized successfully.")
-        return rag
+        corpora = discover_corpora(CORPORA_DIR) if CORPORA_DIR else {}
+        manager = IndexManager(
+            corpora or {"sample_policies": str(BASE_DIR / "data" / "sample_policies")},
+            persist_dir=str(BASE_DIR / "data" / "vector_store"),
+            memory_budget_mb=float(os.getenv("RAG_MEMORY_BUDGET_MB", "2048")),
+            lazy_models=True,
+            query_condensation="llm",
+            metrics_file=str(BASE_DIR / "logs" / "metrics.prom"),
+        )
+        logger.info("Index manager initialized successfully.")
+        return manager
     except Exception as exc:  # pylint: disable=broad-except
         logger.exception("Pipeline initialization failed: %s", exc)
         st.error("Failed to initialize RAG pipeline. Check logs for details.")
         raise AppException("Pipeline initialization failed.", exc) from exc
 
 
-rag_pipeline = load_pipeline()
+index_manager = load_manager()
+
+with st.sidebar:
+    corpus = st.selectbox("📁 Document set", sorted(index_manager.corpora))
+
+try:
+    with st.spinner(f"Loading '{corpus}' index..."):
+        rag_pipeline = index_manager.get(corpus)
+except Exception as exc:  # pylint: disable=broad-except
+    logger.exception("Failed to load corpus '%s': %s", corpus, exc)
+    st.error(f"Failed to load the '{corpus}' document set. Check logs for details.")
+    st.stop()
+
+
+# ---------------------------------------------------------------------------------
+# Index Refresh
+# ---------------------------------------------------------------------------------
+with st.sidebar:
+    if st.button("🔄 Refresh Index", use_container_width=True):
+        try:
+            with st.spinner("Re-indexing changed documents..."):
+                stats = rag_pipeline.refresh()
+            st.success(
+                f"Added {stats['added']}, updated {stats['updated']}, "
+                f"deleted {stats['deleted']}, skipped {stats['skipped']} files."
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            st.error(f"Index refresh failed: {exc}")
 
 
 # ---------------------------------------------------------------------------------
 # Chat Interface
 # ---------------------------------------------------------------------------------
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history: list[dict[str, object]] = []
+# The pipeline keeps each browser session's history (bounded, and used to condense follow-up questions)
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+session_id = st.session_state.session_id
 
 user_query = st.text_input("💬 Enter your question:", placeholder="What is the refund policy?")
 
@@ -82,38 +125,40 @@ with col2:
     clear_clicked = st.button("Clear History", use_container_width=True)
 
 if clear_clicked:
-    st.session_state.chat_history.clear()
+    rag_pipeline.clear_history(session_id)
     st.success("Chat history cleared.")
 
 if ask_clicked:
     if user_query.strip():
-        with st.spinner("Generating answer..."):
-            try:
-                result = rag_pipeline.ask(user_query)
-                answer = result.get("answer", "No answer found.")
-                sources = result.get("citations") or result.get("sources") or []
-
-                st.session_state.chat_history.append(
-                    {"query": user_query, "answer": answer, "sources": sources}
-                )
-
-                logger.info("Response generated for query: %s", user_query)
-            except AppException as exc:
-                logger.error("AppException while processing query: %s", exc)
-                st.error(str(exc))
-            except Exception as exc:  # pylint: disable=broad-except
-                logger.exception("Unexpected error while processing query '%s': %s", user_query, exc)
-                st.error("An unexpected error occurred while processing your question.")
+        try:
+            result = rag_pipeline.ask_stream(user_query, session_id=session_id)
+            sources = result.get("citations") or []
+
+            # Render tokens as they arrive; the finished answer moves into the history below
+            live_answer = st.empty()
+            with live_answer.container():
+                if sources:
+                    st.markdown("**📚 Sources:** " + ", ".join(f"`{src}`" for src in sources))
+                st.write_stream(result["tokens"])
+            live_answer.empty()
+
+            logger.info("Response generated for query: %s", user_query)
+        except AppException as exc:
+            logger.error("AppException while processing query: %s", exc)
+            st.error(str(exc))
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.exception("Unexpected error while processing query '%s': %s", user_query, exc)
+            st.error("An unexpected error occurred while processing your question.")
     else:
         st.warning("Please enter a valid question.")
 
 # ---------------------------------------------------------------------------------
 # Display Chat History
 # ---------------------------------------------------------------------------------
-for chat in reversed(st.session_state.chat_history):
+for chat in reversed(rag_pipeline.get_history(session_id) or []):
     with st.expander(f"❓ {chat['query']}"):
-        st.write(chat["answer"])
-        sources = chat.get("sources") or []
+        st.write(chat["answer"] or "No answer found.")
+        sources = chat.get("citations") or []
         if sources:
             st.markdown("**📚 Sources:**")
             for src in sources:
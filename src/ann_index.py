@@ -0,0 +1,170 @@
+import json
+import os
+
+import numpy as np
+from utils import logger
+
+# "exact" is the numpy matrix search in ArrayVectorStore; the others are FAISS indexes
+INDEX_TYPES = ("exact", "flat", "hnsw", "ivfpq")
+
+DEFAULT_PARAMS = {
+    "flat": {},
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+    "ivfpq": {"nlist": 1024, "m": 64, "nbits": 8, "nprobe": 16},
+}
+
+ANN_INDEX_FILE = "ann.faiss"
+ANN_META_FILE = "ann.json"
+
+# IVF-PQ needs this many training vectors per list (FAISS warns below 39)
+MIN_POINTS_PER_LIST = 39
+
+# An IVF-PQ index trained with fewer lists than configured is retrained once the corpus grows this many times over
+RETRAIN_GROWTH = 4
+
+
+class FaissSearch:
+    """
+    Inner-product FAISS index over the rows of an embedding matrix.
+    Row positions are FAISS ids, so results map straight back to store positions.
+    Vectors must already be L2-normalized, making inner product equal to cosine similarity.
+    """
+
+    def __init__(self, index_type, dim, params=None):
+        if index_type not in DEFAULT_PARAMS:
+            raise ValueError(f"Unknown FAISS index type: {index_type}. Expected one of {list(DEFAULT_PARAMS)}")
+        self.index_type = index_type
+        self.dim = dim
+        self.params = {**DEFAULT_PARAMS[index_type], **(params or {})}
+        self.index = None
+        # The FAISS index actually built: index_type, or "flat" while there are too few vectors to train IVF-PQ
+        self.built_as = None
+        self.trained_on = 0
+
+    def __len__(self):
+        return 0 if self.index is None else self.index.ntotal
+
+    @property
+    def nbytes(self):
+        """Approximate size of the index: full vectors (plus graph links for HNSW) or PQ codes."""
+        if self.index is None:
+            return 0
+        if hasattr(self.index, "pq"):
+            return len(self) * (self.index.pq.code_size + 8)
+        per_vector = self.dim * 4
+        if self.index_type == "hnsw":
+            per_vector += self.params["M"] * 2 * 4
+        return len(self) * per_vector
+
+    def _nlist(self, num_vectors):
+        return min(self.params["nlist"], max(1, num_vectors // MIN_POINTS_PER_LIST))
+
+    def _trainable(self, num_vectors):
+        return not self.dim % self.params["m"] and num_vectors >= 2 ** self.params["nbits"]
+
+    def needs_rebuild(self, num_vectors):
+        """
+        Whether an IVF-PQ index should be rebuilt now that it holds num_vectors rows: it fell back to a flat
+        index while there were too few vectors to train on, or it was trained with fewer lists than configured
+        on a corpus that has since grown RETRAIN_GROWTH times over.
+        """
+        if self.index_type != "ivfpq" or self.index is None:
+            return False
+        if self.built_as == "flat":
+            return self._trainable(num_vectors)
+        return self._nlist(self.trained_on) < self.params["nlist"] and num_vectors >= RETRAIN_GROWTH * self.trained_on
+
+    def _create(self, num_vectors):
+        import faiss
+
+        self.built_as = self.index_type
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dim, self.params["M"], faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.params["ef_construction"]
+            return index
+
+        if self.index_type == "ivfpq":
+            if not self._trainable(num_vectors):
+                logger.warning(
+                    f"Cannot train IVF-PQ (dim={self.dim}, m={self.params['m']}, vectors={num_vectors}); "
+                    f"using a flat index until there are enough vectors"
+                )
+                self.built_as = "flat"
+                return faiss.IndexFlatIP(self.dim)
+            quantizer = faiss.IndexFlatIP(self.dim)
+            return faiss.IndexIVFPQ(
+                quantizer, self.dim, self._nlist(num_vectors), self.params["m"], self.params["nbits"],
+                faiss.METRIC_INNER_PRODUCT,
+            )
+
+        return faiss.IndexFlatIP(self.dim)
+
+    def _apply_search_params(self):
+        if self.index_type == "hnsw" and hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = self.params["ef_search"]
+        elif self.index_type == "ivfpq" and hasattr(self.index, "nprobe"):
+            self.index.nprobe = self.params["nprobe"]
+
+    def build(self, embeddings):
+        """Create, train if needed, and fill the index from all rows of embeddings."""
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.index = self._create(len(vectors))
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.trained_on = len(vectors)
+        self.index.add(vectors)
+        self._apply_search_params()
+        logger.info(
+            f"Built FAISS {self.index_type} index ({self.built_as}) over {len(vectors)} vectors | params={self.params}"
+        )
+
+    def add(self, embeddings):
+        """Append rows; their ids continue from the current size."""
+        self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+    def search(self, query_vector, top_k):
+        """Return (scores, positions) of the top_k rows, best first."""
+        scores, positions = self.index.search(np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1), top_k)
+        keep = positions[0] >= 0
+        return scores[0][keep], positions[0][keep]
+
+    def save(self, directory):
+        import faiss
+
+        faiss.write_index(self.index, os.path.join(directory, ANN_INDEX_FILE))
+        with open(os.path.join(directory, ANN_META_FILE), "w", encoding="utf-8") as handle:
+            json.dump({
+                "index_type": self.index_type,
+                "built_as": self.built_as,
+                "trained_on": self.trained_on,
+                "params": self.params,
+                "size": len(self),
+            }, handle)
+
+    @classmethod
+    def load(cls, directory, index_type, params=None, expected_size=None):
+        """
+        Load a saved index if it was built with the same type and parameters over expected_size rows.
+        Returns None otherwise, so the caller rebuilds it.
+        """
+        import faiss
+
+        meta_path = os.path.join(directory, ANN_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+
+        search = cls(index_type, dim=0, params=params)
+        build_params = {key: value for key, value in search.params.items() if key not in ("ef_search", "nprobe")}
+        saved_params = {key: value for key, value in meta["params"].items() if key not in ("ef_search", "nprobe")}
+        if meta["index_type"] != index_type or saved_params != build_params or meta["size"] != expected_size:
+            logger.info(f"Persisted FAISS index at {directory} does not match the requested settings, rebuilding")
+            return None
+
+        search.index = faiss.read_index(os.path.join(directory, ANN_INDEX_FILE))
+        search.dim = search.index.d
+        search.built_as = meta["built_as"]
+        search.trained_on = meta["trained_on"]
+        search._apply_search_params()
+        return search
@@ -0,0 +1,121 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from metrics import CACHE_REQUESTS
+from utils import logger
+
+
+def normalize_query(query):
+    """Lower-case and collapse whitespace and trailing punctuation so trivial variants share a key."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of {'answer', 'citations'} results for RAGPipeline.ask.
+    Entries are keyed by normalized query and a settings key (models, top_k, ...), and belong to one
+    index version: bumping the version drops every entry.
+    With semantic_threshold set, a miss falls back to the cached query whose embedding is within that
+    cosine distance of the new query's embedding.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, semantic_threshold=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.index_version = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (normalized query, settings) -> (expires_at, result, unit embedding)
+        self._lock = threading.Lock()
+
+    def set_index_version(self, version):
+        """Invalidate every entry if the index has changed since they were cached."""
+        with self._lock:
+            if version != self.index_version:
+                if self._entries:
+                    logger.info(f"Index version {self.index_version} -> {version}, clearing {len(self._entries)} cached answers")
+                self._entries.clear()
+                self.index_version = version
+
+    def _evict_expired(self, now):
+        expired = [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, query, settings, query_embedding=None):
+        """Return a copy of the cached result for query, or None."""
+        key = (normalize_query(query), settings)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="answer", result="hit")
+                return copy.deepcopy(entry[1])
+
+            if self.semantic_threshold is not None and query_embedding is not None:
+                self._evict_expired(now)
+                match = self._nearest(query_embedding, settings)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    CACHE_REQUESTS.inc(cache="answer", result="semantic_hit")
+                    return copy.deepcopy(self._entries[match][1])
+
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="answer", result="miss")
+            return None
+
+    def _nearest(self, query_embedding, settings):
+        candidates = [(key, unit) for key, (_, _, unit) in self._entries.items() if key[1] == settings and unit is not None]
+        if not candidates:
+            return None
+        query_unit = _unit(query_embedding)
+        similarities = np.stack([unit for _, unit in candidates]) @ query_unit
+        best = int(np.argmax(similarities))
+        if 1.0 - float(similarities[best]) <= self.semantic_threshold:
+            return candidates[best][0]
+        return None
+
+    def put(self, query, settings, result, query_embedding=None, index_version=None):
+        """
+        Cache result for query under the current index version.
+        index_version is the version the result was retrieved under (read before retrieval); if the index has
+        changed since, the result may be stale and is not cached.
+        """
+        key = (normalize_query(query), settings)
+        unit = _unit(query_embedding) if query_embedding is not None else None
+        with self._lock:
+            if index_version is not None and index_version != self.index_version:
+                logger.info(f"Not caching an answer from index version {index_version}, now {self.index_version}")
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(result), unit)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        total = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
@@ -0,0 +1,213 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode
+
+from context_packing import pack_context
+from embedding import embed_queries
+from query_engine import ENGINE_NOT_INITIALIZED_ANSWER, QUERY_FAILED_ANSWER, answer_from_nodes, rerank_node_lists
+from utils import logger
+import warnings
+warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
+
+
+def read_questions(path):
+    """
+    Yield question records from a JSONL file: {"id", "question", ...}. The question may also be given as
+    "query"; id defaults to the line number. Other fields are passed through to the output (e.g. a reference
+    answer for evaluation). Blank lines are skipped.
+    """
+    with open(path, "r", encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question = record.pop("question", None) or record.pop("query", None)
+            if not question:
+                logger.warning(f"Skipping line {line_number} of {path}: no question")
+                continue
+            yield {"id": record.pop("id", line_number), "question": question, **record}
+
+
+def completed_ids(output_path):
+    """
+    Ids already answered without error in an output file, as strings, so an interrupted run can resume.
+    A partial last line left by the interruption is truncated; other unreadable lines are skipped and logged,
+    so their questions are answered again.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb+") as handle:
+        data = handle.read()
+        if data and not data.endswith(b"\n"):
+            handle.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+    done = set()
+    for line_number, line in enumerate(data.decode("utf-8", errors="replace").splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            answered = not record.get("error")
+            record_id = str(record["id"])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning(f"Skipping unreadable line {line_number} of {output_path}: {e}")
+            continue
+        if answered:
+            done.add(record_id)
+    return done
+
+
+def _batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _retrieve_batch(pipeline, records, top_k):
+    """
+    Retrieve the top_k context nodes of a batch of questions: one batched embedding pass, one blocked
+    vector search and one CrossEncoder pass over every (question, candidate) pair.
+    Returns a list of nodes per question and the amortized per-question stage timings in ms.
+    """
+    questions = [record["question"] for record in records]
+    timings = {}
+
+    started = time.perf_counter()
+    vectors = embed_queries(pipeline.embed_model, questions)
+    if vectors is None:
+        raise RuntimeError("Failed to embed the question batch")
+    timings["embedding"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    mode = VectorStoreQueryMode.HYBRID if pipeline.hybrid_search else VectorStoreQueryMode.DEFAULT
+    results = pipeline.index.vector_store.query_batch([
+        VectorStoreQuery(
+            query_embedding=vector,
+            similarity_top_k=pipeline.rerank_candidates,
+            sparse_top_k=pipeline.rerank_candidates,
+            query_str=question,
+            mode=mode,
+        )
+        for vector, question in zip(vectors, questions)
+    ])
+    node_lists = [
+        [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)]
+        for result in results
+    ]
+    timings["retrieval"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if pipeline.rerank_enabled():
+        node_lists = rerank_node_lists(node_lists, questions, top_k=top_k, batch_size=pipeline.rerank_batch_size)
+    else:
+        node_lists = [nodes[:top_k] for nodes in node_lists]
+    if pipeline.context_token_budget:
+        node_lists = [
+            pack_context(nodes, token_budget=pipeline.context_token_budget, dedup_threshold=pipeline.dedup_threshold)
+            for nodes in node_lists
+        ]
+    timings["rerank"] = time.perf_counter() - started
+
+    per_question = {f"{stage}_ms": round(seconds * 1000 / len(records), 2) for stage, seconds in timings.items()}
+    return node_lists, per_question
+
+
+def _generate(pipeline, record, nodes, timings):
+    """Answer one question from its retrieved nodes; failures are reported in the result's "error"."""
+    started = time.perf_counter()
+    try:
+        if pipeline.query_engine is None:
+            raise RuntimeError(ENGINE_NOT_INITIALIZED_ANSWER)
+        result = answer_from_nodes(
+            pipeline.query_engine,
+            record["question"],
+            nodes,
+            rerank_batch_size=pipeline.rerank_batch_size,
+            extractive_threshold=pipeline.extractive_threshold,
+            extractive_nodes=pipeline.extractive_nodes,
+        )
+        result.pop("confidence", None)
+        pipeline.count_extractive(result)
+    except Exception as e:
+        logger.error(f"Failed to answer batch question {record['id']}: {e}", exc_info=True)
+        result = {"answer": QUERY_FAILED_ANSWER, "citations": [], "spans": [], "mode": None, "error": str(e)}
+    timings = {**timings, "generation_ms": round((time.perf_counter() - started) * 1000, 2)}
+    timings["total_ms"] = round(sum(timings.values()), 2)
+    return {**record, **result, "timings_ms": timings}
+
+
+def _failed_batch(records, error):
+    return [
+        {**record, "answer": QUERY_FAILED_ANSWER, "citations": [], "spans": [], "mode": None, "error": error,
+         "timings_ms": {}}
+        for record in records
+    ]
+
+
+def answer_batch(pipeline, questions, top_k=5, concurrency=2, batch_size=64):
+    """
+    Answer an iterable of question records ({"id", "question", ...}) with a RAGPipeline, yielding each
+    result as soon as it is generated (so not necessarily in input order).
+    Questions are retrieved batch_size at a time (see _retrieve_batch) while up to concurrency answers of
+    earlier batches are generated in parallel; the answer cache and conversation histories are bypassed.
+    Each result is the input record plus answer, citations, spans, mode and timings_ms; on failure, "error".
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-generate")
+    pending = set()
+    try:
+        for records in _batches(questions, batch_size):
+            try:
+                node_lists, timings = _retrieve_batch(pipeline, records, top_k)
+            except Exception as e:
+                logger.error(f"Failed to retrieve a batch of {len(records)} questions: {e}", exc_info=True)
+                yield from _failed_batch(records, str(e))
+                continue
+            for record, nodes in zip(records, node_lists):
+                pending.add(executor.submit(_generate, pipeline, record, nodes, timings))
+            # Retrieve the next batch while this one generates, but keep at most one batch queued
+            while len(pending) > batch_size:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_batch(pipeline, input_path, output_path, top_k=5, concurrency=2, batch_size=64, resume=True):
+    """
+    Answer the questions of a JSONL file into a JSONL output file, one result per line, written as it completes.
+    With resume, questions already answered without error in output_path are skipped and new results appended,
+    so an interrupted run continues where it stopped (a retried question's later line supersedes its failed one);
+    otherwise output_path is overwritten.
+    Returns a summary: {'total', 'skipped', 'answered', 'failed', 'seconds', 'questions_per_second'}.
+    """
+    done = completed_ids(output_path) if resume else set()
+    questions = [record for record in read_questions(input_path) if str(record["id"]) not in done]
+    summary = {"total": len(questions) + len(done), "skipped": len(done), "answered": 0, "failed": 0}
+    logger.info(f"Batch run: {len(questions)} questions to answer, {len(done)} already answered in {output_path}")
+
+    started = time.perf_counter()
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+        for result in answer_batch(pipeline, questions, top_k=top_k, concurrency=concurrency, batch_size=batch_size):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            summary["failed" if result.get("error") else "answered"] += 1
+    seconds = time.perf_counter() - started
+    summary["seconds"] = round(seconds, 2)
+    summary["questions_per_second"] = round(len(questions) / seconds, 3) if seconds else None
+    pipeline.export_metrics()
+    logger.info(f"Batch run finished: {summary}")
+    return summary
@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+from utils import logger
+
+# Active batchers by name, for stats reporting
+BATCHERS = {}
+
+
+class MicroBatcher:
+    """
+    Coalesces items submitted from many threads into batched calls of batch_fn.
+    The worker waits at most max_wait_ms after the first queued item for more to arrive,
+    or until max_batch_size items are collected, runs batch_fn(items) once and fans the
+    results back out to the waiting callers.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = {}  # batch size -> number of batches
+        self._items = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+        BATCHERS[name] = self
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its result."""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def map(self, items):
+        """Queue items and block until all their results are available, in order."""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}", exc_info=True)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            self._record(len(batch), [started - queued for _, _, queued in batch])
+
+    def _record(self, size, waits):
+        with self._stats_lock:
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._items += size
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, *waits)
+
+    def stats(self):
+        """Batch size distribution and queue wait times."""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "batches": batches,
+                "items": self._items,
+                "mean_batch_size": self._items / batches if batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_wait_ms": 1000.0 * self._wait_total / self._items if self._items else 0.0,
+                "max_queue_wait_ms": 1000.0 * self._wait_max,
+            }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that coalesces concurrent embed_query calls into one
+    embed_documents forward pass. Document embedding is already batched and passes straight through.
+    """
+
+    def __init__(self, embeddings, max_batch_size=32, max_wait_ms=5.0):
+        self.embeddings = embeddings
+        self.batcher = MicroBatcher(
+            embeddings.embed_documents,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="query_embedding",
+        )
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.batcher.submit(text).result()
+
+    def embed_queries(self, texts):
+        # Already one batch; no need to wait for concurrent callers
+        return self.embeddings.embed_documents(texts)
+
+
+def batching_stats():
+    """Stats of every active batcher, by name."""
+    return {name: batcher.stats() for name, batcher in BATCHERS.items()}
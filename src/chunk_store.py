@@ -0,0 +1,149 @@
+import json
+import os
+from array import array
+
+import numpy as np
+
+CHUNK_COLUMNS_FILE = "chunk_columns.npy"
+
+# Metadata keys stored as columns; any others are kept per chunk in a sparse dict
+SOURCE_KEY = "source"
+PAGE_KEY = "page"
+TOKEN_COUNT_KEY = "token_count"
+SECTION_KEY = "section"
+START_CHAR_KEY = "start_char"
+END_CHAR_KEY = "end_char"
+# Citation metadata of near-duplicate chunks dropped in favour of a retrieved chunk (never stored)
+DUPLICATES_KEY = "duplicates"
+
+# Bookkeeping keys left out of the text that is embedded or sent to the LLM
+HIDDEN_METADATA_KEYS = (TOKEN_COUNT_KEY, START_CHAR_KEY, END_CHAR_KEY, DUPLICATES_KEY)
+
+# Column order in CHUNK_COLUMNS_FILE
+_SOURCE, _REF_DOC, _PAGE, _TOKENS, _SECTION, _START, _END = range(7)
+_NUM_COLUMNS = 7
+_NO_STRING = 0xFFFFFFFF
+
+
+class ChunkColumns:
+    """
+    Columnar per-chunk metadata for ArrayVectorStore.
+    Source names, section titles and reference document ids are interned into one string table and
+    stored as uint32 ids; pages, token counts and character offsets are uint32 columns (page 0 and
+    end offset 0 mean none), and node ids a plain list. Metadata dicts are only materialized for the
+    chunks that are actually retrieved.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._string_ids = {}
+        self.node_ids = []
+        self.columns = [array("I") for _ in range(_NUM_COLUMNS)]
+        self.extra = {}  # position -> metadata keys without a column
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def nbytes(self):
+        """Approximate size of the columns, node ids and string table."""
+        columns = sum(column.itemsize * len(column) for column in self.columns)
+        strings = sum(len(value) for value in self.node_ids) + sum(len(value) for value in self.strings)
+        return columns + strings
+
+    def _intern(self, value):
+        if value is None:
+            return _NO_STRING
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def _string(self, string_id):
+        return None if string_id == _NO_STRING else self.strings[string_id]
+
+    def append(self, node_id, ref_doc_id, metadata, token_count):
+        metadata = dict(metadata or {})
+        source = metadata.pop(SOURCE_KEY, None)
+        page = metadata.pop(PAGE_KEY, None)
+        section = metadata.pop(SECTION_KEY, None)
+        start_char = metadata.pop(START_CHAR_KEY, None)
+        end_char = metadata.pop(END_CHAR_KEY, None)
+        metadata.pop(TOKEN_COUNT_KEY, None)
+        if metadata:
+            self.extra[len(self.node_ids)] = metadata
+        self.node_ids.append(node_id)
+        self.columns[_SOURCE].append(self._intern(source))
+        self.columns[_REF_DOC].append(self._intern(ref_doc_id))
+        self.columns[_PAGE].append(int(page or 0))
+        self.columns[_TOKENS].append(int(token_count))
+        self.columns[_SECTION].append(self._intern(section))
+        self.columns[_START].append(int(start_char or 0))
+        self.columns[_END].append(int(end_char or 0) if start_char is not None else 0)
+
+    def ref_doc_id(self, position):
+        return self._string(self.columns[_REF_DOC][position])
+
+    def ref_doc_positions(self, ref_doc_id):
+        """Positions of the chunks belonging to ref_doc_id."""
+        string_id = self._string_ids.get(ref_doc_id)
+        if string_id is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.frombuffer(self.columns[_REF_DOC], dtype=np.uint32) == string_id)
+
+    def token_count(self, position):
+        return self.columns[_TOKENS][position]
+
+    def metadata(self, position):
+        """Rebuild the metadata dict of one chunk."""
+        metadata = dict(self.extra.get(position, {}))
+        source = self._string(self.columns[_SOURCE][position])
+        if source is not None:
+            metadata[SOURCE_KEY] = source
+        page = self.columns[_PAGE][position]
+        if page:
+            metadata[PAGE_KEY] = page
+        section = self._string(self.columns[_SECTION][position])
+        if section is not None:
+            metadata[SECTION_KEY] = section
+        end_char = self.columns[_END][position]
+        if end_char:
+            metadata[START_CHAR_KEY] = self.columns[_START][position]
+            metadata[END_CHAR_KEY] = end_char
+        return metadata
+
+    def keep(self, positions):
+        """Keep only the given chunks, renumbering them 0..len(positions)-1 in that order."""
+        positions = np.asarray(positions, dtype=np.int64)
+        self.node_ids = [self.node_ids[i] for i in positions]
+        self.columns = [array("I", np.frombuffer(column, dtype=np.uint32)[positions].tobytes())
+                        for column in self.columns]
+        renumber = {int(old): new for new, old in enumerate(positions)}
+        self.extra = {renumber[old]: value for old, value in self.extra.items() if old in renumber}
+
+    def save(self, directory, filename):
+        np.save(os.path.join(directory, CHUNK_COLUMNS_FILE),
+                np.stack([np.frombuffer(column, dtype=np.uint32) for column in self.columns], axis=1)
+                if self.node_ids else np.zeros((0, _NUM_COLUMNS), dtype=np.uint32))
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as handle:
+            json.dump({
+                "node_ids": self.node_ids,
+                "strings": self.strings,
+                "extra": {str(position): value for position, value in self.extra.items()},
+            }, handle)
+
+    @classmethod
+    def load(cls, directory, filename):
+        """Load columns written by save."""
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as handle:
+            saved = json.load(handle)
+        chunks = cls()
+        chunks.node_ids = saved["node_ids"]
+        chunks.strings = saved["strings"]
+        chunks._string_ids = {value: string_id for string_id, value in enumerate(chunks.strings)}
+        chunks.extra = {int(position): value for position, value in saved["extra"].items()}
+        table = np.load(os.path.join(directory, CHUNK_COLUMNS_FILE))
+        chunks.columns = [array("I", np.ascontiguousarray(table[:, column]).tobytes())
+                          for column in range(_NUM_COLUMNS)]
+        return chunks
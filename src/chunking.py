@@ -0,0 +1,182 @@
+import re
+from pathlib import Path
+
+from chunk_store import END_CHAR_KEY, SECTION_KEY, START_CHAR_KEY
+from context_packing import count_tokens
+
+CHUNKERS = ("section", "recursive")
+
+# Markdown ATX headings: "## Title"
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.M)
+# Markdown code fences: ``` or ~~~, closed by a line of at least as many of the same character
+_MARKDOWN_FENCE = re.compile(r"^[ ]{0,3}(`{3,}|~{3,})(.*)$", re.M)
+# reStructuredText titles: a line underlined with a repeated punctuation character
+_RST_HEADING = re.compile(r"^(\S[^\n]*)\n([=\-~^\"'`#*+:.])\2{2,}[ \t]*$", re.M)
+_HTML_HEADING = re.compile(r"<h([1-6])\b[^>]*>(.*?)</h\1\s*>", re.I | re.S)
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+# Sentence ends, paragraph breaks and the starts of list items
+_SEGMENT_BREAK = re.compile(r"[.!?][\"')\]]*\s+|\n[ \t]*\n\s*|\n(?=[ \t]*(?:[-*+•]|\d+[.)])[ \t])")
+
+_HEADING_STYLES = {
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".rst": "rst",
+    ".html": "html",
+    ".htm": "html",
+}
+
+
+def _fenced_regions(text):
+    """(start, end) spans of the fenced code blocks of Markdown text; an unclosed fence runs to the end."""
+    regions = []
+    opening = None
+    for match in _MARKDOWN_FENCE.finditer(text):
+        fence, rest = match.groups()
+        if opening is None:
+            opening = fence, match.start()
+        elif fence[0] == opening[0][0] and len(fence) >= len(opening[0]) and not rest.strip():
+            regions.append((opening[1], match.end()))
+            opening = None
+    if opening is not None:
+        regions.append((opening[1], len(text)))
+    return regions
+
+
+def _headings(text, style):
+    """Yield (start, end, level, title) for the headings of text."""
+    if style == "markdown":
+        # "#" lines inside code blocks are comments or shell prompts, not headings
+        fenced = _fenced_regions(text)
+        for match in _MARKDOWN_HEADING.finditer(text):
+            if any(start <= match.start() < end for start, end in fenced):
+                continue
+            yield match.start(), match.end(), len(match.group(1)), match.group(2).strip()
+    elif style == "html":
+        for match in _HTML_HEADING.finditer(text):
+            title = " ".join(_HTML_TAG.sub(" ", match.group(2)).split())
+            if title:
+                yield match.start(), match.end(), int(match.group(1)), title
+    elif style == "rst":
+        # Levels follow the order in which underline characters first appear
+        levels = {}
+        for match in _RST_HEADING.finditer(text):
+            level = levels.setdefault(match.group(2), len(levels) + 1)
+            yield match.start(), match.end(), level, match.group(1).strip()
+
+
+def split_sections(text, style=None):
+    """
+    Split text at its headings into (start, end, title) spans covering the whole text.
+    Titles are heading paths such as "Leave > Sick leave"; text before the first heading has title None.
+    A heading directly followed by a sub-heading is folded into the sub-heading's section.
+    """
+    sections = []
+    path = []  # (level, title) of the enclosing headings
+    start, body_start, title = 0, 0, None
+    for heading_start, heading_end, level, heading in _headings(text, style):
+        if text[body_start:heading_start].strip():
+            sections.append((start, heading_start, title))
+            start = heading_start
+        path = [(lvl, name) for lvl, name in path if lvl < level] + [(level, heading)]
+        title = " > ".join(name for _, name in path)
+        body_start = heading_end
+    sections.append((start, len(text), title))
+    return sections
+
+
+def _segments(text, start, end):
+    """Yield (start, end) spans of the sentences, paragraphs and list items in text[start:end]."""
+    for match in _SEGMENT_BREAK.finditer(text, start, end):
+        if match.end() > start:
+            yield start, match.end()
+            start = match.end()
+    if start < end:
+        yield start, end
+
+
+def sentence_spans(text):
+    """(start, end) spans of the sentences, paragraphs and list items of text, without surrounding whitespace."""
+    spans = []
+    for start, end in _segments(text, 0, len(text)):
+        _add_span(spans, text, start, end, None)
+    return [(start, end) for start, end, _ in spans]
+
+
+def _words(text, start, end, max_tokens):
+    """Split an over-long span at word boundaries into pieces of at most max_tokens."""
+    piece_start, piece_tokens = start, 0
+    for match in re.finditer(r"\S+\s*", text[start:end]):
+        tokens = count_tokens(match.group())
+        if piece_tokens and piece_tokens + tokens > max_tokens:
+            yield piece_start, start + match.start()
+            piece_start, piece_tokens = start + match.start(), 0
+        piece_tokens += tokens
+    yield piece_start, end
+
+
+def _add_span(spans, text, start, end, title):
+    """Append (start, end, title) narrowed to exclude surrounding whitespace, unless nothing is left."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        spans.append((start, end, title))
+
+
+def chunk_spans(text, chunk_tokens=256, overlap_tokens=0, style=None):
+    """
+    Return (start, end, section) spans of text, each at most about chunk_tokens tokens.
+    Chunks never cross a section, and end at sentence, paragraph or list item boundaries; only a
+    single segment longer than chunk_tokens is cut at word boundaries. With overlap_tokens, a chunk
+    repeats the last whole sentences of the previous one, up to that many tokens.
+    """
+    spans = []
+    for section_start, section_end, title in split_sections(text, style):
+        current = []  # (start, end, tokens) of the segments in the chunk being built
+        current_tokens = 0
+        for seg_start, seg_end in _segments(text, section_start, section_end):
+            tokens = count_tokens(text[seg_start:seg_end])
+            if tokens > chunk_tokens:
+                if current:
+                    _add_span(spans, text, current[0][0], current[-1][1], title)
+                    current, current_tokens = [], 0
+                for piece_start, piece_end in _words(text, seg_start, seg_end, chunk_tokens):
+                    _add_span(spans, text, piece_start, piece_end, title)
+                continue
+            if current and current_tokens + tokens > chunk_tokens:
+                _add_span(spans, text, current[0][0], current[-1][1], title)
+                carried, carried_tokens = [], 0
+                for segment in reversed(current):
+                    if carried_tokens + segment[2] > min(overlap_tokens, chunk_tokens - tokens):
+                        break
+                    carried.insert(0, segment)
+                    carried_tokens += segment[2]
+                current, current_tokens = carried, carried_tokens
+            current.append((seg_start, seg_end, tokens))
+            current_tokens += tokens
+        if current:
+            _add_span(spans, text, current[0][0], current[-1][1], title)
+    return spans
+
+
+def heading_style(filename):
+    """Heading syntax to split a file on, from its extension; None for PDFs and plain text."""
+    return _HEADING_STYLES.get(Path(filename or "").suffix.lower())
+
+
+def chunk_document(text, metadata, chunk_tokens=256, overlap_tokens=0):
+    """
+    Chunk one loaded document (a text file or a PDF page) into (text, metadata) pairs.
+    Metadata gains the chunk's section title and its start_char/end_char offsets in the document text,
+    so text[start_char:end_char] is exactly the chunk.
+    """
+    style = heading_style(metadata.get("source"))
+    chunks = []
+    for start, end, section in chunk_spans(text, chunk_tokens, overlap_tokens, style):
+        chunk_metadata = {**metadata, START_CHAR_KEY: start, END_CHAR_KEY: end}
+        if section:
+            chunk_metadata[SECTION_KEY] = section
+        chunks.append((text[start:end], chunk_metadata))
+    return chunks
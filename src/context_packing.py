@@ -0,0 +1,168 @@
+import re
+
+from llama_index.core.schema import NodeWithScore, TextNode
+from chunk_store import DUPLICATES_KEY, END_CHAR_KEY, PAGE_KEY, SECTION_KEY, SOURCE_KEY, START_CHAR_KEY, TOKEN_COUNT_KEY
+from utils import logger, log_exceptions
+
+# Shortest overlap, in characters, accepted as evidence that two chunks were split from the same text
+MIN_OVERLAP_CHARS = 32
+SHINGLE_SIZE = 3
+
+# Metadata that identifies what a chunk cites
+CITATION_KEYS = (SOURCE_KEY, PAGE_KEY, SECTION_KEY, START_CHAR_KEY, END_CHAR_KEY)
+
+_encoder = None
+
+
+def _get_encoder(encoding_name="cl100k_base"):
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning(f"tiktoken encoding {encoding_name} unavailable, estimating 4 characters per token: {e}")
+            _encoder = False
+    return _encoder
+
+
+def node_tokens(node):
+    """Token count of a node's text, precomputed by the vector store when available."""
+    count = node.node.metadata.get(TOKEN_COUNT_KEY)
+    return count if count is not None else count_tokens(node.node.get_content())
+
+
+def count_tokens(text):
+    """Token count of text with tiktoken (an estimate for the Ollama model's own tokenizer)."""
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _overlap_merge(first, second):
+    """Return first + second with their shared suffix/prefix written once, or None if they do not overlap."""
+    if second in first:
+        return first
+    head = second[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(head)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(head, start + 1)
+    return None
+
+
+def merge_overlapping(nodes):
+    """
+    Collapse chunks from the same source and page whose text overlaps (the splitter's chunk_overlap)
+    into one node, placed at the better-ranked chunk's position with the higher score.
+    """
+    merged = []
+    for node in nodes:
+        md = node.node.metadata
+        text = node.node.get_content()
+        for index, kept in enumerate(merged):
+            kept_md = kept.node.metadata
+            if kept_md.get("source") != md.get("source") or kept_md.get("page") != md.get("page"):
+                continue
+            kept_text = kept.node.get_content()
+            combined = _overlap_merge(kept_text, text) or _overlap_merge(text, kept_text)
+            if combined is None:
+                continue
+            metadata = {key: value for key, value in kept_md.items() if key != TOKEN_COUNT_KEY}
+            if END_CHAR_KEY in kept_md and END_CHAR_KEY in md:
+                metadata[START_CHAR_KEY] = min(kept_md[START_CHAR_KEY], md[START_CHAR_KEY])
+                metadata[END_CHAR_KEY] = max(kept_md[END_CHAR_KEY], md[END_CHAR_KEY])
+            merged[index] = NodeWithScore(
+                node=TextNode(
+                    id_=kept.node.node_id,
+                    text=combined,
+                    metadata=metadata,
+                    excluded_llm_metadata_keys=list(kept.node.excluded_llm_metadata_keys),
+                    excluded_embed_metadata_keys=list(kept.node.excluded_embed_metadata_keys),
+                ),
+                score=max(kept.score or 0.0, node.score or 0.0),
+            )
+            break
+        else:
+            merged.append(node)
+    return merged
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _with_duplicate(kept, dropped):
+    """Copy of kept whose metadata also cites dropped (and the duplicates dropped in its favour earlier)."""
+    dropped_md = dropped.node.metadata
+    cited = {key: dropped_md[key] for key in CITATION_KEYS if dropped_md.get(key) is not None}
+    duplicates = kept.node.metadata.get(DUPLICATES_KEY, []) + [cited] + dropped_md.get(DUPLICATES_KEY, [])
+    return NodeWithScore(
+        node=TextNode(
+            id_=kept.node.node_id,
+            text=kept.node.get_content(),
+            metadata={**kept.node.metadata, DUPLICATES_KEY: duplicates},
+            excluded_llm_metadata_keys=list(kept.node.excluded_llm_metadata_keys),
+            excluded_embed_metadata_keys=list(kept.node.excluded_embed_metadata_keys),
+        ),
+        score=kept.score,
+    )
+
+
+def drop_near_duplicates(nodes, threshold=0.8):
+    """
+    Drop nodes whose word-shingle Jaccard similarity to a better-ranked node is at least threshold,
+    e.g. the same clause repeated across policy versions. The text is sent to the LLM once, but the
+    dropped node's source and page are kept under the better node's DUPLICATES_KEY metadata, so the
+    answer still cites both.
+    """
+    kept, kept_shingles = [], []
+    for node in nodes:
+        shingles = _shingles(node.node.get_content())
+        match = next(
+            (i for i, other in enumerate(kept_shingles) if len(shingles & other) >= threshold * len(shingles | other)),
+            None,
+        )
+        if match is not None:
+            kept[match] = _with_duplicate(kept[match], node)
+            continue
+        kept.append(node)
+        kept_shingles.append(shingles)
+    return kept
+
+
+@log_exceptions
+def pack_context(nodes, token_budget=1024, dedup_threshold=0.8):
+    """
+    Assemble the nodes passed to the LLM: merge overlapping chunks, drop near-duplicates,
+    then greedily keep nodes in rank order while they fit in token_budget.
+    Citation metadata (source, page) is carried over unchanged, including that of dropped near-duplicates.
+    """
+    if not nodes:
+        return nodes
+    try:
+        candidates = merge_overlapping(nodes)
+        if dedup_threshold:
+            candidates = drop_near_duplicates(candidates, dedup_threshold)
+
+        packed, used = [], 0
+        for node in candidates:
+            tokens = node_tokens(node)
+            # The best node is always kept, even alone over budget, so the LLM never gets an empty context
+            if used + tokens > token_budget and packed:
+                continue
+            packed.append(node)
+            used += tokens
+        logger.info(f"Packed {len(nodes)} retrieved chunks into {len(packed)} ({used} tokens, budget {token_budget})")
+        return packed
+    except Exception as e:
+        logger.error(f"Failed to pack context: {e}", exc_info=True)
+        return nodes
@@ -0,0 +1,255 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from context_packing import count_tokens
+from utils import logger
+
+# Session id of the shared history used when a caller passes no session_id
+DEFAULT_SESSION = ""
+
+# Seconds between sweeps for expired sessions
+PURGE_INTERVAL = 60.0
+
+QUERY_CONDENSATION_MODES = ("llm", "concat")
+
+CONDENSE_PROMPT = (
+    "Rewrite the follow-up question as a standalone question that can be understood without the "
+    "conversation. Keep the names, numbers and terms from the conversation that it refers to. "
+    "Reply with the question only.\n\n"
+    "Conversation:\n{history}\n\n"
+    "Follow-up question: {question}\n"
+    "Standalone question:"
+)
+
+# Each past answer is clipped to this many tokens in the condensation prompt
+HISTORY_ANSWER_TOKENS = 128
+
+
+class SessionStore:
+    """
+    Conversation histories by session id, bounded in every direction: each session keeps its last
+    max_turns turns, sessions idle for ttl_seconds expire, and at most max_sessions are held in memory
+    (least recently used first out). With path, turns are also written to SQLite, so histories survive
+    restarts and sessions dropped from memory are reloaded on their next request.
+    namespace separates the sessions of pipelines sharing one database (e.g. one per corpus).
+    """
+
+    def __init__(self, max_turns=20, ttl_seconds=86400, max_sessions=10_000, path=None, namespace=""):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.path = path
+        self.namespace = namespace
+        self._sessions = OrderedDict()  # session_id -> [last_access, deque of turns, next sequence number]
+        self._lock = threading.Lock()
+        self._last_purge = time.time()
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                " namespace TEXT NOT NULL,"
+                " session_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " turn TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, session_id, seq))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " namespace TEXT NOT NULL,"
+                " session_id TEXT NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (namespace, session_id))"
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expired(self, last_access, now):
+        return self.ttl_seconds is not None and last_access + self.ttl_seconds <= now
+
+    def _load(self, session_id, now):
+        """Read a session from SQLite; returns None if it is not stored or has expired."""
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT last_access FROM sessions WHERE namespace = ? AND session_id = ?", (self.namespace, session_id)
+        ).fetchone()
+        if row is None or self._expired(row[0], now):
+            return None
+        rows = self._conn.execute(
+            "SELECT seq, turn FROM turns WHERE namespace = ? AND session_id = ? ORDER BY seq DESC LIMIT ?",
+            (self.namespace, session_id, self.max_turns),
+        ).fetchall()
+        turns = deque((json.loads(turn) for _, turn in reversed(rows)), maxlen=self.max_turns)
+        return [now, turns, rows[0][0] + 1 if rows else 0]
+
+    def _entry(self, session_id, create):
+        now = time.time()
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._purge(now)
+        entry = self._sessions.get(session_id)
+        if entry is not None and self._expired(entry[0], now):
+            self._delete(session_id)
+            entry = None
+        if entry is None:
+            entry = self._load(session_id, now)
+            if entry is None:
+                if not create:
+                    return None
+                entry = [now, deque(maxlen=self.max_turns), 0]
+            self._sessions[session_id] = entry
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        entry[0] = now
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    def _purge(self, now):
+        """Drop expired sessions from memory and SQLite."""
+        self._last_purge = now
+        if self.ttl_seconds is None:
+            return
+        expired = [session_id for session_id, entry in self._sessions.items() if self._expired(entry[0], now)]
+        for session_id in expired:
+            del self._sessions[session_id]
+        if self._conn is not None:
+            cutoff = now - self.ttl_seconds
+            self._conn.execute(
+                "DELETE FROM turns WHERE namespace = ? AND session_id IN "
+                "(SELECT session_id FROM sessions WHERE namespace = ? AND last_access <= ?)",
+                (self.namespace, self.namespace, cutoff),
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND last_access <= ?", (self.namespace, cutoff)
+            )
+            self._conn.commit()
+        if expired:
+            logger.info(f"Expired {len(expired)} idle sessions")
+
+    def _delete(self, session_id):
+        self._sessions.pop(session_id, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM turns WHERE namespace = ? AND session_id = ?", (self.namespace, session_id))
+            self._conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND session_id = ?", (self.namespace, session_id)
+            )
+            self._conn.commit()
+
+    def append(self, session_id, turn):
+        """Add a turn (a JSON-serializable dict) to a session, dropping its oldest turn beyond max_turns."""
+        with self._lock:
+            entry = self._entry(session_id, create=True)
+            entry[1].append(turn)
+            seq = entry[2]
+            entry[2] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO turns (namespace, session_id, seq, turn) VALUES (?, ?, ?, ?)",
+                    (self.namespace, session_id, seq, json.dumps(turn)),
+                )
+                self._conn.execute(
+                    "DELETE FROM turns WHERE namespace = ? AND session_id = ? AND seq <= ?",
+                    (self.namespace, session_id, seq - self.max_turns),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (namespace, session_id, last_access) VALUES (?, ?, ?)",
+                    (self.namespace, session_id, entry[0]),
+                )
+                self._conn.commit()
+
+    def get(self, session_id):
+        """The turns of a session, oldest first; empty for unknown or expired sessions."""
+        with self._lock:
+            entry = self._entry(session_id, create=False)
+            return list(entry[1]) if entry is not None else []
+
+    def clear(self, session_id):
+        with self._lock:
+            self._delete(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_turns": self.max_turns,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._conn is not None,
+            }
+
+
+def clip_tokens(text, max_tokens):
+    """Shorten text at a word boundary to at most about max_tokens tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:  # longest word prefix that fits
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " ..."
+
+
+def history_text(turns, token_budget, answer_tokens=HISTORY_ANSWER_TOKENS):
+    """
+    Render the most recent turns that fit in token_budget as "User:/Assistant:" lines, oldest first.
+    Answers are clipped to answer_tokens tokens, so one long answer cannot crowd out the rest.
+    """
+    lines, used = [], 0
+    for turn in reversed(turns):
+        text = f"User: {turn['query']}\nAssistant: {clip_tokens(turn.get('answer') or '', answer_tokens)}"
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            break
+        lines.insert(0, text)
+        used += tokens
+    return "\n".join(lines)
+
+
+def _concat_query(turns, question, token_budget):
+    """The recent user questions followed by question, within token_budget tokens."""
+    parts, used = [question], count_tokens(question)
+    for turn in reversed(turns):
+        tokens = count_tokens(turn["query"])
+        if used + tokens > token_budget:
+            break
+        parts.insert(0, turn["query"])
+        used += tokens
+    return " ".join(parts)
+
+
+def condense_query(question, turns, llm=None, mode="llm", token_budget=768, max_turns=3):
+    """
+    Turn a follow-up question into a standalone query using the last max_turns turns.
+    Returns (retrieval_query, generation_query). "llm" asks the LLM to rewrite the question (prompt kept
+    within token_budget tokens, well inside the 2048-token context window) and uses the rewrite for both.
+    "concat" prepends the recent questions for retrieval only; the LLM still answers the question as asked.
+    Without history the question is used as is, and a failed or empty LLM rewrite falls back to "concat".
+    """
+    turns = list(turns)[-max_turns:] if max_turns else []
+    if not turns or mode is None:
+        return question, question
+    if mode == "llm" and llm is not None:
+        history_budget = token_budget - count_tokens(CONDENSE_PROMPT) - count_tokens(question)
+        history = history_text(turns, history_budget)
+        if history:
+            try:
+                response = llm.complete(CONDENSE_PROMPT.format(history=history, question=question))
+                lines = [line.strip().strip('"') for line in str(response).strip().splitlines() if line.strip()]
+                if lines:
+                    standalone = clip_tokens(lines[0], token_budget)
+                    return standalone, standalone
+            except Exception as e:
+                logger.error(f"Failed to condense follow-up question: {e}", exc_info=True)
+    return _concat_query(turns, question, token_budget), question
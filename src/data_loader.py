@@ -1,9 +1,12 @@
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-import pdfplumber
-from llama_index.core import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from utils import setup_logger, log_exceptions, log_time
+from chunk_store import HIDDEN_METADATA_KEYS
+from chunking import CHUNKERS, chunk_document
+from pdf_extraction import extract_pages_cached, page_count as get_page_count
 
 import warnings
 warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
@@ -65,74 +68,204 @@ def _is_supported_text_file(filename: str) -> bool:
     return extension in TEXT_EXTENSIONS or extension == ""
 
 
-@log_exceptions
-@log_time
-def load_documents(folder_path="data/sample_policies"):
+def _extract_pdf_pages(file_path, filename, first_page=0, last_page=None, backend="pdfplumber", cache_path=None,
+                       file_hash=None):
+    """Extract (text, metadata) records for PDF pages [first_page, last_page), reusing cached pages when possible."""
+    records = []
+    pages = extract_pages_cached(
+        file_path, first_page, last_page, backend=backend, cache_path=cache_path, file_hash=file_hash
+    )
+    for i, text in pages:
+        if text and text.strip():
+            records.append((text, {"source": filename, "page": i + 1}))
+    return records
+
+
+def _load_records(file_path, filename, page_range=None, pdf_backend="pdfplumber", page_cache_path=None,
+                  file_hash=None):
     """
-    Load PDF and text-based documents from the folder, storing text in Document objects with metadata.
+    Load one file (or one page range of a PDF) into (text, metadata) records.
+    PDF pages are extracted with pdf_backend and cached in the PageCache at page_cache_path, if given,
+    under file_hash (the file's manifest digest) when known.
+    Plain tuples are returned so results pickle cheaply across worker processes;
+    failures are logged and produce no records instead of raising.
+    """
+    try:
+        if filename.lower().endswith(".pdf"):
+            first_page, last_page = page_range or (0, None)
+            records = _extract_pdf_pages(
+                file_path, filename, first_page, last_page, backend=pdf_backend, cache_path=page_cache_path,
+                file_hash=file_hash,
+            )
+            if page_range:
+                logger.info(f"Loaded PDF: {filename} (pages {first_page + 1}-{last_page})")
+            else:
+                logger.info(f"Loaded PDF: {filename}")
+            return records
+        if _is_supported_text_file(filename):
+            text = _read_text_file(file_path, filename)
+            if text:
+                logger.info(f"Loaded text file: {filename}")
+                return [(text, {"source": filename})]
+            logger.warning(f"No readable text found in {filename}")
+            return []
+        logger.warning(f"Unsupported file type skipped: {filename}")
+    except Exception as e:
+        logger.error(f"Failed to load {filename}: {e}", exc_info=True)
+    return []
 
-    Supported text formats include: txt, md, markdown, rst, log, csv, tsv, json, yaml, yml, ini, cfg, conf, html, htm.
+
+def _plan_tasks(folder_path, files, pages_per_task=None, pdf_backend="pdfplumber"):
+    """
+    Yield (file_path, filename, page_range) tasks in file order.
+    PDFs with more than pages_per_task pages are split into page-range tasks.
     """
-    docs = []
+    for filename in files:
+        file_path = os.path.join(folder_path, filename)
+        if not pages_per_task or not filename.lower().endswith(".pdf"):
+            yield file_path, filename, None
+            continue
+        try:
+            page_count = get_page_count(file_path, backend=pdf_backend)
+        except Exception as e:
+            logger.error(f"Failed to read page count of {filename}: {e}", exc_info=True)
+            continue
+        if page_count <= pages_per_task:
+            yield file_path, filename, None
+            continue
+        for first_page in range(0, page_count, pages_per_task):
+            yield file_path, filename, (first_page, min(first_page + pages_per_task, page_count))
+
 
+def iter_documents(folder_path="data/sample_policies", filenames=None, workers=1, pages_per_task=None,
+                   pdf_backend="pdfplumber", page_cache_path=None, file_hashes=None):
+    """
+    Yield Document objects file by file, in a deterministic order.
+    With workers > 1, files (or page ranges of PDFs longer than pages_per_task) are parsed in a
+    process pool; only a bounded number of tasks is in flight, so documents can be split and
+    embedded while later files are still being parsed.
+    pdf_backend is one of PDF_BACKENDS; with page_cache_path, extracted PDF pages are cached by
+    file hash so unchanged PDFs are never parsed twice. file_hashes ({filename: content digest}, e.g. from
+    the manifest) spares the loader hashing each PDF again.
+    """
     if not os.path.exists(folder_path):
         logger.error(f"Folder not found: {folder_path}")
-        return docs
+        return
 
-    files = os.listdir(folder_path)
+    files = sorted(os.listdir(folder_path)) if filenames is None else list(filenames)
     if not files:
         logger.warning(f"No files found in folder: {folder_path}")
+        return
 
-    for filename in files:
-        file_path = os.path.join(folder_path, filename)
-        try:
-            if filename.lower().endswith(".pdf"):
-                with pdfplumber.open(file_path) as pdf:
-                    for i, page in enumerate(pdf.pages):
-                        text = page.extract_text()
-                        if text and text.strip():
-                            docs.append(Document(
-                                text=text,
-                                metadata={"source": filename, "page": i + 1}
-                            ))
-                logger.info(f"Loaded PDF: {filename}")
-            elif _is_supported_text_file(filename):
-                text = _read_text_file(file_path, filename)
-                if text:
-                    docs.append(Document(text=text, metadata={"source": filename}))
-                    logger.info(f"Loaded text file: {filename}")
-                else:
-                    logger.warning(f"No readable text found in {filename}")
-            else:
-                logger.warning(f"Unsupported file type skipped: {filename}")
-        except Exception as e:
-            logger.error(f"Failed to load {filename}: {e}", exc_info=True)
+    from llama_index.core import Document
 
-    logger.info(f"Total documents loaded: {len(docs)}")
-    return docs
+    file_hashes = file_hashes or {}
+    tasks = (
+        (*task, pdf_backend, page_cache_path, file_hashes.get(task[1]))
+        for task in _plan_tasks(folder_path, files, pages_per_task if workers and workers > 1 else None, pdf_backend)
+    )
+    if not workers or workers <= 1:
+        for task in tasks:
+            for text, metadata in _load_records(*task):
+                yield Document(text=text, metadata=metadata)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(_load_records, *task) for task in islice(tasks, workers * 2))
+        while pending:
+            future = pending.popleft()
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append(executor.submit(_load_records, *next_task))
+            try:
+                records = future.result()
+            except Exception as e:
+                logger.error(f"Document loading worker failed: {e}", exc_info=True)
+                continue
+            for text, metadata in records:
+                yield Document(text=text, metadata=metadata)
 
 
 @log_exceptions
 @log_time
-def split_documents(docs, chunk_size=1024, chunk_overlap=128):
+def load_documents(folder_path="data/sample_policies", filenames=None, workers=1, pages_per_task=None,
+                   pdf_backend="pdfplumber", page_cache_path=None):
     """
-    Split documents into chunks using RecursiveCharacterTextSplitter.
-    Returns a list of chunked Document objects preserving metadata.
+    Load PDF and text-based documents from the folder, storing text in Document objects with metadata.
+    If filenames is given, only those files from the folder are loaded.
+    With workers > 1, files are parsed in parallel processes (see iter_documents).
+
+    Supported text formats include: txt, md, markdown, rst, log, csv, tsv, json, yaml, yml, ini, cfg, conf, html, htm.
     """
-    splitter = RecursiveCharacterTextSplitter(
+    docs = list(iter_documents(
+        folder_path,
+        filenames=filenames,
+        workers=workers,
+        pages_per_task=pages_per_task,
+        pdf_backend=pdf_backend,
+        page_cache_path=page_cache_path,
+    ))
+    logger.info(f"Total documents loaded: {len(docs)}")
+    return docs
+
+
+def _make_splitter(chunk_size, chunk_overlap):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", ".", "!", "?"]
     )
 
-    chunked_docs = []
+
+def iter_split_documents(docs, chunk_size=1024, chunk_overlap=128, chunker="recursive", chunk_tokens=256,
+                         chunk_overlap_tokens=0):
+    """
+    Lazily split an iterable of documents into chunked Document objects preserving metadata.
+    Only one source document is held at a time, so this can sit between iter_documents and embedding.
+    chunker "recursive" splits on characters (chunk_size/chunk_overlap); "section" splits at headings
+    and sentence boundaries into chunks of at most chunk_tokens tokens, recording each chunk's section
+    and character offsets in its source (see chunking.chunk_document).
+    """
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {chunker}. Expected one of {list(CHUNKERS)}")
+    from llama_index.core import Document
+
+    splitter = _make_splitter(chunk_size, chunk_overlap) if chunker == "recursive" else None
     for doc in docs:
         try:
-            chunks = splitter.split_text(doc.text)
-            for c in chunks:
-                chunked_docs.append(Document(text=c, metadata=doc.metadata))
+            if splitter is None:
+                chunks = chunk_document(doc.text, doc.metadata, chunk_tokens, chunk_overlap_tokens)
+            else:
+                chunks = [(c, doc.metadata) for c in splitter.split_text(doc.text)]
         except Exception as e:
             logger.error(f"Failed to split document {doc.metadata.get('source')}: {e}", exc_info=True)
+            continue
+        for text, metadata in chunks:
+            yield Document(
+                text=text,
+                metadata=metadata,
+                excluded_embed_metadata_keys=list(HIDDEN_METADATA_KEYS),
+                excluded_llm_metadata_keys=list(HIDDEN_METADATA_KEYS),
+            )
+
 
+@log_exceptions
+@log_time
+def split_documents(docs, chunk_size=1024, chunk_overlap=128, chunker="recursive", chunk_tokens=256,
+                    chunk_overlap_tokens=0):
+    """
+    Split documents into chunks with the given chunker (see iter_split_documents).
+    Returns a list of chunked Document objects preserving metadata.
+    """
+    chunked_docs = list(iter_split_documents(
+        docs,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        chunker=chunker,
+        chunk_tokens=chunk_tokens,
+        chunk_overlap_tokens=chunk_overlap_tokens,
+    ))
     logger.info(f"Total document chunks created: {len(chunked_docs)}")
     return chunked_docs
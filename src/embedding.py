@@ -1,25 +1,61 @@
-from langchain_huggingface import HuggingFaceEmbeddings
 from llama_index.embeddings.langchain import LangchainEmbedding
+from batching import BatchedEmbeddings
+from embedding_cache import CachedEmbeddings, embed_queries_with
 from utils import logger, log_exceptions, log_time
 import warnings
 warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
+
+
+class LangchainBatchEmbedding(LangchainEmbedding):
+    """LangchainEmbedding that also embeds a list of queries in one batched pass through the LangChain model."""
+
+    def get_query_embedding_batch(self, queries):
+        return embed_queries_with(self._langchain_embedding, list(queries))
+
+
 @log_exceptions
 @log_time
-def initialize_embeddings(model_name="intfloat/e5-large-v2", device="cpu", batch_size=32):
+def initialize_embeddings(model_name="intfloat/e5-large-v2", device="cpu", batch_size=32, cache=None,
+                          micro_batch_wait_ms=None, base_embeddings=None):
     """
     Initialize HuggingFace embeddings wrapped in LangchainEmbedding.
-    Returns LangchainEmbedding object.
+    If an EmbeddingCache is given, document and query embeddings are served from it first.
+    If micro_batch_wait_ms is set, concurrent query embeddings that miss the cache are coalesced
+    into batches of up to batch_size.
+    base_embeddings (a LangChain Embeddings) replaces the HuggingFace model, e.g. with an offline stand-in.
+    Returns a LangchainBatchEmbedding object.
     """
     try:
         logger.info(f"Initializing embeddings: {model_name} | device={device} | batch_size={batch_size}")
-        hf_embed = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={"device": device},
-            encode_kwargs={"batch_size": batch_size}
-        )
-        embed_model = LangchainEmbedding(hf_embed)
+        hf_embed = base_embeddings
+        if hf_embed is None:
+            # Imported here: langchain_huggingface pulls in torch and transformers
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            hf_embed = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": device},
+                encode_kwargs={"batch_size": batch_size}
+            )
+        if micro_batch_wait_ms:
+            hf_embed = BatchedEmbeddings(hf_embed, max_batch_size=batch_size, max_wait_ms=micro_batch_wait_ms)
+        if cache is not None:
+            hf_embed = CachedEmbeddings(hf_embed, cache, model_name)
+        embed_model = LangchainBatchEmbedding(hf_embed, embed_batch_size=batch_size)
         logger.info("Embeddings initialized successfully")
         return embed_model
     except Exception as e:
         logger.error(f"Failed to initialize embeddings: {e}", exc_info=True)
         return None
+
+
+@log_exceptions
+def embed_queries(embed_model, queries):
+    """
+    Embed many queries in one batched pass when embed_model supports it (the LangchainBatchEmbedding
+    from initialize_embeddings), instead of one forward pass per query; other LlamaIndex embedding
+    models embed them one by one. Returns a list of vectors.
+    """
+    if isinstance(embed_model, LangchainBatchEmbedding):
+        return embed_model.get_query_embedding_batch(queries)
+    return [embed_model.get_query_embedding(query) for query in queries]
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from metrics import CACHE_REQUESTS
+from utils import logger, log_exceptions
+
+# Access times of cache hits are written in batches of this many entries, instead of one commit per lookup
+TOUCH_FLUSH_SIZE = 1024
+# Eviction removes this fraction of max_entries beyond the overflow, so it runs once per batch of inserts
+EVICTION_FRACTION = 0.05
+
+
+def _text_key(text):
+    """Hash of the whitespace-normalized text."""
+    normalized = " ".join(text.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent SQLite cache of embeddings keyed by (model name, normalized text hash).
+    Entries beyond max_entries are evicted least-recently-used first, in batches; the entry count is kept
+    in memory and access times of hits are buffered, so lookups do not write to the database.
+    Hit and miss counters are kept for the life of the process.
+    """
+
+    def __init__(self, path, max_entries=500_000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        self._touched = {}  # (model, text_hash) -> last access time not yet written
+
+    def get_many(self, model, texts):
+        """Return a list with the cached vector (list of floats) or None for each text."""
+        keys = [_text_key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                found.update(rows)
+            now = time.time()
+            for key in found:
+                self._touched[(model, key)] = now
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        CACHE_REQUESTS.inc(hits, cache="embedding", result="hit")
+        CACHE_REQUESTS.inc(len(keys) - hits, cache="embedding", result="miss")
+        return [np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None for key in keys]
+
+    def _flush_touched(self):
+        """Write buffered access times; the caller holds the lock and commits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(when, model, key) for (model, key), when in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        """
+        Once the count exceeds max_entries, delete the least recently used entries down to
+        max_entries minus EVICTION_FRACTION of it. The caller holds the lock and commits.
+        """
+        if self._entries <= self.max_entries:
+            return
+        # Other processes may share the file, so the count is re-read before deciding how much to delete
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if self._entries <= self.max_entries:
+            return
+        self._flush_touched()
+        excess = self._entries - self.max_entries + int(self.max_entries * EVICTION_FRACTION)
+        deleted = self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        ).rowcount
+        self._entries -= deleted
+        logger.info(f"Evicted {deleted} least recently used embeddings | entries={self._entries}")
+
+    def put_many(self, model, texts, vectors):
+        """Store vectors for texts, evicting the oldest entries in a batch once there are more than max_entries."""
+        now = time.time()
+        rows = [
+            (model, _text_key(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            # A text's embedding never changes, so a row stored meanwhile by another caller is kept as is
+            inserted = self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows).rowcount
+            self._entries += max(inserted, 0)
+            self._evict()
+            self._conn.commit()
+
+    def flush(self):
+        """Write buffered access times, e.g. before the process exits."""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            entries = self._entries
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that serves document and query embeddings from an EmbeddingCache
+    and only sends cache misses to the wrapped model.
+    """
+
+    def __init__(self, embeddings, cache, model_name):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Identical texts within one batch are embedded once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique_texts, self.embeddings.embed_documents(unique_texts)))
+            self.cache.put_many(self.model_name, unique_texts, [computed[text] for text in unique_texts])
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+        return vectors
+
+    def embed_query(self, text):
+        # Queries may be embedded differently from documents, so they get their own key space
+        model = f"{self.model_name}#query"
+        vector = self.cache.get_many(model, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(model, [text], [vector])
+        return vector
+
+    def embed_queries(self, texts):
+        """Embed many queries, sending only the cache misses to the wrapped model in one batch."""
+        model = f"{self.model_name}#query"
+        vectors = self.cache.get_many(model, texts)
+        missing = list(dict.fromkeys(texts[i] for i, vector in enumerate(vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, embed_queries_with(self.embeddings, missing)))
+            self.cache.put_many(model, missing, [computed[text] for text in missing])
+            vectors = [computed[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+
+def embed_queries_with(embeddings, texts):
+    """
+    Embed many queries with a LangChain Embeddings in one batched pass: its embed_queries if it has
+    one, else embed_documents (the HuggingFace models here embed queries and documents alike, as
+    BatchedEmbeddings also relies on).
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return embeddings.embed_documents(texts)
+
+
+@log_exceptions
+def initialize_embedding_cache(path, max_entries=500_000):
+    """
+    Open (or create) the persistent embedding cache at path.
+    Returns None if the cache cannot be opened, in which case embeddings run uncached.
+    """
+    try:
+        cache = EmbeddingCache(path, max_entries=max_entries)
+        logger.info(f"Embedding cache opened: {path} | max_entries={max_entries}")
+        return cache
+    except Exception as e:
+        logger.error(f"Failed to open embedding cache at {path}: {e}", exc_info=True)
+        return None
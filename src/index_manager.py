@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import logger, log_exceptions, log_time, run_now
+from embedding import initialize_embeddings
+from conversation import SessionStore
+from embedding_cache import initialize_embedding_cache
+from llm_setup import initialize_llm
+from query_engine import initialize_reranker, enable_rerank_batching
+from rag_pipeline import RAGPipeline
+from llama_index.core import Settings
+import warnings
+warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
+
+
+def discover_corpora(root):
+    """Map each sub-folder of root to a corpus of the same name, e.g. data/corpora/hr -> 'hr'."""
+    if not os.path.isdir(root):
+        return {}
+    return {
+        name: os.path.join(root, name)
+        for name in sorted(os.listdir(root))
+        if os.path.isdir(os.path.join(root, name)) and not name.startswith(".")
+    }
+
+
+class IndexManager:
+    """
+    Serves several document corpora from one process.
+    One embedding model, LLM client and reranker are loaded up front and shared; each corpus gets its
+    own RAGPipeline (index, answer cache), loaded on first use. When the loaded indexes exceed
+    memory_budget_mb, the least recently used ones are evicted, and reloaded from their persisted
+    stores the next time they are asked. Session histories are kept by the manager, one SessionStore
+    per corpus, so evicting an index does not end its conversations.
+    With lazy_models, the shared models load in parallel and the reranker finishes in the background;
+    corpora answer without reranking until it is ready. Failed model loads are kept in model_load_errors;
+    the manager raises RuntimeError if the embedding model or LLM fails.
+    """
+
+    @log_exceptions(reraise=True)
+    @log_time
+    def __init__(self,
+                 corpora,
+                 persist_dir="data/vector_store",
+                 memory_budget_mb=2048,
+                 embedding_model="intfloat/e5-large-v2",
+                 llm_model="llama3.2:1b",
+                 use_rerank=True,
+                 device="cpu",
+                 embed_batch_size=32,
+                 embedding_cache_max_entries=500_000,
+                 rerank_batch_size=32,
+                 rerank_max_length=512,
+                 micro_batch_wait_ms=None,
+                 lazy_models=False,
+                 **pipeline_options):
+        logger.info(f"Initializing index manager for {len(corpora)} corpora | budget={memory_budget_mb} MB")
+        self.corpora = dict(corpora)
+        self.persist_dir = persist_dir
+        self.memory_budget = int(memory_budget_mb * 2 ** 20)
+
+        # Options of the per-corpus SessionStores, which outlive the pipelines
+        self.session_options = {
+            "max_turns": pipeline_options.pop("history_max_turns", 20),
+            "ttl_seconds": pipeline_options.pop("session_ttl", 86400),
+            "max_sessions": pipeline_options.pop("max_sessions", 10_000),
+            "path": pipeline_options.pop("session_store_path", None),
+        }
+        self._session_stores = {}  # absolute docs folder -> SessionStore
+        self.pipeline_options = {
+            "embedding_model": embedding_model,
+            "llm_model": llm_model,
+            "use_rerank": False,  # switched on per pipeline once the shared reranker is ready
+            "device": device,
+            "embed_batch_size": embed_batch_size,
+            "rerank_batch_size": rerank_batch_size,
+            **pipeline_options,
+        }
+        self._pipelines = OrderedDict()  # corpus -> RAGPipeline, least recently used first
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.corpora}
+        self.loads = 0
+        self.evictions = 0
+
+        # Models shared by every corpus
+        self.model_load_errors = {}
+        loader = ThreadPoolExecutor(max_workers=3, thread_name_prefix="model-load") if lazy_models else None
+        submit = loader.submit if loader is not None else run_now
+        self.embedding_cache = None
+        if persist_dir:
+            self.embedding_cache = initialize_embedding_cache(
+                os.path.join(persist_dir, "embedding_cache.sqlite"), max_entries=embedding_cache_max_entries
+            )
+        embed_future = submit(
+            self._load_model,
+            "embeddings",
+            initialize_embeddings,
+            model_name=embedding_model,
+            device=device,
+            batch_size=embed_batch_size,
+            cache=self.embedding_cache,
+            micro_batch_wait_ms=micro_batch_wait_ms,
+        )
+        llm_future = submit(self._load_model, "llm", initialize_llm, model_name=llm_model)
+        self.reranker = None
+        self.reranker_ready = threading.Event()
+        self.reranker_status = "loading" if use_rerank else "disabled"
+        if use_rerank:
+            submit(self._load_reranker, rerank_max_length, device, rerank_batch_size, micro_batch_wait_ms)
+        if loader is not None:
+            loader.shutdown(wait=False)
+        self.embed_model = embed_future.result()
+        self.llm = llm_future.result()
+        if self.embed_model is None or self.llm is None:
+            raise RuntimeError(f"Failed to load the embedding model or LLM: {self.model_load_errors}")
+        Settings.embed_model = self.embed_model
+
+    def _load_model(self, name, load_fn, *args, **kwargs):
+        """Run load_fn; a failure (an exception or None) is recorded under model_load_errors[name] and returns None."""
+        started = time.perf_counter()
+        try:
+            model = load_fn(*args, **kwargs)
+            error = None if model is not None else "initialization failed, see the logs"
+        except Exception as e:
+            model, error = None, str(e)
+        if model is None:
+            self.model_load_errors[name] = error
+            logger.error(f"Failed to load shared {name}: {error}")
+        else:
+            logger.info(f"Loaded shared {name} in {time.perf_counter() - started:.3f}s")
+        return model
+
+    def _load_reranker(self, max_length, device, batch_size, micro_batch_wait_ms):
+        reranker = self._load_model("reranker", initialize_reranker, max_length=max_length, device=device)
+        if reranker is None:
+            # Corpora keep answering without reranking
+            self.reranker_status = "failed"
+            return
+        if micro_batch_wait_ms:
+            enable_rerank_batching(max_batch_size=batch_size, max_wait_ms=micro_batch_wait_ms)
+        with self._lock:
+            self.reranker = reranker
+            self.reranker_status = "ready"
+            self.reranker_ready.set()
+            for pipeline in self._pipelines.values():
+                pipeline.enable_reranking()
+
+    def add_corpus(self, name, docs_folder):
+        """Register (or re-point) a corpus; it is loaded on first use."""
+        with self._lock:
+            self.corpora[name] = docs_folder
+            self._load_locks.setdefault(name, threading.Lock())
+            if name in self._pipelines:
+                del self._pipelines[name]
+
+    def loaded(self, corpus):
+        """
+        Return the RAGPipeline of corpus if it is loaded, else None, without loading it.
+        Raises KeyError for an unknown corpus.
+        """
+        if corpus not in self.corpora:
+            raise KeyError(f"Unknown corpus: {corpus}")
+        with self._lock:
+            pipeline = self._pipelines.get(corpus)
+            if pipeline is not None:
+                self._pipelines.move_to_end(corpus)
+            return pipeline
+
+    def get(self, corpus):
+        """
+        Return the RAGPipeline of corpus, loading it if needed.
+        Raises KeyError for an unknown corpus.
+        """
+        pipeline = self.loaded(corpus)
+        if pipeline is not None:
+            return pipeline
+
+        # Load outside the manager lock so other corpora keep serving; one load per corpus at a time
+        with self._load_locks[corpus]:
+            with self._lock:
+                pipeline = self._pipelines.get(corpus)
+            if pipeline is None:
+                pipeline = self._load(corpus)
+                with self._lock:
+                    if self.reranker_ready.is_set():
+                        pipeline.enable_reranking()
+                    self._pipelines[corpus] = pipeline
+                    self.loads += 1
+                    self._evict(keep=corpus)
+        return pipeline
+
+    def _load(self, corpus):
+        logger.info(f"Loading corpus '{corpus}' from {self.corpora[corpus]}")
+        pipeline = RAGPipeline(
+            docs_folder=self.corpora[corpus],
+            persist_dir=self.persist_dir,
+            embed_model=self.embed_model,
+            llm=self.llm,
+            session_store=self._session_store(self.corpora[corpus]),
+            **self.pipeline_options,
+        )
+        if pipeline is None or getattr(pipeline, "query_engine", None) is None:
+            raise RuntimeError(f"Failed to load corpus '{corpus}'. Check logs for details.")
+        return pipeline
+
+    def _session_store(self, docs_folder):
+        """The SessionStore of a corpus folder, created on first use and kept across evictions."""
+        namespace = os.path.abspath(docs_folder)
+        with self._lock:
+            store = self._session_stores.get(namespace)
+            if store is None:
+                store = self._session_stores[namespace] = SessionStore(namespace=namespace, **self.session_options)
+            return store
+
+    def _evict(self, keep):
+        """Drop least recently used pipelines (never keep) until loaded indexes fit the budget."""
+        usage = {name: pipeline.memory_bytes() for name, pipeline in self._pipelines.items()}
+        total = sum(usage.values())
+        for name in list(self._pipelines):
+            if total <= self.memory_budget:
+                break
+            if name == keep:
+                continue
+            del self._pipelines[name]
+            total -= usage[name]
+            self.evictions += 1
+            logger.info(f"Evicted corpus '{name}' ({usage[name] / 2 ** 20:.1f} MB) | now {total / 2 ** 20:.1f} MB loaded")
+        if total > self.memory_budget:
+            logger.warning(f"Corpus '{keep}' alone needs {total / 2 ** 20:.1f} MB, over the memory budget")
+
+    def evict(self, corpus):
+        """Unload a corpus; it is reloaded from its persisted index on next use."""
+        with self._lock:
+            return self._pipelines.pop(corpus, None) is not None
+
+    def ask(self, corpus, query, **kwargs):
+        return self.get(corpus).ask(query, **kwargs)
+
+    def ask_stream(self, corpus, query, **kwargs):
+        return self.get(corpus).ask_stream(query, **kwargs)
+
+    def refresh(self, corpus):
+        return self.get(corpus).refresh()
+
+    def stats(self):
+        """Loaded corpora with their memory use, plus load/eviction counts."""
+        with self._lock:
+            loaded = {name: pipeline.memory_bytes() for name, pipeline in self._pipelines.items()}
+            refresh_errors = {
+                name: pipeline.last_refresh_error
+                for name, pipeline in self._pipelines.items()
+                if pipeline.last_refresh_error
+            }
+        return {
+            "corpora": sorted(self.corpora),
+            "loaded": {name: round(size / 2 ** 20, 2) for name, size in loaded.items()},
+            "memory_mb": round(sum(loaded.values()) / 2 ** 20, 2),
+            "memory_budget_mb": round(self.memory_budget / 2 ** 20, 2),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "reranker_ready": self.reranker_ready.is_set(),
+            "reranker": self.reranker_status,
+            "model_load_errors": dict(self.model_load_errors),
+            "refresh_errors": refresh_errors,
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache is not None else None,
+        }
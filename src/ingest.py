@@ -0,0 +1,80 @@
+import queue
+import threading
+from utils import logger, log_exceptions, log_time
+
+# Sentinel marking the end of the batch stream
+_DONE = object()
+
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _put(batches, item, stop):
+    """Put item on the bounded queue, giving up once stop is set."""
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce_batches(chunks, batch_size, batches, stop):
+    """Fill the bounded batches queue from the chunk stream until it ends or stop is set."""
+    try:
+        for batch in iter_batches(chunks, batch_size):
+            if not _put(batches, batch, stop):
+                return
+        _put(batches, _DONE, stop)
+    except Exception as e:  # handed to the consumer, which re-raises it
+        _put(batches, e, stop)
+
+
+@log_exceptions
+@log_time
+def index_streaming(index, chunks, batch_size=32, max_pending_batches=4, on_batch=None):
+    """
+    Embed and insert a stream of chunks into index in bounded batches.
+    Parsing and splitting run in a background thread that feeds a queue of at most
+    max_pending_batches batches, so embedding overlaps parsing while memory stays bounded
+    by the queue rather than by corpus size. on_batch(batch) is called before each insert.
+    Returns the number of chunks inserted.
+    """
+    batches = queue.Queue(maxsize=max_pending_batches)
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce_batches,
+        args=(chunks, batch_size, batches, stop),
+        name="ingest-producer",
+        daemon=True,
+    )
+    producer.start()
+
+    inserted = 0
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            if on_batch is not None:
+                on_batch(batch)
+            index.insert_nodes(batch)
+            inserted += len(batch)
+            logger.info(f"Indexed {inserted} chunks")
+    finally:
+        stop.set()
+        producer.join()
+
+    return inserted
@@ -0,0 +1,172 @@
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# Keeps clause numbers ("4.2.1"), SKUs ("AB-1234") and form names ("W-9") as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+BM25_VOCAB_FILE = "bm25_vocab.json"
+BM25_OFFSETS_FILE = "bm25_offsets.npy"
+BM25_DOCS_FILE = "bm25_docs.npy"
+BM25_TFS_FILE = "bm25_tfs.npy"
+BM25_LENGTHS_FILE = "bm25_lengths.npy"
+
+
+def tokenize(text):
+    """Lower-case terms of text, keeping dotted/hyphenated identifiers whole."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring over documents numbered 0..n-1.
+    Postings are stored CSR-style: per-term offsets into one uint32 doc-id array and one
+    uint16 term-frequency array. New documents go to a small append buffer that is merged
+    into the CSR arrays before the next search or save.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}  # term -> term id
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.docs = np.zeros(0, dtype=np.uint32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.doc_lengths = np.zeros(0, dtype=np.uint32)
+        self._pending = {}  # term id -> (array of doc ids, array of term frequencies)
+        self._pending_lengths = array("I")
+
+    def __len__(self):
+        return len(self.doc_lengths) + len(self._pending_lengths)
+
+    @property
+    def nbytes(self):
+        arrays = (self.offsets, self.docs, self.tfs, self.doc_lengths)
+        return sum(array.nbytes for array in arrays) + sum(len(term) + 8 for term in self.vocab)
+
+    def add(self, texts):
+        """Index texts as the next documents, in order."""
+        doc = len(self)
+        for text in texts:
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                term_id = self.vocab.setdefault(term, len(self.vocab))
+                docs, tfs = self._pending.setdefault(term_id, (array("I"), array("H")))
+                docs.append(doc)
+                tfs.append(min(tf, 65535))
+            self._pending_lengths.append(len(tokens))
+            doc += 1
+
+    def _merge_pending(self):
+        if not self._pending_lengths:
+            return
+        num_terms = len(self.vocab)
+        merged_terms = len(self.offsets) - 1
+        counts = np.zeros(num_terms, dtype=np.int64)
+        counts[:merged_terms] = np.diff(self.offsets)
+        doc_parts, tf_parts = [], []
+        for term_id in range(num_terms):
+            if term_id < merged_terms:
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                doc_parts.append(self.docs[start:end])
+                tf_parts.append(self.tfs[start:end])
+            pending = self._pending.get(term_id)
+            if pending is not None:
+                doc_parts.append(np.frombuffer(pending[0], dtype=np.uint32))
+                tf_parts.append(np.frombuffer(pending[1], dtype=np.uint16))
+                counts[term_id] += len(pending[0])
+        self.docs = np.concatenate(doc_parts) if doc_parts else np.zeros(0, dtype=np.uint32)
+        self.tfs = np.concatenate(tf_parts) if tf_parts else np.zeros(0, dtype=np.uint16)
+        self.offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(counts)])
+        self.doc_lengths = np.concatenate([self.doc_lengths, np.frombuffer(self._pending_lengths, dtype=np.uint32)])
+        self._pending = {}
+        self._pending_lengths = array("I")
+
+    def keep(self, positions):
+        """Keep only the given documents, renumbering them 0..len(positions)-1 in that order."""
+        self._merge_pending()
+        mapping = np.full(len(self.doc_lengths), -1, dtype=np.int64)
+        mapping[np.asarray(positions, dtype=np.int64)] = np.arange(len(positions))
+        term_ids = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        new_docs = mapping[self.docs]
+        alive = new_docs >= 0
+        counts = np.bincount(term_ids[alive], minlength=len(self.offsets) - 1)
+        self.docs = new_docs[alive].astype(np.uint32)
+        self.tfs = np.asarray(self.tfs)[alive]
+        self.offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(counts)])
+        self.doc_lengths = np.asarray(self.doc_lengths)[np.asarray(positions, dtype=np.int64)]
+
+    def search(self, query_text, top_k):
+        """Return (scores, positions) of the top_k documents by BM25, best first."""
+        self._merge_pending()
+        num_docs = len(self.doc_lengths)
+        if num_docs == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        length_norm = self.k1 * (1.0 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        scores = np.zeros(num_docs, dtype=np.float32)
+        for term in set(tokenize(query_text)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            if start == end:
+                continue
+            docs = self.docs[start:end]
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            df = end - start
+            idf = math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + length_norm[docs])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        top_k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        top = top[np.argsort(-scores[top])]
+        return scores[top], top
+
+    def save(self, directory):
+        self._merge_pending()
+        with open(os.path.join(directory, BM25_VOCAB_FILE), "w", encoding="utf-8") as handle:
+            json.dump({"k1": self.k1, "b": self.b, "terms": list(self.vocab)}, handle)
+        np.save(os.path.join(directory, BM25_OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(directory, BM25_DOCS_FILE), np.asarray(self.docs, dtype=np.uint32))
+        np.save(os.path.join(directory, BM25_TFS_FILE), np.asarray(self.tfs, dtype=np.uint16))
+        np.save(os.path.join(directory, BM25_LENGTHS_FILE), np.asarray(self.doc_lengths, dtype=np.uint32))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a saved index, memory-mapping the posting arrays. Returns None if none was saved."""
+        vocab_path = os.path.join(directory, BM25_VOCAB_FILE)
+        if not os.path.exists(vocab_path):
+            return None
+        with open(vocab_path, "r", encoding="utf-8") as handle:
+            saved = json.load(handle)
+        mmap_mode = "r" if mmap else None
+        index = cls(k1=saved["k1"], b=saved["b"])
+        index.vocab = {term: term_id for term_id, term in enumerate(saved["terms"])}
+        index.offsets = np.load(os.path.join(directory, BM25_OFFSETS_FILE))
+        index.docs = np.load(os.path.join(directory, BM25_DOCS_FILE), mmap_mode=mmap_mode)
+        index.tfs = np.load(os.path.join(directory, BM25_TFS_FILE), mmap_mode=mmap_mode)
+        index.doc_lengths = np.load(os.path.join(directory, BM25_LENGTHS_FILE))
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60, top_k=None):
+    """
+    Fuse ranked lists of positions with reciprocal rank fusion: score = sum of 1 / (k + rank).
+    Returns (scores, positions), best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            fused[int(position)] = fused.get(int(position), 0.0) + 1.0 / (k + rank + 1)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [score for _, score in ordered], [position for position, _ in ordered]
@@ -1,4 +1,3 @@
-from llama_index.llms.ollama import Ollama
 from llama_index.core import Settings
 from llama_index.core.postprocessor import SimilarityPostprocessor
 from utils import logger, log_exceptions, log_time
@@ -20,10 +19,12 @@ def initialize_llm(
     chunk_overlap=128,
     similarity_top_k=5,
     similarity_cutoff=0.75,
-    response_mode="compact"
+    response_mode="compact",
+    llm=None
 ):
     """
     Initialize LLM (Ollama) and LlamaIndex Settings.
+    A prebuilt llm (e.g. an offline stand-in) is used instead of Ollama when given.
     Returns the LLM object.
     """
     if system_prompt is None:
@@ -37,14 +38,17 @@ def initialize_llm(
 
     try:
         logger.info(f"Initializing LLM: {model_name}")
-        llm = Ollama(
-            model=model_name,
-            system_prompt=system_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            context_window=context_window,
-            keep_alive=keep_alive
-        )
+        if llm is None:
+            from llama_index.llms.ollama import Ollama
+
+            llm = Ollama(
+                model=model_name,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                context_window=context_window,
+                keep_alive=keep_alive
+            )
 
         # Update LlamaIndex global settings
         Settings.llm = llm
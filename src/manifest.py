@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo
+from utils import logger, log_exceptions, log_time
+
+# Manifest layout: {filename: {"hash": str, "size": int, "mtime_ns": int, "chunk_ids": [str, ...]}}
+MANIFEST_FILE = "manifest.json"
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """Return the sha1 hex digest of a file's content."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@log_exceptions
+@log_time
+def scan_corpus(folder_path, previous=None):
+    """
+    Stat every file in folder_path and return {filename: {"hash", "size", "mtime_ns"}}.
+    Files whose size and mtime match the previous manifest reuse its hash instead of being re-read.
+    """
+    previous = previous or {}
+    entries = {}
+    if not os.path.exists(folder_path):
+        logger.error(f"Folder not found: {folder_path}")
+        return entries
+
+    for filename in sorted(os.listdir(folder_path)):
+        file_path = os.path.join(folder_path, filename)
+        if not os.path.isfile(file_path):
+            continue
+        try:
+            stat = os.stat(file_path)
+            old = previous.get(filename)
+            if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                content_hash = old["hash"]
+            else:
+                content_hash = file_digest(file_path)
+            entries[filename] = {"hash": content_hash, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        except OSError as e:
+            logger.error(f"Failed to stat {filename}: {e}", exc_info=True)
+    return entries
+
+
+def diff_manifest(previous, current):
+    """
+    Compare two manifests by content hash.
+    Returns (added, changed, deleted, unchanged) lists of filenames.
+    """
+    added, changed, unchanged = [], [], []
+    for filename, entry in current.items():
+        old = previous.get(filename)
+        if old is None:
+            added.append(filename)
+        elif old["hash"] != entry["hash"]:
+            changed.append(filename)
+        else:
+            unchanged.append(filename)
+    deleted = [filename for filename in previous if filename not in current]
+    return added, changed, deleted, unchanged
+
+
+def chunk_id(filename, content_hash, position):
+    """Deterministic node id for the position-th chunk of a file version."""
+    return f"{filename}:{content_hash[:12]}:{position}"
+
+
+@log_exceptions
+def load_manifest(persist_dir):
+    """Load the manifest stored next to a persisted index; returns {} if there is none."""
+    manifest_path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def assign_chunk_ids(chunks, entries, chunk_ids=None):
+    """
+    Give each chunk a deterministic id and make its source file the reference document.
+    Pass the returned dict back in as chunk_ids to keep numbering across batches of a stream.
+    Returns {filename: [chunk ids]} for the manifest.
+    """
+    chunk_ids = {} if chunk_ids is None else chunk_ids
+    for chunk in chunks:
+        filename = chunk.metadata.get("source", "unknown_file")
+        ids = chunk_ids.setdefault(filename, [])
+        content_hash = entries.get(filename, {}).get("hash", "")
+        chunk.id_ = chunk_id(filename, content_hash, len(ids))
+        chunk.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=filename)
+        ids.append(chunk.id_)
+    return chunk_ids
@@ -0,0 +1,176 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for latency histograms, from sub-millisecond lookups to long generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Metrics by name, in registration order
+REGISTRY = {}
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def _label_text(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{label}="{value}"' for label, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._children.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{self._label_text(key)} {value}" for key, value in self._children.items()]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with a running sum and count, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][bisect_left(self.buckets, value)] += 1
+            child[1] += value
+            child[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._children.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{self._label_text(key, ('le', bound))} {cumulative}")
+                lines.append(f"{self.name}_sum{self._label_text(key)} {total}")
+                lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+def render_prometheus():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """Atomically write render_prometheus() to path, e.g. for a node_exporter textfile collector."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------------------------
+# Pipeline metrics
+# ---------------------------------------------------------------------------------
+FUNCTION_SECONDS = Histogram("rag_function_seconds", "Duration of log_time-decorated functions", ["function"])
+FUNCTION_ERRORS = Counter("rag_function_errors_total", "Exceptions caught by log_exceptions", ["function"])
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Duration of query pipeline stages", ["stage"])
+CONTEXT_TOKENS = Histogram("rag_context_tokens", "Tokens of retrieved context sent to the LLM", buckets=TOKEN_BUCKETS)
+TIME_TO_FIRST_TOKEN = Histogram("rag_time_to_first_token_seconds", "Time from streaming query to first answer token")
+GENERATION_TOKENS = Counter("rag_generation_tokens_total", "Answer tokens generated by the LLM")
+GENERATION_TOKENS_PER_SECOND = Histogram(
+    "rag_generation_tokens_per_second", "LLM generation speed per answer", buckets=RATE_BUCKETS
+)
+CACHE_REQUESTS = Counter("rag_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+EXTRACTIVE_ANSWERS = Counter(
+    "rag_extractive_answers_total", "Extractive fast path outcomes: answered, or fell back to generation", ["result"]
+)
+
+
+# ---------------------------------------------------------------------------------
+# Per-request tracing
+# ---------------------------------------------------------------------------------
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Spans recorded while a request runs, with start offsets relative to the request start."""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": (time.perf_counter() - self.start) * 1000.0,
+            "spans": list(self.spans),
+        }
+
+
+@contextmanager
+def trace_request():
+    """Collect the spans of the current request (in this thread) into a Trace."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage into rag_stage_seconds, and into the current Trace if one is active."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append({
+                "name": stage,
+                "start_ms": (start - trace.start) * 1000.0,
+                "duration_ms": elapsed * 1000.0,
+            })
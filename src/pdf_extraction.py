@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+
+from manifest import file_digest
+from metrics import CACHE_REQUESTS
+from utils import logger
+
+# "pdfplumber" is the default; "pdfplumber_layout" keeps the page's column layout with spacing;
+# "pdfium" uses pypdfium2 (installed with pdfplumber), which is several times faster
+PDF_BACKENDS = ("pdfplumber", "pdfplumber_layout", "pdfium")
+
+
+def _pdfplumber_pages(file_path, first_page, last_page, layout=False):
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        return [
+            (i, page.extract_text(layout=layout) or "")
+            for i, page in enumerate(pdf.pages[first_page:last_page], start=first_page)
+        ]
+
+
+def _pdfium_pages(file_path, first_page, last_page):
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(file_path)
+    try:
+        pages = []
+        for i in range(first_page, len(pdf) if last_page is None else min(last_page, len(pdf))):
+            page = pdf[i]
+            text_page = page.get_textpage()
+            pages.append((i, text_page.get_text_range().replace("\r\n", "\n")))
+            text_page.close()
+            page.close()
+        return pages
+    finally:
+        pdf.close()
+
+
+def page_count(file_path, backend="pdfplumber"):
+    """Number of pages in a PDF."""
+    if backend == "pdfium":
+        try:
+            import pypdfium2
+
+            pdf = pypdfium2.PdfDocument(file_path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+        except Exception as e:
+            logger.warning(f"pdfium could not open {file_path}, falling back to pdfplumber: {e}")
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(file_path, first_page=0, last_page=None, backend="pdfplumber"):
+    """
+    Extract the text of pages [first_page, last_page) as (page_index, text) pairs.
+    Returns (pages, backend_used): a backend that is not installed or fails on this file falls back to pdfplumber.
+    """
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}. Expected one of {list(PDF_BACKENDS)}")
+    if backend == "pdfium":
+        try:
+            return _pdfium_pages(file_path, first_page, last_page), backend
+        except Exception as e:
+            logger.warning(f"pdfium failed on {file_path}, falling back to pdfplumber: {e}")
+            backend = "pdfplumber"
+    return _pdfplumber_pages(file_path, first_page, last_page, layout=backend == "pdfplumber_layout"), backend
+
+
+class PageCache:
+    """
+    Persistent SQLite cache of extracted PDF page text keyed by (file content hash, backend, page).
+    Unchanged PDFs are never re-parsed, even after the vector index is rebuilt; safe to share
+    between the loader's worker processes.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " file_hash TEXT NOT NULL,"
+            " backend TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " PRIMARY KEY (file_hash, backend, page))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_hash TEXT NOT NULL,"
+            " backend TEXT NOT NULL,"
+            " page_count INTEGER NOT NULL,"
+            " PRIMARY KEY (file_hash, backend))"
+        )
+        self._conn.commit()
+
+    def get(self, file_hash, backend, first_page=0, last_page=None):
+        """Return the cached (page_index, text) pairs of [first_page, last_page), or None unless all are cached."""
+        with self._lock:
+            if last_page is None:
+                row = self._conn.execute(
+                    "SELECT page_count FROM files WHERE file_hash = ? AND backend = ?", (file_hash, backend)
+                ).fetchone()
+                if row is None:
+                    return None
+                last_page = row[0]
+            rows = self._conn.execute(
+                "SELECT page, text FROM pages WHERE file_hash = ? AND backend = ? AND page >= ? AND page < ?"
+                " ORDER BY page",
+                (file_hash, backend, first_page, last_page),
+            ).fetchall()
+        if len(rows) != last_page - first_page:
+            return None
+        return rows
+
+    def put(self, file_hash, backend, pages, page_count=None):
+        """Store extracted (page_index, text) pairs, and the file's page count when known."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (file_hash, backend, page, text) VALUES (?, ?, ?, ?)",
+                [(file_hash, backend, page, text) for page, text in pages],
+            )
+            if page_count is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (file_hash, backend, page_count) VALUES (?, ?, ?)",
+                    (file_hash, backend, page_count),
+                )
+            self._conn.commit()
+
+    def delete(self, file_hashes):
+        """Drop every cached page and page count of file_hashes."""
+        params = [(file_hash,) for file_hash in file_hashes]
+        with self._lock:
+            self._conn.executemany("DELETE FROM pages WHERE file_hash = ?", params)
+            self._conn.executemany("DELETE FROM files WHERE file_hash = ?", params)
+            self._conn.commit()
+
+
+# Per-process state: worker processes must not reuse a connection or digest table from their parent
+_caches = {}
+_digests = {}
+
+
+def _page_cache(path):
+    key = (path, os.getpid())
+    if key not in _caches:
+        _caches[key] = PageCache(path)
+    return _caches[key]
+
+
+def _cached_digest(file_path):
+    stat = os.stat(file_path)
+    key = (os.getpid(), file_path, stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        _digests[key] = file_digest(file_path)
+    return _digests[key]
+
+
+def drop_cached_pages(cache_path, file_hashes):
+    """Remove the pages of file_hashes (PDF versions no longer in any manifest) from the PageCache at cache_path."""
+    if file_hashes:
+        _page_cache(cache_path).delete(file_hashes)
+        logger.info(f"Dropped cached PDF pages of {len(file_hashes)} old file versions from {cache_path}")
+
+
+def extract_pages_cached(file_path, first_page=0, last_page=None, backend="pdfplumber", cache_path=None,
+                         file_hash=None):
+    """
+    extract_pages, served from (and stored into) the PageCache at cache_path when given.
+    file_hash is the file's content digest when already known (e.g. from the corpus manifest);
+    otherwise the file is hashed, once per process and file version.
+    """
+    if not cache_path:
+        return extract_pages(file_path, first_page, last_page, backend)[0]
+
+    cache = _page_cache(cache_path)
+    if file_hash is None:
+        file_hash = _cached_digest(file_path)
+    pages = cache.get(file_hash, backend, first_page, last_page)
+    if pages is not None:
+        CACHE_REQUESTS.inc(cache="pdf_page", result="hit")
+        return pages
+
+    CACHE_REQUESTS.inc(cache="pdf_page", result="miss")
+    pages, used = extract_pages(file_path, first_page, last_page, backend)
+    # Only a whole-document extraction tells us the page count
+    count = first_page + len(pages) if last_page is None else None
+    cache.put(file_hash, used, pages, page_count=count)
+    if used != backend:
+        cache.put(file_hash, backend, pages, page_count=count)
+    return pages
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+QUANTIZATION_TYPES = ("none", "float16", "int8", "binary")
+
+QUANTIZED_CODES_FILE = "embeddings_{}.npy"
+INT8_SCALE_FILE = "int8_scale.npy"
+
+# Rows converted to float32 at a time while scanning float16/int8 codes
+SCAN_BLOCK_ROWS = 65536
+
+# Number of set bits in every byte value, for Hamming distances on packed codes
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class QuantizedVectors:
+    """
+    Compressed copy of a normalized embedding matrix for fast approximate scans.
+    "float16" halves memory, "int8" stores per-dimension scaled bytes (a quarter of float32),
+    and "binary" keeps one sign bit per dimension (1/32) scored by Hamming distance.
+    """
+
+    def __init__(self, kind, dim):
+        if kind not in QUANTIZATION_TYPES or kind == "none":
+            raise ValueError(f"Unknown quantization: {kind}. Expected one of {list(QUANTIZATION_TYPES[1:])}")
+        self.kind = kind
+        self.dim = dim
+        self.scale = None  # int8 only: per-dimension step, fixed by the first batch
+        self.codes = None
+
+    def __len__(self):
+        return 0 if self.codes is None else len(self.codes)
+
+    @property
+    def nbytes(self):
+        return 0 if self.codes is None else int(self.codes.nbytes)
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.kind == "float16":
+            return vectors.astype(np.float16)
+        if self.kind == "int8":
+            if self.scale is None:
+                self.scale = np.maximum(np.abs(vectors).max(axis=0), 1e-6) / 127.0
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        return np.packbits(vectors > 0, axis=1)
+
+    def append(self, vectors):
+        codes = self.encode(vectors)
+        self.codes = codes if self.codes is None else np.concatenate([self.codes, codes])
+
+    def keep(self, positions):
+        self.codes = self.codes[np.asarray(positions, dtype=np.int64)] if len(positions) else None
+
+    def scores(self, query_vector):
+        """Approximate cosine similarity of query_vector to every row."""
+        if self.kind == "binary":
+            query_bits = np.packbits(query_vector > 0)
+            hamming = np.zeros(len(self.codes), dtype=np.int32)
+            for start in range(0, len(self.codes), SCAN_BLOCK_ROWS):
+                block = self.codes[start:start + SCAN_BLOCK_ROWS]
+                hamming[start:start + len(block)] = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1)
+            return 1.0 - 2.0 * hamming.astype(np.float32) / self.dim
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        if self.kind == "int8":
+            query = query * self.scale
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + SCAN_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def search(self, query_vector, top_k):
+        """Return approximate (scores, positions) of the top_k rows, best first."""
+        scores = self.scores(query_vector)
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return scores[top], top
+
+    def save(self, directory):
+        np.save(os.path.join(directory, QUANTIZED_CODES_FILE.format(self.kind)), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(directory, INT8_SCALE_FILE), self.scale)
+
+    @classmethod
+    def load(cls, directory, kind, dim):
+        """Load saved codes into memory; returns None if none were saved for this kind."""
+        codes_path = os.path.join(directory, QUANTIZED_CODES_FILE.format(kind))
+        if not os.path.exists(codes_path):
+            return None
+        quantized = cls(kind, dim)
+        quantized.codes = np.load(codes_path)
+        if kind == "int8":
+            quantized.scale = np.load(os.path.join(directory, INT8_SCALE_FILE))
+        return quantized
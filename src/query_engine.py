@@ -1,23 +1,48 @@
-from llama_index.core import VectorStoreIndex
-from llama_index.llms.ollama import Ollama
-from sentence_transformers import CrossEncoder
+import inspect
+import time
+from llama_index.core import QueryBundle, StorageContext, VectorStoreIndex, get_response_synthesizer
+from batching import MicroBatcher
+from chunk_store import DUPLICATES_KEY, END_CHAR_KEY, SECTION_KEY, START_CHAR_KEY
+from chunking import sentence_spans
+from context_packing import count_tokens, node_tokens, pack_context
+from metrics import CONTEXT_TOKENS, EXTRACTIVE_ANSWERS, GENERATION_TOKENS, GENERATION_TOKENS_PER_SECOND, span
 from utils import logger, log_exceptions, log_time
+from vector_store import ArrayVectorStore, load_vector_store
 import warnings
 warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
 # Global reranker variable (optional)
 cross_encoder = None
+# Coalesces (query, passage) pairs from concurrent requests into shared CrossEncoder batches (optional)
+rerank_batcher = None
+
+# Answers returned when a query could not be processed
+ENGINE_NOT_INITIALIZED_ANSWER = "Query engine not initialized."
+QUERY_FAILED_ANSWER = "Failed to process query."
+ERROR_ANSWERS = {ENGINE_NOT_INITIALIZED_ANSWER, QUERY_FAILED_ANSWER}
+
+# Sentences with fewer words are never returned as extractive answers (headings, list stubs)
+MIN_EXTRACTIVE_WORDS = 4
 
 @log_exceptions
 @log_time
-def build_vector_index(chunked_docs):
+def build_vector_index(chunked_docs, persist_dir=None, **store_options):
     """
     Build a VectorStoreIndex from chunked documents.
+    Embeddings are kept in an ArrayVectorStore, which is written to persist_dir when given.
+    store_options configure the store: index_type ("exact", or FAISS "flat", "hnsw", "ivfpq") with
+    search_params, lexical (BM25 for hybrid retrieval), and quantization with rescore_factor.
     Returns the index object.
     """
     try:
         logger.info(f"Building vector index from {len(chunked_docs)} document chunks")
-        index = VectorStoreIndex.from_documents(chunked_docs)
+        vector_store = ArrayVectorStore(**store_options)
+        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        index = VectorStoreIndex(chunked_docs, storage_context=storage_context)
+        if index.vector_store is not vector_store:
+            raise RuntimeError(f"Index was built on {type(index.vector_store).__name__} instead of ArrayVectorStore")
         logger.info("Vector index created successfully")
+        if persist_dir:
+            vector_store.persist(persist_dir)
         return index
     except Exception as e:
         logger.error(f"Failed to create vector index: {e}", exc_info=True)
@@ -25,14 +50,45 @@ def build_vector_index(chunked_docs):
 
 
 @log_exceptions
-def initialize_reranker(model_name='cross-encoder/ms-marco-MiniLM-L-6-v2'):
+@log_time
+def load_vector_index(persist_dir, vector_store=None, **store_options):
+    """
+    Load a VectorStoreIndex from a persisted ArrayVectorStore without re-embedding anything.
+    An ArrayVectorStore already loaded with load_vector_store can be passed as vector_store.
+    Returns None if nothing usable is persisted at persist_dir.
+    """
+    if vector_store is None:
+        vector_store = load_vector_store(persist_dir, **store_options)
+    if vector_store is None:
+        return None
+
+    try:
+        index = VectorStoreIndex.from_vector_store(vector_store)
+        if index.vector_store is not vector_store:
+            raise RuntimeError(f"Index was loaded on {type(index.vector_store).__name__} instead of ArrayVectorStore")
+        logger.info("Vector index loaded from persisted store")
+        return index
+    except Exception as e:
+        logger.error(f"Failed to load vector index: {e}", exc_info=True)
+        return None
+
+
+@log_exceptions
+def initialize_reranker(model_name='cross-encoder/ms-marco-MiniLM-L-6-v2', max_length=512, device="cpu", model=None):
     """
     Initialize a CrossEncoder for optional reranking.
+    Query/passage pairs longer than max_length tokens are truncated.
+    A prebuilt model with CrossEncoder's predict() signature is used instead when given.
     """
     global cross_encoder
     try:
-        cross_encoder = CrossEncoder(model_name)
-        logger.info(f"CrossEncoder reranker initialized: {model_name}")
+        if model is None:
+            # Imported here: sentence_transformers pulls in torch and transformers
+            from sentence_transformers import CrossEncoder
+
+            model = CrossEncoder(model_name, max_length=max_length, device=device)
+        cross_encoder = model
+        logger.info(f"CrossEncoder reranker initialized: {model_name} | max_length={max_length} | device={device}")
         return cross_encoder
     except Exception as e:
         logger.error(f"Failed to initialize reranker: {e}", exc_info=True)
@@ -40,32 +96,96 @@ def initialize_reranker(model_name='cross-encoder/ms-marco-MiniLM-L-6-v2'):
 
 
 @log_exceptions
-def rerank_nodes(nodes, query, top_k=5):
+def enable_rerank_batching(max_batch_size=64, max_wait_ms=5.0):
     """
-    Rerank nodes based on query using CrossEncoder.
-    Returns top_k nodes.
+    Route reranking through a MicroBatcher so pairs from concurrent queries share forward passes.
+    """
+    global rerank_batcher
+    if cross_encoder is None:
+        logger.warning("Reranker not initialized, rerank batching not enabled")
+        return None
+    rerank_batcher = MicroBatcher(
+        lambda pairs: cross_encoder.predict(pairs, batch_size=max_batch_size, show_progress_bar=False),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        name="rerank",
+    )
+    logger.info(f"Rerank micro-batching enabled | max_batch_size={max_batch_size} | max_wait_ms={max_wait_ms}")
+    return rerank_batcher
+
+
+def _score_pairs(pairs, batch_size=32):
+    """CrossEncoder scores of (query, passage) pairs, through the micro-batcher when enabled."""
+    if rerank_batcher is not None:
+        return rerank_batcher.map(pairs)
+    return cross_encoder.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+
+
+@log_exceptions
+@log_time
+def rerank_nodes(nodes, query, top_k=5, batch_size=32):
+    """
+    Rerank nodes based on query using CrossEncoder, scoring batch_size pairs per forward pass.
+    Returns top_k nodes with their score replaced by the reranker score.
     """
     if cross_encoder is None:
         logger.warning("Reranker not initialized, skipping rerank")
         return nodes[:top_k]
+    if not nodes:
+        return nodes
 
     try:
-        scores = cross_encoder.predict([(node.node.text, query) for node in nodes])
-        ranked_nodes = [node for _, node in sorted(zip(scores, nodes), reverse=True)]
-        return ranked_nodes[:top_k]
+        scores = _score_pairs([(query, node.node.get_content()) for node in nodes], batch_size)
+        ranked = sorted(zip(scores, nodes), key=lambda pair: pair[0], reverse=True)[:top_k]
+        for score, node in ranked:
+            node.score = float(score)
+        return [node for _, node in ranked]
     except Exception as e:
         logger.error(f"Failed to rerank nodes: {e}", exc_info=True)
         return nodes[:top_k]
 
 
 @log_exceptions
-def create_query_engine(index, llm):
+@log_time
+def rerank_node_lists(node_lists, queries, top_k=5, batch_size=32):
+    """
+    Rerank the candidates of many queries at once: all (query, passage) pairs go to the CrossEncoder
+    together, in forward passes of batch_size pairs, instead of one small batch per query.
+    Returns the top_k nodes of each list, in the order of queries.
+    """
+    if cross_encoder is None:
+        logger.warning("Reranker not initialized, skipping rerank")
+        return [nodes[:top_k] for nodes in node_lists]
+    pairs = [(query, node.node.get_content()) for query, nodes in zip(queries, node_lists) for node in nodes]
+    if not pairs:
+        return [[] for _ in node_lists]
+
+    scores = cross_encoder.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    ranked_lists, offset = [], 0
+    for nodes in node_lists:
+        ranked = sorted(zip(scores[offset:offset + len(nodes)], nodes), key=lambda pair: pair[0], reverse=True)
+        offset += len(nodes)
+        for score, node in ranked[:top_k]:
+            node.score = float(score)
+        ranked_lists.append([node for _, node in ranked[:top_k]])
+    return ranked_lists
+
+
+@log_exceptions
+def create_query_engine(index, llm, candidate_k=50, hybrid=False):
     """
     Create a query engine from a VectorStoreIndex and LLM.
+    Its retriever returns candidate_k nodes; ask_question narrows them to top_k before synthesis.
+    With hybrid, the candidates are BM25 and dense results fused by reciprocal rank fusion.
     """
     try:
-        query_engine = index.as_query_engine(llm=llm)
-        logger.info("Query engine created successfully")
+        query_engine = index.as_query_engine(
+            llm=llm,
+            similarity_top_k=candidate_k,
+            sparse_top_k=candidate_k,
+            vector_store_query_mode="hybrid" if hybrid else "default",
+        )
+        logger.info(f"Query engine created successfully | candidate_k={candidate_k} | hybrid={hybrid}")
         return query_engine
     except Exception as e:
         logger.error(f"Failed to create query engine: {e}", exc_info=True)
@@ -73,39 +193,279 @@ def create_query_engine(index, llm):
 
 
 @log_exceptions
-def ask_question(query_engine, query, use_rerank=False, top_k=5):
+def create_stream_synthesizer(llm):
+    """
+    Create a response synthesizer that streams LLM tokens instead of returning a full answer.
+    """
+    try:
+        synthesizer = get_response_synthesizer(llm=llm, response_mode="compact", streaming=True)
+        logger.info("Streaming synthesizer created successfully")
+        return synthesizer
+    except Exception as e:
+        logger.error(f"Failed to create streaming synthesizer: {e}", exc_info=True)
+        return None
+
+
+def _cited_metadata(nodes):
+    """Yield the citation metadata of each node, followed by that of the near-duplicates merged into it."""
+    for node in nodes:
+        md = node.node.metadata
+        yield md
+        yield from md.get(DUPLICATES_KEY, [])
+
+
+def format_citations(nodes):
+    """Return the distinct 'source (page N)' citations of nodes, in rank order."""
+    citations = []
+    for md in _cited_metadata(nodes):
+        src = md.get("source", "unknown_file")
+        page = md.get("page")
+        if page:
+            citations.append(f"{src} (page {page})")
+        else:
+            citations.append(src)
+    return list(dict.fromkeys(citations))
+
+
+def _span(md):
+    """The citation span of one chunk's metadata, or None if it was chunked without offsets."""
+    if END_CHAR_KEY not in md:
+        return None
+    return {
+        "source": md.get("source", "unknown_file"),
+        "page": md.get("page"),
+        "section": md.get(SECTION_KEY),
+        "start_char": md[START_CHAR_KEY],
+        "end_char": md[END_CHAR_KEY],
+    }
+
+
+def citation_spans(nodes):
+    """
+    Return the distinct spans of nodes chunked with character offsets, in rank order:
+    [{'source', 'page', 'section', 'start_char', 'end_char'}], where text[start_char:end_char] of the
+    source file (or PDF page) is the cited chunk.
+    """
+    spans = {}
+    for md in _cited_metadata(nodes):
+        span_info = _span(md)
+        if span_info is not None:
+            spans.setdefault(tuple(span_info.values()), span_info)
+    return list(spans.values())
+
+
+def _predict_probabilities(pairs, batch_size=32):
+    """
+    CrossEncoder relevance probabilities of (query, passage) pairs. The sigmoid is requested explicitly,
+    since whether predict() applies one by default depends on the sentence-transformers version and the
+    model config (the keyword is activation_fn from version 4, activation_fct before). Rerankers whose
+    predict() takes neither, such as the benchmark stand-ins, must return probabilities themselves.
+    """
+    parameters = inspect.signature(cross_encoder.predict).parameters
+    keyword = next((name for name in ("activation_fn", "activation_fct") if name in parameters), None)
+    if keyword is None:
+        return cross_encoder.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    import torch
+
+    return cross_encoder.predict(pairs, batch_size=batch_size, show_progress_bar=False, **{keyword: torch.nn.Sigmoid()})
+
+
+@log_exceptions
+def extract_answer(nodes, query, threshold=0.9, max_nodes=3, batch_size=32):
+    """
+    Extractive fast path: score each sentence of the best max_nodes nodes against query with the
+    CrossEncoder, and answer with the best sentence if its relevance probability is at least threshold.
+    Returns (result, confidence); result is None when no sentence is confident enough (or the reranker
+    is not loaded) and the answer has to be generated.
+    """
+    if cross_encoder is None or not nodes:
+        return None, 0.0
+    candidates = []
+    for node in nodes[:max_nodes]:
+        text = node.node.get_content()
+        for start, end in sentence_spans(text):
+            if len(text[start:end].split()) >= MIN_EXTRACTIVE_WORDS:
+                candidates.append((node, text, start, end))
+    if not candidates:
+        return None, 0.0
+
+    scores = _predict_probabilities([(query, text[start:end]) for _, text, start, end in candidates], batch_size)
+    best = max(range(len(candidates)), key=lambda i: scores[i])
+    confidence = float(scores[best])
+    if confidence < threshold:
+        return None, confidence
+
+    node, text, start, end = candidates[best]
+    spans = citation_spans([node])
+    own_span = _span(node.node.metadata)
+    for span_info in spans:  # narrow the chunk's own span (not its duplicates') to the extracted sentence
+        if span_info == own_span:
+            span_info["end_char"] = span_info["start_char"] + end
+            span_info["start_char"] += start
+    return {
+        "answer": text[start:end],
+        "citations": format_citations([node]),
+        "spans": spans,
+        "mode": "extractive",
+        "confidence": confidence,
+    }, confidence
+
+
+def _try_extractive(top_nodes, query, threshold, max_nodes, batch_size):
+    """Run extract_answer when threshold is set, counting answered/fallback outcomes; returns its result or None."""
+    if threshold is None:
+        return None
+    with span("extractive"):
+        result, confidence = extract_answer(top_nodes, query, threshold, max_nodes, batch_size)
+    EXTRACTIVE_ANSWERS.inc(result="fallback" if result is None else "answered")
+    if result is not None:
+        logger.info(f"Extractive answer (confidence {confidence:.2f}) for query: {query}")
+    return result
+
+
+@log_exceptions
+def retrieve_nodes(query_engine, query_bundle, use_rerank=False, top_k=5, rerank_batch_size=32,
+                   context_budget=None, dedup_threshold=0.8, embed_model=None):
+    """
+    Two-stage retrieval: fetch the engine's wide candidate set, then keep the top_k
+    (reranked with the CrossEncoder when use_rerank is set).
+    With context_budget, the top_k are packed into at most that many tokens (see pack_context).
+    embed_model should be the index's embedding model: the query is then embedded as its own
+    "query_embedding" stage, otherwise inside retrieval.
+    Each stage is timed into the rag_stage_seconds histogram and the active request trace.
+    """
+    # Embed the query as its own stage; the retriever reuses query_bundle.embedding
+    if embed_model is not None and query_bundle.embedding is None:
+        with span("query_embedding"):
+            query_bundle.embedding = embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+    with span("retrieval"):
+        nodes = query_engine.retrieve(query_bundle)
+    if use_rerank:
+        with span("rerank"):
+            nodes = rerank_nodes(nodes, query_bundle.query_str, top_k=top_k, batch_size=rerank_batch_size)
+    else:
+        nodes = nodes[:top_k]
+    if context_budget:
+        with span("context_packing"):
+            nodes = pack_context(nodes, token_budget=context_budget, dedup_threshold=dedup_threshold)
+    CONTEXT_TOKENS.observe(sum(node_tokens(node) for node in nodes))
+    return nodes
+
+
+def record_generation(num_tokens, seconds):
+    """Record generated answer tokens and generation speed."""
+    GENERATION_TOKENS.inc(num_tokens)
+    if seconds > 0:
+        GENERATION_TOKENS_PER_SECOND.observe(num_tokens / seconds)
+
+
+def answer_from_nodes(query_engine, query, top_nodes, rerank_batch_size=32, extractive_threshold=None,
+                      extractive_nodes=3):
+    """
+    Answer query from already retrieved top_nodes: extractively when extractive_threshold is set and a
+    sentence is confident enough, else by LLM synthesis. Raises on failure; see ask_question for the result.
+    """
+    extracted = _try_extractive(top_nodes, query, extractive_threshold, extractive_nodes, rerank_batch_size)
+    if extracted is not None:
+        return extracted
+
+    with span("generation"):
+        started = time.perf_counter()
+        response = query_engine.synthesize(QueryBundle(query), top_nodes)
+        generation_seconds = time.perf_counter() - started
+
+    # Collect answer and citations
+    answer_text = response.response
+    record_generation(count_tokens(answer_text or ""), generation_seconds)
+    return {
+        "answer": answer_text,
+        "citations": format_citations(top_nodes),
+        "spans": citation_spans(top_nodes),
+        "mode": "generated",
+    }
+
+
+@log_exceptions
+def ask_question(query_engine, query, use_rerank=False, top_k=5, rerank_batch_size=32,
+                 context_budget=None, dedup_threshold=0.8, extractive_threshold=None, extractive_nodes=3,
+                 retrieval_query=None, embed_model=None, query_embedding=None):
     """
     Ask a query to the RAG system.
-    Returns a dict: {'answer': str, 'citations': list[str]}
+    retrieval_query, when given, is searched instead of query (e.g. a follow-up question with the
+    conversation's earlier questions prepended); the answer is still generated for query.
+    embed_model is the index's embedding model, used to time query embedding separately (see retrieve_nodes);
+    query_embedding, an already computed embedding of the retrieval query, skips that step.
+    Retrieval and optional reranking run first, so the LLM only sees the final top_k nodes,
+    deduplicated and packed into context_budget tokens when given.
+    With extractive_threshold, a confident enough sentence of the top extractive_nodes nodes is returned
+    without calling the LLM (see extract_answer).
+    Returns a dict: {'answer': str, 'citations': list[str], 'spans': list[dict] (see citation_spans),
+    'mode': 'extractive' or 'generated'}
     """
     if query_engine is None:
         logger.error("Query engine is None, cannot process query")
-        return {"answer": "Query engine not initialized.", "citations": []}
+        return {"answer": ENGINE_NOT_INITIALIZED_ANSWER, "citations": [], "spans": []}
 
     try:
-        response = query_engine.query(query)
-        top_nodes = response.source_nodes
-
-        # Optional reranking
-        if use_rerank:
-            top_nodes = rerank_nodes(top_nodes, query, top_k=top_k)
-
-        # Collect answer and citations
-        answer_text = response.response
-        citations = []
-        for node in top_nodes:
-            md = node.node.metadata
-            src = md.get("source", "unknown_file")
-            page = md.get("page")
-            if page:
-                citations.append(f"{src} (page {page})")
-            else:
-                citations.append(src)
-        citations = list(set(citations))
-
-        logger.info(f"Query processed successfully: {query}")
-        return {"answer": answer_text, "citations": citations}
+        top_nodes = retrieve_nodes(
+            query_engine,
+            QueryBundle(retrieval_query or query, embedding=query_embedding),
+            use_rerank=use_rerank,
+            top_k=top_k,
+            rerank_batch_size=rerank_batch_size,
+            context_budget=context_budget,
+            dedup_threshold=dedup_threshold,
+            embed_model=embed_model,
+        )
+        result = answer_from_nodes(query_engine, query, top_nodes, rerank_batch_size=rerank_batch_size,
+                                   extractive_threshold=extractive_threshold, extractive_nodes=extractive_nodes)
+        if result["mode"] == "generated":
+            logger.info(f"Query processed successfully: {query}")
+        return result
+
+    except Exception as e:
+        logger.error(f"Failed to process query: {query} | {e}", exc_info=True)
+        return {"answer": QUERY_FAILED_ANSWER, "citations": [], "spans": []}
+
+
+@log_exceptions
+def ask_question_stream(query_engine, synthesizer, query, use_rerank=False, top_k=5, rerank_batch_size=32,
+                        context_budget=None, dedup_threshold=0.8, extractive_threshold=None, extractive_nodes=3,
+                        retrieval_query=None, embed_model=None, query_embedding=None):
+    """
+    Streaming variant of ask_question.
+    Retrieval and reranking finish before this returns, so citations are available before generation starts.
+    An extractive answer is streamed as a single token.
+    Returns a dict: {'citations': list[str], 'spans': list[dict], 'mode': str, 'tokens': iterator of str}
+    """
+    if query_engine is None or synthesizer is None:
+        logger.error("Query engine is None, cannot process query")
+        return {"citations": [], "spans": [], "tokens": iter([ENGINE_NOT_INITIALIZED_ANSWER])}
+
+    try:
+        top_nodes = retrieve_nodes(
+            query_engine,
+            QueryBundle(retrieval_query or query, embedding=query_embedding),
+            use_rerank=use_rerank,
+            top_k=top_k,
+            rerank_batch_size=rerank_batch_size,
+            context_budget=context_budget,
+            dedup_threshold=dedup_threshold,
+            embed_model=embed_model,
+        )
+        extracted = _try_extractive(top_nodes, query, extractive_threshold, extractive_nodes, rerank_batch_size)
+        if extracted is not None:
+            answer = extracted.pop("answer")
+            return {**extracted, "tokens": iter([answer])}
+
+        response = synthesizer.synthesize(QueryBundle(query), top_nodes)
+        return {
+            "citations": format_citations(top_nodes),
+            "spans": citation_spans(top_nodes),
+            "mode": "generated",
+            "tokens": response.response_gen,
+        }
 
     except Exception as e:
         logger.error(f"Failed to process query: {query} | {e}", exc_info=True)
-        return {"answer": "Failed to process query.", "citations": []}
+        return {"citations": [], "spans": [], "tokens": iter([QUERY_FAILED_ANSWER])}
@@ -1,78 +1,664 @@
-from utils import logger, log_exceptions, log_time
-from data_loader import load_documents, split_documents
+import time
+
+# Measured from the first import, so it covers loading every dependency below
+_IMPORT_STARTED = time.perf_counter()
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from utils import logger, log_exceptions, log_time, run_now
+from data_loader import iter_documents, iter_split_documents
+from pdf_extraction import drop_cached_pages
 from embedding import initialize_embeddings
+from embedding_cache import initialize_embedding_cache
 from llm_setup import initialize_llm
-from query_engine import build_vector_index, create_query_engine, ask_question, initialize_reranker
+from query_engine import (
+    ERROR_ANSWERS,
+    build_vector_index,
+    load_vector_index,
+    create_query_engine,
+    create_stream_synthesizer,
+    ask_question,
+    ask_question_stream,
+    record_generation,
+    initialize_reranker,
+    enable_rerank_batching,
+)
+from batching import batching_stats
+from metrics import TIME_TO_FIRST_TOKEN, span, trace_request, write_metrics
+from answer_cache import AnswerCache
+from batch_qa import answer_batch
+from conversation import DEFAULT_SESSION, SessionStore, condense_query
+from vector_store import index_store_path, load_vector_store
+from ingest import index_streaming
+from manifest import MANIFEST_FILE, scan_corpus, diff_manifest, load_manifest, assign_chunk_ids
 from llama_index.core import Settings
 import warnings
 warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
 
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
 class RAGPipeline:
     """
     Retrieval-Augmented Generation (RAG) pipeline.
     Combines document ingestion, embeddings, LLM, vector search, and optional reranking.
+    embeddings, llm and reranker replace the HuggingFace, Ollama and CrossEncoder models with
+    prebuilt ones, e.g. the offline stand-ins used by benchmarks/pipeline.py. embed_model is an
+    already initialized LlamaIndex embedding model, used as is (IndexManager shares one across corpora).
+    With metrics_file, Prometheus-format metrics are written there after answers (at most once a second).
+    With lazy_models, the embedding model, LLM and reranker load in parallel background threads and the
+    pipeline serves as soon as the index and the first two are ready, without reranking until the reranker is.
+    With extractive_threshold (a CrossEncoder confidence such as 0.9), questions whose answer is a single
+    confidently matching sentence of the top extractive_nodes chunks are answered with that sentence,
+    without waiting for the LLM; stats()["extractive"] reports how often generation was still needed.
+    Conversation histories keep the last history_max_turns turns per session, expire after session_ttl idle
+    seconds and are persisted to SQLite at session_store_path if given; session_store replaces them with an
+    existing SessionStore (IndexManager keeps one per corpus across evictions). With query_condensation ("llm" or
+    "concat"; None by default), a question asked with an explicit session_id is condensed with that session's
+    last condense_history_turns turns into a standalone query, in at most condense_token_budget tokens.
+    The "section" chunker splits at headings and sentences into chunks of at most chunk_tokens tokens with
+    their character offsets; chunker="recursive" restores the character splitter (chunk_size/chunk_overlap).
     """
 
-    @log_exceptions
+    @log_exceptions(reraise=True)
     @log_time
     def __init__(self,
                  docs_folder="data/sample_policies",
                  embedding_model="intfloat/e5-large-v2",
                  llm_model="llama3.2:1b",
                  use_rerank=True,
-                 device="cpu"):
+                 device="cpu",
+                 embed_batch_size=32,
+                 chunk_size=1024,
+                 chunk_overlap=128,
+                 chunker="section",
+                 chunk_tokens=256,
+                 chunk_overlap_tokens=0,
+                 persist_dir="data/vector_store",
+                 ingest_workers=1,
+                 pdf_pages_per_task=None,
+                 pdf_backend="pdfplumber",
+                 pdf_page_cache_path=None,
+                 embedding_cache_path=None,
+                 embedding_cache_max_entries=500_000,
+                 answer_cache_size=256,
+                 answer_cache_ttl=3600,
+                 semantic_cache_threshold=None,
+                 rerank_candidates=50,
+                 rerank_batch_size=32,
+                 rerank_max_length=512,
+                 micro_batch_wait_ms=None,
+                 vector_index="exact",
+                 vector_index_params=None,
+                 hybrid_search=True,
+                 quantization="none",
+                 rescore_factor=4,
+                 context_token_budget=1024,
+                 dedup_threshold=0.8,
+                 extractive_threshold=None,
+                 extractive_nodes=3,
+                 history_max_turns=20,
+                 session_ttl=86400,
+                 max_sessions=10_000,
+                 session_store_path=None,
+                 session_store=None,
+                 query_condensation=None,
+                 condense_history_turns=3,
+                 condense_token_budget=768,
+                 embeddings=None,
+                 llm=None,
+                 reranker=None,
+                 metrics_file=None,
+                 lazy_models=False,
+                 embed_model=None):
         logger.info("Initializing RAG Pipeline...")
 
-        # 1. Load & split documents
-        self.docs = load_documents(docs_folder)
-        self.chunked_docs = split_documents(self.docs)
+        started = time.perf_counter()
+        self.startup = {
+            "import_seconds": round(IMPORT_SECONDS, 3),
+            "ready_seconds": None,
+            "model_load_seconds": {},
+            "model_load_errors": {},
+        }
 
-        # 2. Initialize embeddings
-        self.embed_model = initialize_embeddings(model_name=embedding_model, device=device)
-        # Ensure LlamaIndex uses our embedding model (avoid default OpenAI dependency)
-        if self.embed_model is not None:
-            Settings.embed_model = self.embed_model
+        # Models load one after another or, with lazy_models, in background threads while the persisted
+        # index is read; the reranker may then still be loading when the pipeline starts serving
+        loader = ThreadPoolExecutor(max_workers=3, thread_name_prefix="model-load") if lazy_models else None
+        submit = loader.submit if loader is not None else run_now
 
-        # 3. Initialize LLM
-        self.llm = initialize_llm(model_name=llm_model)
+        # 1. Initialize embeddings, behind a persistent cache kept with the vector store by default
+        self.embedding_cache = None
+        self.embed_batch_size = embed_batch_size
+        if embed_model is not None:
+            # Already initialized and shared with other pipelines (see IndexManager)
+            embed_future = run_now(lambda: embed_model)
+        else:
+            if embedding_cache_path is None and persist_dir:
+                embedding_cache_path = os.path.join(persist_dir, "embedding_cache.sqlite")
+            if embedding_cache_path:
+                self.embedding_cache = initialize_embedding_cache(
+                    embedding_cache_path, max_entries=embedding_cache_max_entries
+                )
+            embed_future = submit(
+                self._load_model,
+                "embeddings",
+                initialize_embeddings,
+                model_name=embedding_model,
+                device=device,
+                batch_size=embed_batch_size,
+                cache=self.embedding_cache,
+                micro_batch_wait_ms=micro_batch_wait_ms,
+                base_embeddings=embeddings,
+            )
 
-        # 4. Build vector index
-        self.index = build_vector_index(self.chunked_docs)
+        # 2. Initialize LLM
+        self.embedding_model_name = embedding_model
+        self.llm_model_name = llm_model
+        llm_future = submit(self._load_model, "llm", initialize_llm, model_name=llm_model, llm=llm)
 
-        # 5. Initialize reranker (optional)
+        # 3. Initialize reranker (optional); reranking is skipped until it is ready
         self.use_rerank = use_rerank
+        self.rerank_batch_size = rerank_batch_size
+        self.reranker_ready = threading.Event()
+        self.reranker_status = "loading" if use_rerank else "disabled"
         if use_rerank:
-            initialize_reranker()
+            submit(self._load_reranker, rerank_max_length, device, reranker, micro_batch_wait_ms)
+        if loader is not None:
+            loader.shutdown(wait=False)
+
+        # Answers are cached per index version; refresh() bumps the version when the index changes
+        self.index_version = 0
+        self.answer_cache = None
+        if answer_cache_size:
+            self.answer_cache = AnswerCache(
+                max_entries=answer_cache_size,
+                ttl_seconds=answer_cache_ttl,
+                semantic_threshold=semantic_cache_threshold,
+            )
+
+        # 4. Load the persisted store and its manifest for this corpus/model/chunking, if any
+        self.docs_folder = docs_folder
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunking = {
+            "chunker": chunker,
+            "chunk_tokens": chunk_tokens,
+            "chunk_overlap_tokens": chunk_overlap_tokens,
+        }
+        self.ingest_workers = ingest_workers
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self.pdf_backend = pdf_backend
+        # Extracted PDF pages are cached by file hash, shared by every index built under persist_dir
+        if pdf_page_cache_path is None and persist_dir:
+            pdf_page_cache_path = os.path.join(persist_dir, "pdf_pages.sqlite")
+        self.pdf_page_cache_path = pdf_page_cache_path
+        self.store_options = {
+            "index_type": vector_index,
+            "search_params": vector_index_params,
+            "lexical": hybrid_search,
+            "quantization": quantization,
+            "rescore_factor": rescore_factor,
+        }
+        self.store_dir = None
+        self.manifest = {}
+        vector_store = None
+        if persist_dir:
+            self.store_dir = index_store_path(
+                persist_dir, docs_folder, embedding_model, chunk_size, chunk_overlap, **self.chunking
+            )
+            vector_store = load_vector_store(self.store_dir, **self.store_options)
+            self.manifest = load_manifest(self.store_dir) or {}
+            if vector_store is not None and not self.manifest:
+                logger.warning(f"Persisted index at {self.store_dir} has no manifest, rebuilding it")
+                vector_store = None
+
+        # The index needs the embedding model, and the query engine the LLM: the pipeline cannot serve without them
+        self.embed_model = embed_future.result()
+        self.llm = llm_future.result()
+        if self.embed_model is None or self.llm is None:
+            raise RuntimeError(f"Failed to load the embedding model or LLM: {self.startup['model_load_errors']}")
+        # Ensure LlamaIndex uses our embedding model (avoid default OpenAI dependency)
+        Settings.embed_model = self.embed_model
+        self.index = None
+        if vector_store is not None:
+            self.index = load_vector_index(self.store_dir, vector_store=vector_store)
+        if self.index is None:
+            self.index = build_vector_index([], **self.store_options)
+
+        # 5. Index added/changed files and drop deleted ones
+        self._refresh_lock = threading.Lock()
+        self._unpersisted = False
+        self.last_refresh_error = None
+        self.refresh()
+
+        # 6. Create query engine; it retrieves a wide candidate set that is narrowed to top_k per query
+        self.query_engine = create_query_engine(
+            self.index, self.llm, candidate_k=rerank_candidates, hybrid=hybrid_search
+        )
+        self.rerank_candidates = rerank_candidates
+        self.hybrid_search = hybrid_search
+        self.stream_synthesizer = create_stream_synthesizer(self.llm)
+        # Retrieved chunks are deduplicated and packed to leave room in the LLM's 2048-token window
+        self.context_token_budget = context_token_budget
+        self.dedup_threshold = dedup_threshold
+        self.extractive_threshold = extractive_threshold
+        self.extractive_nodes = extractive_nodes
+        self.extractive_counts = {"answered": 0, "fallback": 0}
+        self._extractive_lock = threading.Lock()
+
+        # 7. Initialize conversation memory, bounded per session and by idle time
+        self.session_store = session_store
+        if self.session_store is None:
+            self.session_store = SessionStore(
+                max_turns=history_max_turns,
+                ttl_seconds=session_ttl,
+                max_sessions=max_sessions,
+                path=session_store_path,
+                namespace=os.path.abspath(docs_folder),
+            )
+        self.query_condensation = query_condensation
+        self.condense_history_turns = condense_history_turns
+        self.condense_token_budget = condense_token_budget
+
+        self.metrics_file = metrics_file
+        self._metrics_written = 0.0
+        self.startup["ready_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"RAG Pipeline initialized successfully | imports {self.startup['import_seconds']}s | "
+            f"ready in {self.startup['ready_seconds']}s | reranker ready: {self.reranker_ready.is_set()}"
+        )
+
+    def _load_model(self, name, load_fn, *args, **kwargs):
+        """
+        Run load_fn and record how long it took under startup['model_load_seconds'][name].
+        A failure (an exception, or None from the initialize_* functions, which log their own errors)
+        is recorded under startup['model_load_errors'][name] and returns None.
+        """
+        started = time.perf_counter()
+        try:
+            model = load_fn(*args, **kwargs)
+            error = None if model is not None else "initialization failed, see the logs"
+        except Exception as e:
+            model, error = None, str(e)
+        if model is None:
+            self.startup["model_load_errors"][name] = error
+            logger.error(f"Failed to load {name}: {error}")
+            return None
+        self.startup["model_load_seconds"][name] = round(time.perf_counter() - started, 3)
+        logger.info(f"Loaded {name} in {self.startup['model_load_seconds'][name]}s")
+        return model
+
+    def _load_reranker(self, max_length, device, model, micro_batch_wait_ms):
+        if self._load_model("reranker", initialize_reranker, max_length=max_length, device=device, model=model) is None:
+            # Answers go on without reranking
+            self.reranker_status = "failed"
+            return
+        if micro_batch_wait_ms:
+            enable_rerank_batching(max_batch_size=self.rerank_batch_size, max_wait_ms=micro_batch_wait_ms)
+        self.reranker_status = "ready"
+        self.reranker_ready.set()
+
+    def enable_reranking(self):
+        """Start reranking with the already initialized (e.g. shared) reranker."""
+        self.use_rerank = True
+        self.reranker_status = "ready"
+        self.reranker_ready.set()
+
+    def rerank_enabled(self):
+        """Rerank only once the reranker has loaded (with lazy_models it may still be loading)."""
+        return self.use_rerank and self.reranker_ready.is_set()
+
+    @log_exceptions(reraise=True)
+    @log_time
+    def refresh(self):
+        """
+        Bring the index in line with docs_folder without a restart.
+        Only added, changed or deleted files are re-parsed, re-split and re-embedded.
+        Returns a dict with the number of added, updated, deleted and skipped files.
+        Raises if the refresh fails, e.g. when the index cannot be persisted; the error is kept in
+        last_refresh_error (see stats() and the API's /health) until a refresh succeeds.
+        """
+        try:
+            stats = self._refresh()
+        except Exception as e:
+            self.last_refresh_error = str(e)
+            raise
+        self.last_refresh_error = None
+        return stats
+
+    def _refresh(self):
+        with self._refresh_lock:
+            current = scan_corpus(self.docs_folder, self.manifest) or {}
+            added, changed, deleted, unchanged = diff_manifest(self.manifest, current)
+
+            # Remove chunks of changed and deleted files
+            stale_ids = [cid for filename in changed + deleted for cid in self.manifest[filename]["chunk_ids"]]
+            self.index.vector_store.delete_nodes(stale_ids)
+            # Their old versions' extracted PDF pages will not be read again
+            if self.pdf_page_cache_path:
+                current_hashes = {entry["hash"] for entry in current.values()}
+                drop_cached_pages(self.pdf_page_cache_path, {
+                    self.manifest[filename]["hash"] for filename in changed + deleted
+                } - current_hashes)
+
+            manifest = {
+                filename: {**current[filename], "chunk_ids": self.manifest[filename]["chunk_ids"]}
+                for filename in unchanged
+            }
+
+            # Stream new file versions through load -> split -> embed in bounded batches
+            to_index = added + changed
+            if to_index:
+                docs = iter_documents(
+                    self.docs_folder,
+                    filenames=to_index,
+                    workers=self.ingest_workers,
+                    pages_per_task=self.pdf_pages_per_task,
+                    pdf_backend=self.pdf_backend,
+                    page_cache_path=self.pdf_page_cache_path,
+                    file_hashes={filename: current[filename]["hash"] for filename in to_index},
+                )
+                chunks = iter_split_documents(
+                    docs, chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap, **self.chunking
+                )
+                chunk_ids = {}
+                inserted = index_streaming(
+                    self.index,
+                    chunks,
+                    batch_size=self.embed_batch_size,
+                    on_batch=lambda batch: assign_chunk_ids(batch, current, chunk_ids),
+                )
+                if inserted is None:
+                    # Roll back partially indexed files so they are retried on the next refresh
+                    self.index.vector_store.delete_nodes([cid for ids in chunk_ids.values() for cid in ids])
+                    to_index = []
+                for filename in to_index:
+                    manifest[filename] = {**current[filename], "chunk_ids": chunk_ids.get(filename, [])}
+
+            index_changed = bool(added or changed or deleted)
+            manifest_changed = manifest != self.manifest
+            self.manifest = manifest
+            if index_changed:
+                self.index_version += 1
+                if self.answer_cache is not None:
+                    self.answer_cache.set_index_version(self.index_version)
+            # A manifest that failed to persist is written by the next refresh, even if nothing changed since
+            self._unpersisted = self._unpersisted or manifest_changed
+            if self._unpersisted and self.store_dir:
+                self.index.vector_store.persist(self.store_dir, extra_json={MANIFEST_FILE: manifest})
+                self._unpersisted = False
+
+            stats = {"added": len(added), "updated": len(changed), "deleted": len(deleted), "skipped": len(unchanged)}
+            logger.info(f"Index refresh: {stats}")
+            if self.embedding_cache is not None and to_index:
+                self.embedding_cache.flush()
+                logger.info(f"Embedding cache: {self.embedding_cache.stats()}")
+            return stats
+
+    def _cached_answer(self, query, top_k):
+        """
+        Look query up in the answer cache.
+        Returns (settings, query_embedding, index_version, result), where result is None on a miss and
+        index_version is the cache's version before retrieval, checked again when the answer is cached.
+        query_embedding is only computed in semantic mode and is reused for retrieval on a miss.
+        """
+        settings = (self.embedding_model_name, self.llm_model_name, self.rerank_enabled(), top_k)
+        if self.answer_cache is None:
+            return settings, None, None, None
+        index_version = self.answer_cache.index_version
+
+        query_embedding = None
+        if self.answer_cache.semantic_threshold is not None and self.embed_model is not None:
+            query_embedding = self.embed_model.get_query_embedding(query)
+        result = self.answer_cache.get(query, settings, query_embedding=query_embedding)
+        if result is not None:
+            logger.info(f"Answer cache hit for query: {query}")
+        return settings, query_embedding, index_version, result
 
-        # 6. Create query engine
-        self.query_engine = create_query_engine(self.index, self.llm)
+    @property
+    def chat_history(self):
+        """The shared history, used when no session_id is given."""
+        return self.session_store.get(DEFAULT_SESSION)
 
-        # 7. Initialize conversation memory (optional)
-        self.chat_history = []  # simple memory as list of dicts
-        logger.info("RAG Pipeline initialized successfully.")
+    def _history(self, session_id=None):
+        """Return the turns of a session; session_id None is the shared history."""
+        return self.session_store.get(DEFAULT_SESSION if session_id is None else session_id)
+
+    def _remember(self, session_id, question, result, standalone_query):
+        """Add a turn to the history of session_id."""
+        turn = {"query": question, "answer": result["answer"], "citations": result["citations"]}
+        if standalone_query != question:
+            turn["standalone_query"] = standalone_query
+        self.session_store.append(DEFAULT_SESSION if session_id is None else session_id, turn)
+
+    def _standalone_query(self, question, session_id):
+        """
+        Condense a follow-up question and the recent turns of session_id into a standalone query.
+        Returns (retrieval_query, generation_query) (see condense_query). Questions without an explicit
+        session_id are independent and used as is.
+        """
+        if self.query_condensation is None or session_id is None:
+            return question, question
+        turns = self._history(session_id)
+        if not turns:
+            return question, question
+        with span("condense_query"):
+            standalone, generation_query = condense_query(
+                question,
+                turns,
+                llm=self.llm,
+                mode=self.query_condensation,
+                token_budget=self.condense_token_budget,
+                max_turns=self.condense_history_turns,
+            )
+        if standalone != question:
+            logger.info(f"Condensed follow-up question: {question!r} -> {standalone!r}")
+        return standalone, generation_query
+
+    def _record_answer(self, query, result, settings, query_embedding, index_version, session_id=None, question=None):
+        """
+        Cache a successful answer under its standalone query, unless the index changed since index_version,
+        and add it to the chat history as the question the user asked.
+        """
+        if self.answer_cache is not None and result["answer"] not in ERROR_ANSWERS:
+            self.answer_cache.put(query, settings, result, query_embedding=query_embedding, index_version=index_version)
+        self._remember(session_id, question or query, result, query)
+
+    def count_extractive(self, result):
+        """Count whether the extractive fast path answered, or generation was needed."""
+        if self.extractive_threshold is None or "mode" not in result:
+            return
+        with self._extractive_lock:
+            self.extractive_counts["answered" if result["mode"] == "extractive" else "fallback"] += 1
+
+    def _extractive_stats(self):
+        with self._extractive_lock:
+            answered, fallback = self.extractive_counts["answered"], self.extractive_counts["fallback"]
+        total = answered + fallback
+        return {
+            "threshold": self.extractive_threshold,
+            "answered": answered,
+            "fallback": fallback,
+            "fallback_rate": round(fallback / total, 4) if total else None,
+        }
+
+    def export_metrics(self):
+        """Write the Prometheus metrics to metrics_file, if set, at most once a second."""
+        now = time.monotonic()
+        if self.metrics_file and now - self._metrics_written >= 1.0:
+            self._metrics_written = now
+            write_metrics(self.metrics_file)
 
     @log_exceptions
-    def ask(self, query, top_k=5):
+    def ask(self, query, top_k=5, session_id=None, trace=False):
         """
         Ask a question using the RAG pipeline.
-        Returns answer + citations and updates chat history.
+        Returns answer + citations and updates the chat history of session_id (the shared history if None).
+        With query_condensation and a session_id, a follow-up question is first condensed with the session's
+        recent turns into a standalone query, returned as 'standalone_query' when it differs from the question.
+        With trace, the result also has a 'trace' of per-stage timing spans.
         """
         logger.info(f"Received query: {query}")
+        with trace_request() if trace else nullcontext() as request_trace:
+            result = self._answer(query, top_k, session_id)
+        if request_trace is not None and result is not None:
+            result = {**result, "trace": request_trace.to_dict()}
+        self.export_metrics()
+        return result
+
+    def _answer(self, question, top_k, session_id):
+        """Answer from the answer cache, or retrieve and generate."""
+        query, generation_query = self._standalone_query(question, session_id)
+        # Serve repeated (or, in semantic mode, near-identical) questions from the answer cache
+        with span("answer_cache"):
+            settings, query_embedding, index_version, result = self._cached_answer(query, top_k)
+        if result is not None:
+            self._remember(session_id, question, result, query)
+            return self._with_standalone_query(result, question, query)
+
         result = ask_question(
             self.query_engine,
-            query,
-            use_rerank=self.use_rerank,
-            top_k=top_k
+            generation_query,
+            retrieval_query=query,
+            use_rerank=self.rerank_enabled(),
+            top_k=top_k,
+            rerank_batch_size=self.rerank_batch_size,
+            context_budget=self.context_token_budget,
+            dedup_threshold=self.dedup_threshold,
+            extractive_threshold=self.extractive_threshold,
+            extractive_nodes=self.extractive_nodes,
+            embed_model=self.embed_model,
+            query_embedding=query_embedding,
+        )
+        self.count_extractive(result)
+        self._record_answer(
+            query, result, settings, query_embedding, index_version, session_id=session_id, question=question
         )
+        return self._with_standalone_query(result, question, query)
 
-        # Update chat history
-        self.chat_history.append({"query": query, "answer": result["answer"], "citations": result["citations"]})
+    @staticmethod
+    def _with_standalone_query(result, question, query):
+        """Report the condensed query that was actually retrieved with, if it differs from the question."""
+        return result if query == question else {**result, "standalone_query": query}
 
-        return result
+    @log_exceptions
+    def ask_stream(self, query, top_k=5, session_id=None, trace=False):
+        """
+        Ask a question and stream the answer.
+        Returns {'citations': list[str], 'spans': list[dict], 'mode': str, 'tokens': iterator of str};
+        citations are known as soon as retrieval is done, and the chat history of session_id is updated once
+        the token iterator is exhausted.
+        With trace, the result also has a 'trace' of the retrieval-stage spans.
+        """
+        logger.info(f"Received streaming query: {query}")
+        started = time.perf_counter()
+        question = query
+
+        with trace_request() if trace else nullcontext() as request_trace:
+            query, generation_query = self._standalone_query(question, session_id)
+            with span("answer_cache"):
+                settings, query_embedding, index_version, cached = self._cached_answer(query, top_k)
+            if cached is not None:
+                citations, spans, tokens = cached["citations"], cached.get("spans", []), iter([cached["answer"]])
+                mode = cached.get("mode")
+            else:
+                result = ask_question_stream(
+                    self.query_engine,
+                    self.stream_synthesizer,
+                    generation_query,
+                    retrieval_query=query,
+                    use_rerank=self.rerank_enabled(),
+                    top_k=top_k,
+                    rerank_batch_size=self.rerank_batch_size,
+                    context_budget=self.context_token_budget,
+                    dedup_threshold=self.dedup_threshold,
+                    extractive_threshold=self.extractive_threshold,
+                    extractive_nodes=self.extractive_nodes,
+                    embed_model=self.embed_model,
+                    query_embedding=query_embedding,
+                )
+                self.count_extractive(result)
+                citations, spans, tokens = result["citations"], result.get("spans", []), result["tokens"]
+                mode = result.get("mode")
+
+        def stream():
+            parts = []
+            first_token_at = None
+            for token in tokens:
+                if not parts:
+                    first_token_at = time.perf_counter()
+                    TIME_TO_FIRST_TOKEN.observe(first_token_at - started)
+                    logger.info(f"Time to first token: {first_token_at - started:.3f} seconds")
+                parts.append(token)
+                yield token
+            logger.info(f"Streamed answer completed in {time.perf_counter() - started:.2f} seconds")
+            if cached is None and first_token_at is not None and mode == "generated":
+                record_generation(len(parts), time.perf_counter() - first_token_at)
+            self.export_metrics()
+            answer = {"answer": "".join(parts), "citations": citations, "spans": spans, "mode": mode}
+            if cached is None:
+                self._record_answer(
+                    query, answer, settings, query_embedding, index_version, session_id=session_id, question=question
+                )
+            else:
+                self._remember(session_id, question, answer, query)
+
+        response = self._with_standalone_query(
+            {"citations": citations, "spans": spans, "mode": mode, "tokens": stream()}, question, query
+        )
+        if request_trace is not None:
+            response["trace"] = request_trace.to_dict()
+        return response
+
+    def ask_batch(self, questions, top_k=5, concurrency=2, batch_size=64):
+        """
+        Answer many questions for offline evaluation or bulk workloads (see batch_qa.answer_batch).
+        questions are strings or records {"id", "question", ...}; yields result dicts as answers complete,
+        with per-question timings_ms. Questions are embedded, searched and reranked batch_size at a time,
+        and at most concurrency answers are generated at once. Caches and chat histories are not used.
+        """
+        records = (
+            {"id": i, "question": question} if isinstance(question, str) else question
+            for i, question in enumerate(questions)
+        )
+        return answer_batch(self, records, top_k=top_k, concurrency=concurrency, batch_size=batch_size)
+
+    def memory_bytes(self):
+        """Approximate memory held by this pipeline's vector index."""
+        vector_store = getattr(self.index, "vector_store", None)
+        return vector_store.memory_bytes() if vector_store is not None else 0
+
+    @log_exceptions
+    def stats(self):
+        """
+        Returns cache counters, micro-batching stats, startup timings, extractive fast path outcomes and
+        session store size.
+        """
+        return {
+            "index_version": self.index_version,
+            "last_refresh_error": self.last_refresh_error,
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache is not None else None,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "batching": batching_stats(),
+            "startup": {
+                **self.startup, "reranker_ready": self.reranker_ready.is_set(), "reranker": self.reranker_status
+            },
+            "extractive": self._extractive_stats(),
+            "sessions": self.session_store.stats(),
+        }
+
+    @log_exceptions
+    def get_history(self, session_id=None):
+        """
+        Returns the conversation history of session_id (the shared history if None).
+        """
+        return self._history(session_id)
 
     @log_exceptions
-    def get_history(self):
+    def clear_history(self, session_id=None):
         """
-        Returns the conversation history.
+        Clears the conversation history of session_id (the shared history if None).
         """
-        return self.chat_history
+        self.session_store.clear(DEFAULT_SESSION if session_id is None else session_id)
@@ -3,11 +3,17 @@ import os
 import functools
 import time
 import traceback
+from concurrent.futures import Future
+from metrics import FUNCTION_ERRORS, FUNCTION_SECONDS
 
 def setup_logger(log_file="logs/app.log"):
     """
     Setup a logger that logs messages to both console and file.
+    If RAG_LOG_DIR is set, the log file is written there instead of its own directory.
     """
+    log_dir = os.environ.get("RAG_LOG_DIR")
+    if log_dir:
+        log_file = os.path.join(log_dir, os.path.basename(log_file))
     os.makedirs(os.path.dirname(log_file), exist_ok=True)
     logging.basicConfig(
         level=logging.INFO,
@@ -39,6 +45,7 @@ def log_exceptions(func=None, *, reraise=False):
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            FUNCTION_ERRORS.inc(function=func.__name__)
             logger.error(f"Exception in {func.__name__}: {e}")
             logger.error(traceback.format_exc())
             if reraise:
@@ -49,12 +56,27 @@ def log_exceptions(func=None, *, reraise=False):
 def log_time(func):
     """
     Decorator to log execution time of a function.
+    Durations are measured on the monotonic clock and recorded in the rag_function_seconds histogram.
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.time()
+        start = time.perf_counter()
         result = func(*args, **kwargs)
-        end = time.time()
-        logger.info(f"{func.__name__} executed in {end - start:.2f} seconds")
+        elapsed = time.perf_counter() - start
+        FUNCTION_SECONDS.observe(elapsed, function=func.__name__)
+        logger.info(f"{func.__name__} executed in {elapsed:.2f} seconds")
         return result
     return wrapper
+
+
+def run_now(fn, *args, **kwargs):
+    """
+    Run fn in this thread and return its outcome as a completed Future,
+    a drop-in for executor.submit when work should not go to a background thread.
+    """
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
@@ -0,0 +1,567 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from array import array
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode, MetadataMode, NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from ann_index import INDEX_TYPES, FaissSearch
+from chunk_store import HIDDEN_METADATA_KEYS, TOKEN_COUNT_KEY, ChunkColumns
+from context_packing import count_tokens
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from quantization import QUANTIZATION_TYPES, QuantizedVectors
+from utils import logger, log_exceptions, log_time
+import warnings
+warnings.filterwarnings("ignore", message="Core Pydantic V1 functionality isn't compatible with Python 3.14 or greater")
+
+# Files written for a persisted store
+EMBEDDINGS_FILE = "embeddings.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+NODES_FILE = "nodes.json"
+
+# Queries scored per matrix product in query_batch; the score block is (num chunks x QUERY_BLOCK) float32
+QUERY_BLOCK = 32
+
+# Initial row capacity of the in-memory buffer that added embeddings are appended to
+MIN_APPEND_CAPACITY = 1024
+
+
+def _normalize(vectors):
+    """L2-normalize rows so that a dot product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class AppendableMatrix:
+    """
+    Float32 rows made of a read-only base (e.g. the memory-mapped persisted matrix) followed by the rows
+    appended since, held in an in-memory buffer that doubles its capacity when full. Appending copies only
+    the new rows: the base is never copied, and there is no list of batches to merge later.
+    """
+
+    def __init__(self, base=None):
+        self.base = base if base is not None and len(base) else None
+        self._tail = None
+        self._tail_rows = 0
+
+    def __len__(self):
+        return (len(self.base) if self.base is not None else 0) + self._tail_rows
+
+    @property
+    def dim(self):
+        if self.base is not None:
+            return self.base.shape[1]
+        return self._tail.shape[1] if self._tail is not None else 0
+
+    @property
+    def nbytes(self):
+        """Bytes of the base (memory-mapped or not) and of the appended rows."""
+        return (self.base.nbytes if self.base is not None else 0) + (self._tail.nbytes if self._tail is not None else 0)
+
+    @property
+    def _base_rows(self):
+        return len(self.base) if self.base is not None else 0
+
+    @property
+    def tail(self):
+        return self._tail[:self._tail_rows] if self._tail is not None else np.zeros((0, self.dim), dtype=np.float32)
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=np.float32)
+        needed = self._tail_rows + len(rows)
+        if self._tail is None or needed > len(self._tail):
+            capacity = max(needed, 2 * (len(self._tail) if self._tail is not None else 0), MIN_APPEND_CAPACITY)
+            grown = np.empty((capacity, rows.shape[1]), dtype=np.float32)
+            if self._tail is not None:
+                grown[:self._tail_rows] = self._tail[:self._tail_rows]
+            self._tail = grown
+        self._tail[self._tail_rows:needed] = rows
+        self._tail_rows = needed
+
+    def rows(self, start=0):
+        """Rows from start to the end; only a range spanning the base and the appended rows is copied."""
+        base_rows = self._base_rows
+        if start >= base_rows:
+            return self.tail[start - base_rows:]
+        if not self._tail_rows:
+            return self.base[start:]
+        return np.vstack([self.base[start:], self.tail])
+
+    def take(self, positions):
+        """Rows at the given positions, in that order."""
+        positions = np.asarray(positions, dtype=np.int64)
+        base_rows = self._base_rows
+        if not self._tail_rows:
+            return np.asarray(self.base[positions], dtype=np.float32)
+        out = np.empty((len(positions), self.dim), dtype=np.float32)
+        in_base = positions < base_rows
+        if base_rows:
+            out[in_base] = self.base[positions[in_base]]
+        out[~in_base] = self._tail[positions[~in_base] - base_rows]
+        return out
+
+    def dot(self, other):
+        """self @ other for a query vector or a (dim x n) matrix of query columns."""
+        parts = []
+        if self.base is not None:
+            parts.append(np.asarray(self.base) @ other)
+        if self._tail_rows:
+            parts.append(self.tail @ other)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def save(self, path):
+        """Write the rows as one .npy file, copying the base and the appended rows into it in turn."""
+        if not len(self):
+            np.save(path, np.zeros((0, 0), dtype=np.float32))
+            return
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(self), self.dim))
+        base_rows = self._base_rows
+        if base_rows:
+            out[:base_rows] = self.base
+        out[base_rows:] = self.tail
+        out.flush()
+        del out
+
+
+class ArrayVectorStore(BasePydanticVectorStore):
+    """
+    Vector store backed by one float32 embedding matrix.
+    Chunk text is kept in a single utf-8 buffer addressed by offsets, so a persisted
+    store can be memory-mapped back in without re-embedding the corpus. Per-chunk metadata is
+    columnar (see ChunkColumns), and TextNodes are only built for query results.
+    Added embeddings and text are appended to in-memory buffers after the (memory-mapped) persisted
+    ones (see AppendableMatrix), so ingestion never holds staged batches or copies the persisted arrays.
+    index_type "exact" searches the matrix directly; "flat", "hnsw" and "ivfpq" search a FAISS
+    index over it that is kept in step with later additions. The index is (re)built in a background
+    thread when first needed, after deletions and when IVF-PQ outgrows its training; queries scan the
+    matrix exactly until a rebuilt index is ready.
+    With lexical=True a BM25 inverted index is maintained alongside, and hybrid-mode queries
+    fuse its ranking with the dense one by reciprocal rank fusion.
+    With quantization "float16", "int8" or "binary", exact search scans compressed codes held in
+    memory, then re-scores the best rescore_factor * top_k candidates against the float32 matrix,
+    which stays memory-mapped on disk once the store is persisted.
+    """
+
+    stores_text: bool = True
+
+    _embeddings = PrivateAttr()
+    _text_buffer = PrivateAttr()
+    _offsets = PrivateAttr()
+    _chunks = PrivateAttr()
+    _lock = PrivateAttr()
+    _text_tail = PrivateAttr()
+    _index_type = PrivateAttr()
+    _search_params = PrivateAttr()
+    _ann = PrivateAttr()
+    _ann_generation = PrivateAttr()
+    _ann_builder = PrivateAttr()
+    _lexical = PrivateAttr()
+    _quantization = PrivateAttr()
+    _quantized = PrivateAttr()
+    _rescore_factor = PrivateAttr()
+
+    def __init__(self, embeddings=None, text_buffer=None, offsets=None, chunks=None,
+                 index_type="exact", search_params=None, lexical=False,
+                 quantization="none", rescore_factor=4):
+        super().__init__()
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type: {index_type}. Expected one of {list(INDEX_TYPES)}")
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(f"Unknown quantization: {quantization}. Expected one of {list(QUANTIZATION_TYPES)}")
+        if quantization != "none" and index_type != "exact":
+            logger.warning(f"Quantization applies to exact search only; ignored with index_type={index_type}")
+            quantization = "none"
+        self._quantization = quantization
+        self._quantized = None
+        self._rescore_factor = rescore_factor
+        self._index_type = index_type
+        self._search_params = search_params or {}
+        self._ann = None
+        self._ann_generation = 0  # bumped when deletions shift positions, invalidating indexes being built
+        self._ann_builder = None
+        self._lexical = BM25Index() if lexical else None
+        self._embeddings = AppendableMatrix(embeddings)
+        # Text of the base (memory-mapped once persisted) followed by text added since
+        self._text_buffer = text_buffer if text_buffer is not None else np.zeros(0, dtype=np.uint8)
+        self._text_tail = bytearray()
+        self._offsets = array("q", np.asarray(offsets if offsets is not None else [0], dtype=np.int64).tobytes())
+        self._chunks = chunks if chunks is not None else ChunkColumns()
+        self._lock = threading.RLock()
+
+    @property
+    def client(self):
+        return None
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __bool__(self):
+        # StorageContext.from_defaults tests "if vector_store:" and would replace an empty store
+        return True
+
+    def memory_bytes(self):
+        """Approximate bytes held by the store's arrays and indexes, memory-mapped arrays included."""
+        with self._lock:
+            total = self._text_buffer.nbytes + len(self._text_tail) + self._chunks.nbytes
+            total += self._offsets.itemsize * len(self._offsets) + self._embeddings.nbytes
+            for index in (self._ann, self._lexical, self._quantized):
+                if index is not None:
+                    total += index.nbytes
+            return total
+
+    def _get_bytes(self, position):
+        start, end = self._offsets[position], self._offsets[position + 1]
+        base_size = len(self._text_buffer)
+        if start >= base_size:
+            return bytes(self._text_tail[start - base_size:end - base_size])
+        return bytes(self._text_buffer[start:end])
+
+    def _get_text(self, position):
+        return self._get_bytes(position).decode("utf-8")
+
+    def _build_node(self, position):
+        relationships = {}
+        ref_doc_id = self._chunks.ref_doc_id(position)
+        if ref_doc_id:
+            relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+        metadata = self._chunks.metadata(position)
+        metadata[TOKEN_COUNT_KEY] = self._chunks.token_count(position)
+        return TextNode(
+            id_=self._chunks.node_ids[position],
+            text=self._get_text(position),
+            metadata=metadata,
+            excluded_embed_metadata_keys=list(HIDDEN_METADATA_KEYS),
+            excluded_llm_metadata_keys=list(HIDDEN_METADATA_KEYS),
+            relationships=relationships,
+        )
+
+    def add(self, nodes: list[BaseNode], **add_kwargs) -> list[str]:
+        """Append embedded nodes to the store."""
+        if not nodes:
+            return []
+
+        vectors = _normalize([node.get_embedding() for node in nodes])
+        contents = [node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes]
+        encoded = [content.encode("utf-8") for content in contents]
+
+        with self._lock:
+            if self._lexical is not None:
+                self._lexical.add(contents)
+            self._embeddings.append(vectors)
+            end = self._offsets[-1]
+            for text in encoded:
+                self._text_tail += text
+                end += len(text)
+                self._offsets.append(end)
+            for node, content in zip(nodes, contents):
+                self._chunks.append(node.node_id, node.ref_doc_id, node.metadata, count_tokens(content))
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs) -> None:
+        """Remove every node that belongs to the given reference document."""
+        with self._lock:
+            drop = self._chunks.ref_doc_positions(ref_doc_id)
+            if len(drop):
+                self._keep_positions(np.setdiff1d(np.arange(len(self._chunks)), drop))
+
+    def delete_nodes(self, node_ids=None, filters=None, **delete_kwargs) -> None:
+        """Remove the nodes with the given ids."""
+        if not node_ids:
+            return
+        drop = set(node_ids)
+        with self._lock:
+            keep = [i for i, node_id in enumerate(self._chunks.node_ids) if node_id not in drop]
+            self._keep_positions(keep)
+
+    def _keep_positions(self, keep):
+        if len(keep) == len(self._chunks):
+            return
+        texts = [self._get_bytes(i) for i in keep]
+        lengths = np.cumsum([len(text) for text in texts], dtype=np.int64)
+        self._embeddings = AppendableMatrix(self._embeddings.take(keep) if len(keep) else None)
+        self._text_buffer = np.frombuffer(b"".join(texts), dtype=np.uint8).copy()
+        self._text_tail = bytearray()
+        self._offsets = array("q", [0]) + array("q", lengths.tobytes())
+        self._chunks.keep(keep)
+        # Positions shifted: the next query starts a rebuild in the background
+        self._ann = None
+        self._ann_generation += 1
+        if self._lexical is not None:
+            self._lexical.keep(keep)
+        if self._quantized is not None:
+            self._quantized.keep(keep)
+
+    def _build_ann(self):
+        """
+        Build a FAISS index over the current rows without holding the lock while FAISS trains, so queries
+        keep being served, and install it. Returns False if rows were deleted meanwhile and it was discarded.
+        """
+        with self._lock:
+            generation = self._ann_generation
+            rows = self._embeddings.rows() if len(self._embeddings) else None
+        if rows is None:
+            return True
+        ann = FaissSearch(self._index_type, rows.shape[1], self._search_params)
+        ann.build(rows)
+        with self._lock:
+            if generation != self._ann_generation:
+                return False
+            self._ann = ann
+            return True
+
+    def _build_ann_in_background(self):
+        """Start building the FAISS index in a thread, unless a build is already running."""
+        if self._ann_builder is not None and self._ann_builder.is_alive():
+            return
+
+        def build():
+            try:
+                while not self._build_ann():
+                    pass
+            except Exception as e:
+                logger.error(f"Failed to build FAISS {self._index_type} index: {e}", exc_info=True)
+
+        self._ann_builder = threading.Thread(target=build, name="ann-build", daemon=True)
+        self._ann_builder.start()
+
+    def _current_ann(self):
+        """
+        The FAISS index with rows appended since it was built added, or None while it is being built.
+        An IVF-PQ index that needs retraining keeps serving while its replacement is built.
+        """
+        if self._ann is None:
+            self._build_ann_in_background()
+            return None
+        if self._ann.needs_rebuild(len(self._embeddings)):
+            self._build_ann_in_background()
+        if len(self._ann) < len(self._embeddings):
+            self._ann.add(self._embeddings.rows(len(self._ann)))
+        return self._ann
+
+    def _ensure_quantized(self):
+        """Quantize the matrix, or rows appended since it was last quantized."""
+        if self._quantized is None:
+            self._quantized = QuantizedVectors(self._quantization, self._embeddings.dim)
+        if len(self._quantized) < len(self._embeddings):
+            self._quantized.append(self._embeddings.rows(len(self._quantized)))
+
+    def _exact_search(self, query_vector, top_k):
+        if self._quantization != "none":
+            self._ensure_quantized()
+            if not self._rescore_factor:
+                return self._quantized.search(query_vector, top_k)
+            # Re-score the quantized shortlist with full-precision rows (read from the mmap)
+            _, candidates = self._quantized.search(query_vector, top_k * self._rescore_factor)
+            candidates = np.sort(candidates)
+            scores = self._embeddings.take(candidates) @ query_vector
+            order = np.argsort(-scores)[:top_k]
+            return scores[order], candidates[order]
+
+        scores = self._embeddings.dot(query_vector)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return scores[top], top
+
+    def _dense_search(self, query_vector, top_k):
+        ann = self._current_ann() if self._index_type != "exact" else None
+        if ann is None:
+            return self._exact_search(query_vector, top_k)
+        return ann.search(query_vector, top_k)
+
+    def _dense_search_many(self, query_vectors, top_k):
+        """
+        (scores, positions) of the top_k rows for each query vector. Exact float32 search scores a
+        block of QUERY_BLOCK queries with one matrix product; other modes search query by query.
+        """
+        if self._index_type != "exact" or self._quantization != "none":
+            return [self._dense_search(query_vector, top_k) for query_vector in query_vectors]
+        results = []
+        for start in range(0, len(query_vectors), QUERY_BLOCK):
+            scores = self._embeddings.dot(query_vectors[start:start + QUERY_BLOCK].T)
+            top = np.argpartition(-scores, top_k - 1, axis=0)[:top_k]
+            for column in range(scores.shape[1]):
+                column_scores = scores[top[:, column], column]
+                order = np.argsort(-column_scores)
+                results.append((column_scores[order], top[order, column]))
+        return results
+
+    def _query_result(self, query, scores, top, top_k):
+        """Fuse dense results with BM25 for hybrid queries, and build the result nodes."""
+        if query.mode == VectorStoreQueryMode.HYBRID and self._lexical is not None and query.query_str:
+            sparse_top_k = query.sparse_top_k or top_k
+            _, lexical_top = self._lexical.search(query.query_str, sparse_top_k)
+            hybrid_top_k = getattr(query, "hybrid_top_k", None) or top_k
+            scores, top = reciprocal_rank_fusion([top, lexical_top], top_k=hybrid_top_k)
+
+        return VectorStoreQueryResult(
+            nodes=[self._build_node(int(i)) for i in top],
+            similarities=[float(score) for score in scores],
+            ids=[self._chunks.node_ids[int(i)] for i in top],
+        )
+
+    def query(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+        """Cosine-similarity search, exact or through the configured FAISS index."""
+        with self._lock:
+            if len(self._chunks) == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+            top_k = min(query.similarity_top_k, len(self._chunks))
+            scores, top = self._dense_search(_normalize(query.query_embedding), top_k)
+            return self._query_result(query, scores, top, top_k)
+
+    def query_batch(self, queries):
+        """
+        Run many VectorStoreQuery objects at once; returns their results in order.
+        Dense scores for all queries come from blocked matrix products instead of one scan per query.
+        """
+        if not queries:
+            return []
+        with self._lock:
+            if len(self._chunks) == 0:
+                return [VectorStoreQueryResult(nodes=[], similarities=[], ids=[]) for _ in queries]
+
+            top_k = min(max(query.similarity_top_k for query in queries), len(self._chunks))
+            query_vectors = _normalize([query.query_embedding for query in queries])
+            results = []
+            for query, (scores, top) in zip(queries, self._dense_search_many(query_vectors, top_k)):
+                query_top_k = min(query.similarity_top_k, top_k)
+                results.append(self._query_result(query, scores[:query_top_k], top[:query_top_k], query_top_k))
+            return results
+
+    def persist(self, persist_path: str, fs=None, extra_json=None) -> None:
+        """
+        Write the store to a directory, along with any extra_json {filename: object} files.
+        Files are written to a temporary directory first so a crash never leaves a half-written store.
+        """
+        tmp_path = f"{persist_path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        if self._index_type != "exact" and self._ann is None:
+            self._build_ann()  # saved with the store, so it is not rebuilt after loading
+
+        with self._lock:
+            self._embeddings.save(os.path.join(tmp_path, EMBEDDINGS_FILE))
+            np.save(os.path.join(tmp_path, OFFSETS_FILE), np.frombuffer(self._offsets, dtype=np.int64))
+            with open(os.path.join(tmp_path, TEXTS_FILE), "wb") as handle:
+                handle.write(memoryview(np.ascontiguousarray(self._text_buffer)))
+                handle.write(self._text_tail)
+            self._chunks.save(tmp_path, NODES_FILE)
+            if self._index_type != "exact" and self._ann is not None:
+                self._current_ann().save(tmp_path)
+            if self._lexical is not None:
+                self._lexical.save(tmp_path)
+            if self._quantization != "none" and len(self._chunks):
+                self._ensure_quantized()
+                self._quantized.save(tmp_path)
+        for filename, payload in (extra_json or {}).items():
+            with open(os.path.join(tmp_path, filename), "w", encoding="utf-8") as handle:
+                json.dump(payload, handle)
+
+        with self._lock:
+            shutil.rmtree(persist_path, ignore_errors=True)
+            os.replace(tmp_path, persist_path)
+            # Serve full-precision vectors and text from the persisted files rather than private memory
+            if len(self._chunks):
+                self._embeddings = AppendableMatrix(np.load(os.path.join(persist_path, EMBEDDINGS_FILE), mmap_mode="r"))
+                if self._offsets[-1]:
+                    self._text_buffer = np.memmap(os.path.join(persist_path, TEXTS_FILE), dtype=np.uint8, mode="r")
+                    self._text_tail = bytearray()
+        logger.info(f"Persisted {len(self)} chunks to {persist_path}")
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, mmap=True, index_type="exact", search_params=None, lexical=False,
+                         quantization="none", rescore_factor=4):
+        """
+        Load a persisted store, memory-mapping the embedding matrix and text buffer.
+        A saved FAISS index is reused when it matches index_type and search_params, a
+        missing BM25 index is rebuilt from the stored chunk text when lexical is set, and
+        saved quantized codes are loaded into memory when they match quantization.
+        """
+        mmap_mode = "r" if mmap else None
+        embeddings = np.load(os.path.join(persist_dir, EMBEDDINGS_FILE), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(persist_dir, OFFSETS_FILE))
+        texts_path = os.path.join(persist_dir, TEXTS_FILE)
+        if mmap and os.path.getsize(texts_path) > 0:
+            text_buffer = np.memmap(texts_path, dtype=np.uint8, mode="r")
+        else:
+            text_buffer = np.fromfile(texts_path, dtype=np.uint8)
+
+        store = cls(
+            embeddings=embeddings,
+            text_buffer=text_buffer,
+            offsets=offsets,
+            index_type=index_type,
+            search_params=search_params,
+            quantization=quantization,
+            rescore_factor=rescore_factor,
+        )
+        store._chunks = ChunkColumns.load(persist_dir, NODES_FILE)
+        if store._quantization != "none" and embeddings.ndim == 2:
+            quantized = QuantizedVectors.load(persist_dir, store._quantization, embeddings.shape[1])
+            if quantized is not None and len(quantized) == len(store):
+                store._quantized = quantized
+        if index_type != "exact":
+            store._ann = FaissSearch.load(persist_dir, index_type, search_params, expected_size=len(store))
+        if lexical:
+            store._lexical = BM25Index.load(persist_dir, mmap=mmap)
+            if store._lexical is None or len(store._lexical) != len(store):
+                logger.info(f"Building BM25 index for {len(store)} persisted chunks")
+                store._lexical = BM25Index()
+                store._lexical.add(store._get_text(i) for i in range(len(store)))
+        return store
+
+
+@log_exceptions
+def index_store_path(persist_dir, docs_folder, embedding_model, chunk_size, chunk_overlap, chunker="recursive",
+                     chunk_tokens=None, chunk_overlap_tokens=None):
+    """
+    Return the directory of the persisted index for this corpus folder, model and chunking setup.
+    Which files are indexed is tracked by the manifest inside it, not by the key.
+    A short description of the key is written next to it for inspection.
+    """
+    key_fields = {
+        "docs_folder": os.path.abspath(docs_folder),
+        "embedding_model": embedding_model,
+        "chunker": chunker,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunk_tokens": chunk_tokens,
+        "chunk_overlap_tokens": chunk_overlap_tokens,
+    }
+    key = hashlib.sha1(json.dumps(key_fields, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    store_dir = os.path.join(persist_dir, key)
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, f"{key}.json"), "w", encoding="utf-8") as handle:
+        json.dump(key_fields, handle, indent=2)
+    return store_dir
+
+
+@log_exceptions
+@log_time
+def load_vector_store(persist_dir, **store_options):
+    """
+    Load a persisted ArrayVectorStore; store_options are passed to ArrayVectorStore.from_persist_dir.
+    Returns None when no store exists at persist_dir.
+    """
+    if not os.path.exists(os.path.join(persist_dir, NODES_FILE)):
+        logger.info(f"No persisted vector store found at {persist_dir}")
+        return None
+
+    try:
+        store = ArrayVectorStore.from_persist_dir(persist_dir, **store_options)
+        logger.info(f"Loaded persisted vector store with {len(store)} chunks from {persist_dir}")
+        return store
+    except Exception as e:
+        logger.error(f"Failed to load persisted vector store from {persist_dir}: {e}", exc_info=True)
+        return None
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The modules set up their log files on import: keep them out of the working tree
+os.environ.setdefault("RAG_LOG_DIR", tempfile.mkdtemp(prefix="rag-test-logs-"))
+
+# The pipeline modules import each other by their flat names, as in run_app.py
+BASE_DIR = Path(__file__).resolve().parent.parent
+SRC_DIR = BASE_DIR / "src"
+for path in (SRC_DIR, BASE_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def offline_models():
+    """
+    The benchmark's deterministic stand-ins for the embedder, LLM and reranker, with the first two set
+    as the LlamaIndex defaults. Returns {"embeddings", "embed_model", "llm", "reranker"}.
+    """
+    from llama_index.core import Settings
+    from llama_index.embeddings.langchain import LangchainEmbedding
+    from benchmarks.pipeline import EchoLLM, HashingEmbeddings, OverlapReranker
+
+    embeddings = HashingEmbeddings()
+    Settings.embed_model = LangchainEmbedding(embeddings, embed_batch_size=32)
+    Settings.llm = EchoLLM()
+    return {"embeddings": embeddings, "embed_model": Settings.embed_model, "llm": Settings.llm,
+            "reranker": OverlapReranker()}
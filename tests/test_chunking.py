@@ -0,0 +1,110 @@
+import pytest
+
+from chunk_store import END_CHAR_KEY, SECTION_KEY, START_CHAR_KEY
+from chunking import chunk_document, chunk_spans, sentence_spans, split_sections
+
+MARKDOWN = """Intro paragraph before any heading.
+
+# Leave
+
+## Sick leave
+
+Employees get ten days of sick leave per year. Unused days do not carry over.
+
+```bash
+# not a heading, a shell comment
+echo "days"
+```
+
+## Annual leave
+
+Annual leave accrues monthly. Requests go to your manager.
+"""
+
+RST = """Leave
+=====
+
+Sick leave
+----------
+
+Employees get ten days of sick leave per year.
+"""
+
+HTML = "<h1>Leave</h1><p>Employees get ten days of sick leave.</p><h2>Annual <b>leave</b></h2><p>It accrues.</p>"
+
+
+def _titles(text, style):
+    return [title for _, _, title in split_sections(text, style)]
+
+
+def test_markdown_sections_are_heading_paths():
+    assert _titles(MARKDOWN, "markdown") == [None, "Leave > Sick leave", "Leave > Annual leave"]
+
+
+def test_markdown_headings_inside_code_fences_are_ignored():
+    text = "# Setup\n\n~~~~\n## Not a section\n~~~\nstill code\n~~~~\n\nDone.\n"
+    assert _titles(text, "markdown") == ["Setup"]
+
+
+def test_unclosed_code_fence_runs_to_the_end():
+    assert _titles("# Setup\n\n```\n# comment\n", "markdown") == ["Setup"]
+
+
+def test_rst_and_html_sections():
+    assert _titles(RST, "rst") == ["Leave > Sick leave"]
+    assert _titles(HTML, "html") == ["Leave", "Leave > Annual leave"]
+
+
+def test_sections_cover_the_whole_text():
+    sections = split_sections(MARKDOWN, "markdown")
+    assert sections[0][0] == 0 and sections[-1][1] == len(MARKDOWN)
+    assert all(previous[1] == current[0] for previous, current in zip(sections, sections[1:]))
+
+
+def test_sentence_spans_are_trimmed():
+    text = "  First sentence. Second one!\n\n- a list item\n"
+    assert [text[start:end] for start, end in sentence_spans(text)] == [
+        "First sentence.", "Second one!", "- a list item"
+    ]
+
+
+@pytest.mark.parametrize("source, text", [
+    ("policy.md", MARKDOWN),
+    ("policy.rst", RST),
+    ("policy.html", HTML),
+    ("policy.txt", MARKDOWN),
+])
+@pytest.mark.parametrize("chunk_tokens, overlap_tokens", [(8, 0), (16, 8), (256, 0)])
+def test_chunk_offsets_round_trip(source, text, chunk_tokens, overlap_tokens):
+    chunks = chunk_document(text, {"source": source, "page": 1}, chunk_tokens, overlap_tokens)
+    assert chunks
+    for chunk_text, metadata in chunks:
+        assert text[metadata[START_CHAR_KEY]:metadata[END_CHAR_KEY]] == chunk_text
+        assert chunk_text == chunk_text.strip()
+        assert metadata["source"] == source and metadata["page"] == 1
+
+
+def test_chunks_stay_within_their_section():
+    sections = split_sections(MARKDOWN, "markdown")
+    for start, end, title in chunk_spans(MARKDOWN, chunk_tokens=8, style="markdown"):
+        assert any(s_start <= start and end <= s_end and s_title == title for s_start, s_end, s_title in sections)
+
+
+def test_chunk_metadata_records_the_section():
+    chunks = chunk_document(MARKDOWN, {"source": "policy.md"}, chunk_tokens=256)
+    assert [metadata.get(SECTION_KEY) for _, metadata in chunks] == [None, "Leave > Sick leave", "Leave > Annual leave"]
+    assert "# not a heading" in chunks[1][0]
+
+
+def test_overlap_repeats_the_previous_sentences():
+    text = " ".join(f"Sentence number {i} is here." for i in range(20))
+    spans = chunk_spans(text, chunk_tokens=24, overlap_tokens=8)
+    assert len(spans) > 1
+    assert all(current[0] < previous[1] for previous, current in zip(spans, spans[1:]))
+
+
+def test_over_long_sentence_is_cut_at_word_boundaries():
+    text = " ".join(["word"] * 200)
+    spans = chunk_spans(text, chunk_tokens=16)
+    assert len(spans) > 1
+    assert all(text[start:end].split() == ["word"] * len(text[start:end].split()) for start, end, _ in spans)
@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from query_engine import ERROR_ANSWERS
+from rag_pipeline import RAGPipeline
+from vector_store import ArrayVectorStore
+
+DOCUMENTS = {
+    "leave.md": "# Leave\n\n## Sick leave\n\nEmployees get ten days of sick leave per year. "
+                "Unused sick days do not carry over.\n\n## Annual leave\n\nAnnual leave accrues monthly.\n",
+    "travel.md": "# Travel\n\nTravel expenses need receipts and written approval from a manager.\n",
+    "security.txt": "Laptops must be encrypted before they leave the office. Report lost devices at once.\n",
+}
+
+QUESTION = "How many days of sick leave do employees get?"
+
+
+@pytest.fixture
+def make_pipeline(tmp_path, offline_models):
+    """Build a RAGPipeline over a small corpus with the offline models; keyword arguments override options."""
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name, text in DOCUMENTS.items():
+        (docs / name).write_text(text, encoding="utf-8")
+
+    def make(**options):
+        return RAGPipeline(
+            docs_folder=str(docs),
+            persist_dir=str(tmp_path / "vector_store"),
+            embeddings=offline_models["embeddings"],
+            llm=offline_models["llm"],
+            reranker=offline_models["reranker"],
+            **{"answer_cache_size": 0, **options},
+        )
+
+    return make
+
+
+def test_hybrid_ask_and_stream_answer_with_citations(make_pipeline):
+    pipeline = make_pipeline(hybrid_search=True)
+    assert isinstance(pipeline.index.vector_store, ArrayVectorStore)
+
+    result = pipeline.ask(QUESTION)
+    assert result["answer"] not in ERROR_ANSWERS
+    assert any(citation.startswith("leave.md") for citation in result["citations"])
+
+    streamed = pipeline.ask_stream(QUESTION)
+    assert "".join(streamed["tokens"]) not in ERROR_ANSWERS
+    assert any(citation.startswith("leave.md") for citation in streamed["citations"])
+
+
+def test_semantic_cache_miss_embeds_the_query_once(make_pipeline, offline_models, monkeypatch):
+    # Shared embed_model: no embedding cache in front of it to hide a second query embedding
+    pipeline = make_pipeline(embed_model=offline_models["embed_model"], answer_cache_size=16,
+                             semantic_cache_threshold=0.95)
+    embeddings = offline_models["embeddings"]
+    calls = []
+    embed_query = embeddings.embed_query
+    monkeypatch.setattr(embeddings, "embed_query", lambda text: calls.append(text) or embed_query(text))
+
+    result = pipeline.ask(QUESTION)
+    assert result["answer"] not in ERROR_ANSWERS
+    assert calls == [QUESTION]
+
+
+def test_restart_reuses_the_persisted_index(make_pipeline):
+    first = make_pipeline()
+    chunks = len(first.index.vector_store)
+    assert chunks > 0
+
+    second = make_pipeline()
+    assert isinstance(second.index.vector_store, ArrayVectorStore)
+    assert len(second.index.vector_store) == chunks
+    assert second.refresh() == {"added": 0, "updated": 0, "deleted": 0, "skipped": len(DOCUMENTS)}
+    assert second.ask(QUESTION)["answer"] not in ERROR_ANSWERS
+
+
+def test_ask_batch_answers_every_question(make_pipeline):
+    pipeline = make_pipeline()
+    questions = [QUESTION, "Who approves travel expenses?", "What must be done before laptops leave the office?"]
+    results = list(pipeline.ask_batch(questions, top_k=2, concurrency=2, batch_size=2))
+    assert sorted(result["id"] for result in results) == [0, 1, 2]
+    for result in results:
+        assert not result.get("error")
+        assert result["answer"] not in ERROR_ANSWERS and result["citations"]
+
+
+@pytest.mark.parametrize("vector_index", ["flat", "hnsw", "ivfpq"])
+def test_faiss_backends_answer_and_persist(make_pipeline, vector_index):
+    pytest.importorskip("faiss")
+    from ann_index import ANN_INDEX_FILE
+
+    pipeline = make_pipeline(vector_index=vector_index, hybrid_search=False)
+    result = pipeline.ask(QUESTION)
+    assert any(citation.startswith("leave.md") for citation in result["citations"])
+    assert os.path.exists(os.path.join(pipeline.store_dir, ANN_INDEX_FILE))
+
+    restarted = make_pipeline(vector_index=vector_index, hybrid_search=False)
+    assert any(citation.startswith("leave.md") for citation in restarted.ask(QUESTION)["citations"])
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8", "binary"])
+def test_quantized_search_answers_after_restart(make_pipeline, quantization):
+    pipeline = make_pipeline(quantization=quantization, rescore_factor=4)
+    assert any(citation.startswith("leave.md") for citation in pipeline.ask(QUESTION)["citations"])
+
+    restarted = make_pipeline(quantization=quantization, rescore_factor=4)
+    assert len(restarted.index.vector_store) == len(pipeline.index.vector_store)
+    assert any(citation.startswith("leave.md") for citation in restarted.ask(QUESTION)["citations"])
+
+
+def test_chunk_metadata_columns_survive_a_restart(make_pipeline, tmp_path):
+    from chunk_store import HIDDEN_METADATA_KEYS, SECTION_KEY, TOKEN_COUNT_KEY
+
+    for pipeline in (make_pipeline(), make_pipeline()):
+        spans = pipeline.ask(QUESTION)["spans"]
+        assert spans
+        for span_info in spans:
+            text = (tmp_path / "docs" / span_info["source"]).read_text(encoding="utf-8")
+            assert text[span_info["start_char"]:span_info["end_char"]].strip()
+        assert any(span_info["section"] == "Leave > Sick leave" for span_info in spans)
+
+        node = pipeline.index.as_retriever(similarity_top_k=1).retrieve(QUESTION)[0].node
+        assert node.metadata["source"] == "leave.md" and node.metadata[SECTION_KEY]
+        assert node.metadata[TOKEN_COUNT_KEY] > 0
+        assert set(HIDDEN_METADATA_KEYS) <= set(node.excluded_llm_metadata_keys)
@@ -0,0 +1,34 @@
+from llama_index.core.schema import TextNode
+
+from query_engine import build_vector_index, load_vector_index
+from vector_store import ArrayVectorStore
+
+TEXTS = [
+    "Employees get ten days of sick leave per year.",
+    "Annual leave accrues monthly and requests go to your manager.",
+    "Travel expenses need receipts and written approval.",
+    "Laptops must be encrypted before leaving the office.",
+    "Overtime is recorded in the timesheet each week.",
+]
+
+
+def _nodes():
+    return [TextNode(text=text, metadata={"source": f"policy_{i}.txt"}) for i, text in enumerate(TEXTS)]
+
+
+def test_empty_index_is_built_on_an_array_vector_store(offline_models):
+    index = build_vector_index([])
+    assert isinstance(index.vector_store, ArrayVectorStore)
+    assert len(index.vector_store) == 0
+
+
+def test_index_is_persisted_and_reloaded_without_reembedding(tmp_path, offline_models):
+    index = build_vector_index(_nodes(), persist_dir=str(tmp_path))
+    assert isinstance(index.vector_store, ArrayVectorStore)
+    assert len(index.vector_store) == len(TEXTS)
+
+    reloaded = load_vector_index(str(tmp_path))
+    assert isinstance(reloaded.vector_store, ArrayVectorStore)
+    assert len(reloaded.vector_store) == len(TEXTS)
+    top = reloaded.as_retriever(similarity_top_k=1).retrieve("How many days of sick leave do employees get?")
+    assert top[0].node.metadata["source"] == "policy_0.txt"